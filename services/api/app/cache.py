@@ -0,0 +1,98 @@
+"""
+Small in-process TTL + LRU cache for GitHub data, and request coalescing.
+Each worker process keeps its own copy; entries are bounded by count and age.
+"""
+import asyncio
+import time
+from collections import OrderedDict
+from typing import Any, Awaitable, Callable, Hashable, Optional, TypeVar
+
+from app.metrics import CACHE_REQUESTS, SINGLEFLIGHT_REQUESTS
+
+T = TypeVar("T")
+
+
+class TTLCache:
+    def __init__(self, name: str, maxsize: int, ttl: float) -> None:
+        self.name = name
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self._data: OrderedDict[Hashable, tuple[float, Any]] = OrderedDict()
+        self._hits = CACHE_REQUESTS.labels(cache=name, result="hit")
+        self._misses = CACHE_REQUESTS.labels(cache=name, result="miss")
+
+    def get(self, key: Hashable) -> Optional[Any]:
+        item = self._data.get(key)
+        if item is None:
+            self._misses.inc()
+            return None
+        expires, value = item
+        if expires < time.monotonic():
+            del self._data[key]
+            self._misses.inc()
+            return None
+        self._data.move_to_end(key)
+        self._hits.inc()
+        return value
+
+    def set(self, key: Hashable, value: Any, ttl: Optional[float] = None) -> None:
+        self._data[key] = (time.monotonic() + (self.ttl if ttl is None else ttl), value)
+        self._data.move_to_end(key)
+        while len(self._data) > self.maxsize:
+            self._data.popitem(last=False)
+
+    def delete(self, key: Hashable) -> None:
+        self._data.pop(key, None)
+
+    def delete_where(self, predicate: Callable[[Hashable], bool]) -> int:
+        """Drop every key matching predicate. Returns the number removed."""
+        keys = [k for k in self._data if predicate(k)]
+        for k in keys:
+            del self._data[k]
+        return len(keys)
+
+    def clear(self) -> None:
+        self._data.clear()
+
+    def __len__(self) -> int:
+        return len(self._data)
+
+
+class SingleFlight:
+    """
+    Coalesce concurrent identical calls: the first caller for a key starts the
+    work in its own task, and callers arriving while it runs await the same
+    task instead of starting another. Nothing is kept once it finishes, so
+    results are shared only between overlapping calls (pair with a TTLCache
+    for reuse over time).
+
+    The work runs in a separate task, so one caller being cancelled (e.g. a
+    client disconnect) does not cancel it for the others. Results are shared
+    objects: callers must not mutate them.
+    """
+
+    def __init__(self, name: str) -> None:
+        self.name = name
+        self._inflight: dict[Hashable, asyncio.Task] = {}
+        self._leaders = SINGLEFLIGHT_REQUESTS.labels(group=name, result="leader")
+        self._shared = SINGLEFLIGHT_REQUESTS.labels(group=name, result="shared")
+
+    async def do(self, key: Hashable, fn: Callable[[], Awaitable[T]]) -> T:
+        task = self._inflight.get(key)
+        if task is None:
+            task = asyncio.ensure_future(fn())
+            self._inflight[key] = task
+            task.add_done_callback(lambda t: self._done(key, t))
+            self._leaders.inc()
+        else:
+            self._shared.inc()
+        return await asyncio.shield(task)
+
+    def _done(self, key: Hashable, task: asyncio.Task) -> None:
+        if self._inflight.get(key) is task:
+            del self._inflight[key]
+        if not task.cancelled():
+            task.exception()  # mark retrieved even if every caller went away
+
+    def __len__(self) -> int:
+        return len(self._inflight)
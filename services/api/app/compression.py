@@ -0,0 +1,157 @@
+"""
+Response compression negotiated by Accept-Encoding.
+Prefers brotli when the client accepts it and the brotli package is installed,
+otherwise falls back to gzip. Streaming bodies are flushed per chunk so NDJSON
+records still reach the client as soon as they are written.
+"""
+import zlib
+from typing import Optional
+
+from starlette.datastructures import Headers, MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+try:
+    import brotli
+except ImportError:  # brotli is optional; gzip is always available
+    brotli = None
+
+
+class _GzipEncoder:
+    name = "gzip"
+
+    def __init__(self, level: int) -> None:
+        self._c = zlib.compressobj(level, zlib.DEFLATED, 31)
+
+    def process(self, data: bytes) -> bytes:
+        return self._c.compress(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush(zlib.Z_SYNC_FLUSH)
+
+    def finish(self) -> bytes:
+        return self._c.flush(zlib.Z_FINISH)
+
+
+class _BrotliEncoder:
+    name = "br"
+
+    def __init__(self, quality: int) -> None:
+        self._c = brotli.Compressor(quality=quality)
+
+    def process(self, data: bytes) -> bytes:
+        return self._c.process(data)
+
+    def flush(self) -> bytes:
+        return self._c.flush()
+
+    def finish(self) -> bytes:
+        return self._c.finish()
+
+
+def _accepted_encodings(header: str) -> set[str]:
+    accepted: set[str] = set()
+    for part in header.split(","):
+        token, _, params = part.strip().partition(";")
+        if params.strip().replace(" ", "") in ("q=0", "q=0.0"):
+            continue
+        if token:
+            accepted.add(token.strip().lower())
+    return accepted
+
+
+class CompressionMiddleware:
+    def __init__(
+        self,
+        app: ASGIApp,
+        minimum_size: int = 1024,
+        gzip_level: int = 6,
+        brotli_quality: int = 4,
+    ) -> None:
+        self.app = app
+        self.minimum_size = minimum_size
+        self.gzip_level = gzip_level
+        self.brotli_quality = brotli_quality
+
+    def _pick_encoder(self, scope: Scope):
+        accepted = _accepted_encodings(Headers(scope=scope).get("Accept-Encoding", ""))
+        if brotli is not None and "br" in accepted:
+            return _BrotliEncoder(self.brotli_quality)
+        if "gzip" in accepted:
+            return _GzipEncoder(self.gzip_level)
+        return None
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        encoder = self._pick_encoder(scope)
+        if encoder is None:
+            await self.app(scope, receive, send)
+            return
+        await _Responder(self.app, encoder, self.minimum_size)(scope, receive, send)
+
+
+class _Responder:
+    def __init__(self, app: ASGIApp, encoder, minimum_size: int) -> None:
+        self.app = app
+        self.encoder = encoder
+        self.minimum_size = minimum_size
+        self.send: Optional[Send] = None
+        self.initial_message: Message = {}
+        self.started = False
+        self.passthrough = False
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        self.send = send
+        await self.app(scope, receive, self.send_compressed)
+
+    async def send_compressed(self, message: Message) -> None:
+        assert self.send is not None
+        if message["type"] == "http.response.start":
+            # Hold the start message until we know whether the body gets compressed.
+            self.initial_message = message
+            headers = Headers(raw=message["headers"])
+            # Already encoded, or a byte range whose offsets refer to the uncompressed body.
+            self.passthrough = (
+                "content-encoding" in headers or "content-range" in headers or message["status"] == 206
+            )
+            return
+        if message["type"] != "http.response.body":
+            await self.send(message)
+            return
+
+        body = message.get("body", b"")
+        more_body = message.get("more_body", False)
+
+        if self.passthrough:
+            if not self.started:
+                self.started = True
+                await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        if not self.started:
+            self.started = True
+            if len(body) < self.minimum_size and not more_body:
+                self.passthrough = True
+                await self.send(self.initial_message)
+                await self.send(message)
+                return
+            headers = MutableHeaders(raw=self.initial_message["headers"])
+            headers["Content-Encoding"] = self.encoder.name
+            headers.add_vary_header("Accept-Encoding")
+            if more_body:
+                del headers["Content-Length"]
+                message["body"] = self.encoder.process(body) + self.encoder.flush()
+            else:
+                message["body"] = self.encoder.process(body) + self.encoder.finish()
+                headers["Content-Length"] = str(len(message["body"]))
+            await self.send(self.initial_message)
+            await self.send(message)
+            return
+
+        if more_body:
+            message["body"] = self.encoder.process(body) + self.encoder.flush()
+        else:
+            message["body"] = self.encoder.process(body) + self.encoder.finish()
+        await self.send(message)
@@ -1,5 +1,6 @@
 from typing import Annotated, Optional
 
+import httpx
 from fastapi import Depends, HTTPException, status
 from fastapi.security import HTTPAuthorizationCredentials, HTTPBearer
 from sqlalchemy.ext.asyncio import AsyncSession
@@ -8,6 +9,7 @@ from app.crud import get_user_by_id
 from app.database import async_session, get_db
 from app.models import User
 from app.security import decode_access_token
+from app.services.github import get_repo_meta
 
 security = HTTPBearer(auto_error=False)
 
@@ -28,3 +30,17 @@ async def get_current_user(
     if not user:
         raise HTTPException(status_code=status.HTTP_401_UNAUTHORIZED, detail="User not found")
     return user
+
+
+async def require_push(token: str, owner: str, repo: str) -> None:
+    """
+    403 for repos the token cannot push to, from cached repo metadata when possible.
+    GitHub errors keep their status (404 unknown repo, 401/403 token rejected); others are 502.
+    """
+    try:
+        meta = await get_repo_meta(token, owner, repo)
+    except httpx.HTTPStatusError as e:
+        code = e.response.status_code
+        raise HTTPException(status_code=code if code in (401, 403, 404) else status.HTTP_502_BAD_GATEWAY, detail=str(e))
+    if meta["can_push"] is False:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail=f"No push access to {owner}/{repo}")
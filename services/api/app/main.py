@@ -1,22 +1,35 @@
+import asyncio
 from contextlib import asynccontextmanager
 
-from fastapi import FastAPI
+from fastapi import FastAPI, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
-from fastapi.responses import JSONResponse
+from fastapi.responses import ORJSONResponse
 
+from app.compression import CompressionMiddleware
 from app.config import get_settings
 from app.database import engine
+from app.metrics import MetricsMiddleware, mark_process_dead, render_metrics
 from app.models import Base
-from app.routers import auth, git, patch, agent, repos
+from app.offload import OffloadBusy, shutdown_pool
+from app.routers import auth, git, patch, agent, repos, webhooks
+from app.services import invalidation
+from app.services.github import apply_invalidation
+from app.tracing import TracingMiddleware, configure_from_settings
 
 settings = get_settings()
+configure_from_settings(settings.trace_exporter, settings.trace_file)
 
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     async with engine.begin() as conn:
         await conn.run_sync(Base.metadata.create_all)
+    listener = asyncio.create_task(invalidation.listen(apply_invalidation)) if settings.redis_url else None
     yield
+    if listener is not None:
+        listener.cancel()
+    shutdown_pool()
+    mark_process_dead()
 
 
 app = FastAPI(
@@ -24,6 +37,7 @@ app = FastAPI(
     description="Agentic Git Client - patch generation and PR creation",
     version="0.1.0",
     lifespan=lifespan,
+    default_response_class=ORJSONResponse,
 )
 
 app.add_middleware(
@@ -33,6 +47,14 @@ app.add_middleware(
     allow_methods=["*"],
     allow_headers=["*"],
 )
+app.add_middleware(CompressionMiddleware, minimum_size=settings.compression_min_size)
+app.add_middleware(TracingMiddleware)
+app.add_middleware(MetricsMiddleware)
+
+
+@app.exception_handler(OffloadBusy)
+async def offload_busy(request: Request, exc: OffloadBusy):
+    return ORJSONResponse({"detail": str(exc)}, status_code=503, headers={"Retry-After": "1"})
 
 
 @app.get("/health")
@@ -40,8 +62,15 @@ async def health():
     return {"status": "ok"}
 
 
+@app.get("/metrics", include_in_schema=False)
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
 app.include_router(auth.router, prefix="/auth")
 app.include_router(repos.router)
 app.include_router(agent.router)
 app.include_router(patch.router)
 app.include_router(git.router)
+app.include_router(webhooks.router)
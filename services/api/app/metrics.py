@@ -0,0 +1,161 @@
+"""
+Prometheus metrics for routers, GitHub calls, Claude calls, patch validation and caches.
+
+Multi-worker uvicorn: set PROMETHEUS_MULTIPROC_DIR to an empty, writable directory
+before the workers start. Each worker then writes its samples there and /metrics
+aggregates them; without it, /metrics reports the serving process only.
+"""
+import os
+import re
+import time
+from typing import Any, Optional
+
+import httpx
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, CollectorRegistry, Counter, Histogram, generate_latest, multiprocess
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "zappr_http_request_duration_seconds",
+    "API request latency",
+    ["router", "route", "method", "status"],
+)
+GITHUB_REQUEST_SECONDS = Histogram(
+    "zappr_github_request_duration_seconds",
+    "Outbound GitHub API latency (until response headers)",
+    ["family", "method", "status"],
+)
+LLM_REQUEST_SECONDS = Histogram(
+    "zappr_llm_request_duration_seconds",
+    "Anthropic messages API latency",
+    ["operation", "model"],
+    buckets=(0.5, 1, 2.5, 5, 10, 20, 30, 60, 120, 300),
+)
+LLM_TOKENS = Counter(
+    "zappr_llm_tokens_total",
+    "Anthropic tokens by direction (input/output)",
+    ["operation", "model", "direction"],
+)
+LLM_ROUTES = Counter(
+    "zappr_llm_routes_total",
+    "Model routing decisions; route is 'fast', 'default' or 'override'",
+    ["operation", "route"],
+)
+LLM_STREAM_ABORTS = Counter(
+    "zappr_llm_stream_aborts_total",
+    "Patch generations stopped mid-stream because the patch was certain to be rejected",
+    ["reason"],
+)
+PATCH_VALIDATIONS = Counter(
+    "zappr_patch_validations_total",
+    "validate_patch outcomes; result is 'ok' or the failure reason",
+    ["result"],
+)
+CACHE_REQUESTS = Counter(
+    "zappr_cache_requests_total",
+    "Cache lookups; hit ratio = hit / (hit + miss)",
+    ["cache", "result"],
+)
+OFFLOAD_JOBS = Counter(
+    "zappr_offload_jobs_total",
+    "CPU-heavy patch jobs by where they ran: inline, pool, or rejected (pool queue full)",
+    ["op", "where"],
+)
+SINGLEFLIGHT_REQUESTS = Counter(
+    "zappr_singleflight_requests_total",
+    "Coalesced calls; result is 'leader' (went upstream) or 'shared' (joined one in flight). "
+    "Collapse rate = shared / (leader + shared)",
+    ["group", "result"],
+)
+PREFETCH_FILES = Counter(
+    "zappr_prefetch_files_total",
+    "Files considered by speculative prefetch: fetched, cached (already warm) or over_budget",
+    ["result"],
+)
+
+_REPO_PATH_RE = re.compile(r"^/repos/[^/]+/[^/]+(?:/(.*))?$")
+
+
+def github_family(path: str) -> str:
+    """Collapse a GitHub API path into a low-cardinality endpoint family."""
+    m = _REPO_PATH_RE.match(path)
+    if not m:
+        return path.strip("/").replace("/", ".") or "root"
+    rest = m.group(1)
+    if not rest:
+        return "repos.get"
+    parts = rest.split("/")
+    if parts[0] == "git" and len(parts) > 1:
+        return "git." + ("refs" if parts[1] in ("ref", "refs") else parts[1])
+    return parts[0]
+
+
+async def _on_github_request(request: httpx.Request) -> None:
+    request.extensions["zappr_start"] = time.perf_counter()
+
+
+async def _on_github_response(response: httpx.Response) -> None:
+    start = response.request.extensions.get("zappr_start")
+    if start is None:
+        return
+    GITHUB_REQUEST_SECONDS.labels(
+        family=github_family(response.request.url.path),
+        method=response.request.method,
+        status=str(response.status_code),
+    ).observe(time.perf_counter() - start)
+
+
+GITHUB_EVENT_HOOKS = {"request": [_on_github_request], "response": [_on_github_response]}
+
+
+def observe_llm(operation: str, model: str, seconds: float, usage: Optional[Any]) -> None:
+    LLM_REQUEST_SECONDS.labels(operation=operation, model=model).observe(seconds)
+    if usage is not None:
+        LLM_TOKENS.labels(operation=operation, model=model, direction="input").inc(getattr(usage, "input_tokens", 0) or 0)
+        LLM_TOKENS.labels(operation=operation, model=model, direction="output").inc(getattr(usage, "output_tokens", 0) or 0)
+
+
+class MetricsMiddleware:
+    """Record request latency labelled by the matched route template, not the raw path."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        start = time.perf_counter()
+        status = "500"
+
+        async def send_wrapper(message: Message) -> None:
+            nonlocal status
+            if message["type"] == "http.response.start":
+                status = str(message["status"])
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            route = scope.get("route")
+            path = getattr(route, "path", None) or "unmatched"
+            if path != "/metrics":
+                tags = getattr(route, "tags", None)
+                HTTP_REQUEST_SECONDS.labels(
+                    router=tags[0] if tags else "app",
+                    route=path,
+                    method=scope["method"],
+                    status=status,
+                ).observe(time.perf_counter() - start)
+
+
+def render_metrics() -> tuple[bytes, str]:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        registry = CollectorRegistry()
+        multiprocess.MultiProcessCollector(registry)
+        return generate_latest(registry), CONTENT_TYPE_LATEST
+    return generate_latest(REGISTRY), CONTENT_TYPE_LATEST
+
+
+def mark_process_dead() -> None:
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        multiprocess.mark_process_dead(os.getpid())
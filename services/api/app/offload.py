@@ -0,0 +1,114 @@
+"""
+Process-pool offload for CPU-heavy patch work (diff parsing, applying,
+validation, agent response parsing).
+
+Jobs whose input is at least OFFLOAD_MIN_BYTES run in a pool of
+OFFLOAD_WORKERS processes so they cannot stall the event loop; smaller jobs run
+inline, where they are cheaper than the round trip to a worker. At most
+OFFLOAD_MAX_PENDING jobs may be queued or running in the pool; past that,
+OffloadBusy is raised (served as 503 with Retry-After) instead of letting the
+backlog grow without bound.
+"""
+import asyncio
+import functools
+from concurrent.futures import Future, ProcessPoolExecutor
+from typing import Any, Callable, Optional, TypeVar
+
+from app.config import get_settings
+from app.metrics import OFFLOAD_JOBS, PATCH_VALIDATIONS
+from app.patch_utils import FilePatch, apply_patch, parse_unified_diff
+from app.services.patch_validator import check_patch_applies, classify_patch
+
+T = TypeVar("T")
+
+_pool: Optional[ProcessPoolExecutor] = None
+_pending = 0
+
+
+class OffloadBusy(Exception):
+    """The process pool queue is full."""
+
+
+def _get_pool() -> ProcessPoolExecutor:
+    global _pool
+    if _pool is None:
+        _pool = ProcessPoolExecutor(max_workers=get_settings().offload_workers)
+    return _pool
+
+
+def shutdown_pool() -> None:
+    global _pool
+    if _pool is not None:
+        _pool.shutdown(wait=False, cancel_futures=True)
+        _pool = None
+
+
+async def run_cpu(fn: Callable[..., T], *args: Any, size: int, op: str) -> T:
+    """
+    Run fn(*args) inline when size (bytes of input) is under the threshold or
+    offload is disabled, else in the process pool. fn and its arguments and
+    result must be picklable.
+    """
+    global _pending
+    s = get_settings()
+    if s.offload_workers <= 0 or size < s.offload_min_bytes:
+        OFFLOAD_JOBS.labels(op=op, where="inline").inc()
+        return fn(*args)
+    if _pending >= s.offload_max_pending:
+        OFFLOAD_JOBS.labels(op=op, where="rejected").inc()
+        raise OffloadBusy(f"Too many large patch jobs in progress (max {s.offload_max_pending})")
+    OFFLOAD_JOBS.labels(op=op, where="pool").inc()
+    loop = asyncio.get_running_loop()
+    future = _get_pool().submit(functools.partial(fn, *args))
+    _pending += 1
+    # A cancelled caller does not stop a job already running in a worker, so the
+    # slot is released when the job itself finishes, not when the caller leaves.
+    future.add_done_callback(functools.partial(_release, loop))
+    return await asyncio.wrap_future(future)
+
+
+def _release(loop: asyncio.AbstractEventLoop, _future: Future) -> None:
+    """Done-callback of a pool job; may run on the pool's thread, so hop to the loop."""
+    global _pending
+    try:
+        loop.call_soon_threadsafe(_decrement)
+    except RuntimeError:  # loop already closed
+        _pending -= 1
+
+
+def _decrement() -> None:
+    global _pending
+    _pending -= 1
+
+
+async def validate_patch_async(
+    patch_text: str,
+    max_files: Optional[int] = None,
+    max_lines: Optional[int] = None,
+) -> tuple[bool, Optional[str], list[dict[str, Any]]]:
+    """validate_patch, offloaded when large; the metric is recorded here, in the serving process."""
+    result, message, file_changes = await run_cpu(
+        classify_patch, patch_text, max_files, max_lines, size=len(patch_text), op="validate"
+    )
+    PATCH_VALIDATIONS.labels(result=result).inc()
+    return result == "ok", message, file_changes
+
+
+async def check_patch_applies_async(patch_text: str, originals: dict[str, str]) -> Optional[str]:
+    size = len(patch_text) + sum(len(v) for v in originals.values())
+    return await run_cpu(check_patch_applies, patch_text, originals, size=size, op="check_applies")
+
+
+async def parse_unified_diff_async(patch_text: str) -> list[FilePatch]:
+    return await run_cpu(parse_unified_diff, patch_text, size=len(patch_text), op="parse")
+
+
+async def apply_patch_async(original: str, file_patch: FilePatch) -> str:
+    size = len(original) + sum(len(c) for h in file_patch.hunks for _, c in h.lines)
+    return await run_cpu(apply_patch, original, file_patch, size=size, op="apply")
+
+
+async def parse_agent_response_async(text: str) -> tuple[list[str], str, str]:
+    from app.services.agent import parse_agent_response  # agent imports this module
+
+    return await run_cpu(parse_agent_response, text, size=len(text), op="parse_response")
@@ -11,6 +11,26 @@ from typing import Optional
 class FilePatch:
     path: str
     hunks: list["Hunk"]
+    old_path: Optional[str] = None  # "/dev/null" for new files
+
+    @property
+    def source(self) -> Optional[str]:
+        """Path the patch reads from, or None for a new file."""
+        old = self.old_path or self.path
+        return None if old == "/dev/null" else old
+
+
+class PatchApplyError(ValueError):
+    """A hunk does not apply: path, 0-based hunk index and 1-based line of the mismatch."""
+
+    def __init__(self, message: str, path: str, hunk: int, line: int) -> None:
+        super().__init__(message)
+        self.path = path
+        self.hunk = hunk
+        self.line = line
+
+    def __reduce__(self):  # keep path/hunk/line across the process pool
+        return type(self), (self.args[0], self.path, self.hunk, self.line)
 
 
 @dataclass
@@ -87,42 +107,122 @@ def parse_unified_diff(patch_text: str) -> list[FilePatch]:
                     break
                 i += 1
 
-            patches.append(FilePatch(path=path, hunks=hunks))
+            patches.append(FilePatch(path=path, hunks=hunks, old_path=old_path))
             continue
         i += 1
 
     return patches
 
 
+LARGE_FILE_CHARS = 1 << 20
+
+
+class LineIndex:
+    """
+    Start offsets of the lines of a text (as split on "\n"), found on demand.
+
+    Offsets are located by counting newlines a chunk at a time (str.count runs in
+    C) and halving the chunk that holds the line, so reaching line N costs
+    O(offset) bytes scanned but only O(offset / CHUNK + log CHUNK) Python steps,
+    and little past the last line asked for is scanned. Lookups
+    are cheapest in increasing line order, as when applying hunks; going
+    backwards rescans from the start.
+    """
+
+    CHUNK = 1 << 16
+    STEP = 64  # lines to walk one by one instead of counting a chunk
+
+    def __init__(self, text: str) -> None:
+        self.text = text
+        self._line = 0  # newlines before self._offset
+        self._offset = 0
+
+    def offset(self, line: int) -> Optional[int]:
+        """Start offset of 0-based line, or None if the text has no such line."""
+        if line < self._line:
+            self._line, self._offset = 0, 0
+        text = self.text
+        while self._line < line:
+            remaining = line - self._line
+            if remaining <= self.STEP:
+                # Close by (consecutive hunk lines): find each newline directly.
+                for _ in range(remaining):
+                    nl = text.find("\n", self._offset)
+                    if nl < 0:
+                        self._line, self._offset = 0, 0
+                        return None
+                    self._offset = nl + 1
+                    self._line += 1
+                break
+            end = min(self._offset + self.CHUNK, len(text))
+            found = text.count("\n", self._offset, end)
+            if found >= remaining:
+                # The line starts inside this chunk: halve the span until it is close.
+                while remaining > self.STEP:
+                    mid = (self._offset + end) // 2
+                    before = text.count("\n", self._offset, mid)
+                    if before >= remaining:
+                        end = mid
+                    else:
+                        self._line += before
+                        self._offset = mid
+                        remaining -= before
+            elif end == len(text):
+                self._line, self._offset = 0, 0
+                return None
+            else:
+                self._line += found
+                self._offset = end
+        return self._offset
+
+    def line(self, line: int) -> Optional[str]:
+        start = self.offset(line)
+        if start is None:
+            return None
+        end = self.text.find("\n", start)
+        return self.text[start:] if end < 0 else self.text[start:end]
+
+
 def apply_patch(original: str, file_patch: FilePatch) -> str:
     """Apply a FilePatch to original content. Returns new content.
-    Raises ValueError if patch does not apply cleanly."""
+    Raises PatchApplyError (a ValueError) if patch does not apply cleanly.
+    Originals of LARGE_FILE_CHARS or more take the slice-copying path."""
+    if len(original) >= LARGE_FILE_CHARS:
+        return _apply_sliced(original, file_patch)
+    return _apply_lines(original, file_patch)
+
+
+def _apply_lines(original: str, file_patch: FilePatch) -> str:
+    """apply_patch for ordinary files: split into lines, rebuild, join."""
     orig_lines = original.split("\n")
     result: list[str] = []
     pos = 0
 
-    for hunk in file_patch.hunks:
+    for index, hunk in enumerate(file_patch.hunks):
         # Copy lines before this hunk
         while pos < hunk.old_start - 1 and pos < len(orig_lines):
             result.append(orig_lines[pos])
             pos += 1
 
+        def fail(message: str) -> PatchApplyError:
+            return PatchApplyError(f"Patch does not apply: {message} {pos + 1}", file_patch.path, index, pos + 1)
+
         # Apply hunk - verify context matches for clean apply
         for prefix, content in hunk.lines:
             if prefix == " ":
                 if pos >= len(orig_lines):
-                    raise ValueError(f"Patch does not apply: expected context line at {pos + 1}")
+                    raise fail("expected context line at")
                 if orig_lines[pos] != content:
-                    raise ValueError(f"Patch does not apply: context mismatch at line {pos + 1}")
+                    raise fail("context mismatch at line")
                 result.append(orig_lines[pos])
                 pos += 1
             elif prefix == "+":
                 result.append(content)
             elif prefix == "-":
                 if pos >= len(orig_lines):
-                    raise ValueError(f"Patch does not apply: expected line to remove at {pos + 1}")
+                    raise fail("expected line to remove at")
                 if orig_lines[pos] != content:
-                    raise ValueError(f"Patch does not apply: line to remove mismatch at {pos + 1}")
+                    raise fail("line to remove mismatch at")
                 pos += 1
 
     # Copy remaining lines
@@ -131,3 +231,74 @@ def apply_patch(original: str, file_patch: FilePatch) -> str:
         pos += 1
 
     return "\n".join(result)
+
+
+def _apply_sliced(original: str, file_patch: FilePatch) -> str:
+    """
+    apply_patch for large files. Untouched spans are copied as slices of
+    original, so the cost is C-level newline counting up to the last hunk plus
+    one join, not per-line Python work across the whole file.
+    """
+    index = LineIndex(original)
+    pieces: list[str] = []  # every piece ends with "\n"; the final one is trimmed below
+    pos = 0
+    at_end = False  # pos is past the last line
+
+    for hunk_index, hunk in enumerate(file_patch.hunks):
+        # Copy lines before this hunk
+        if not at_end and hunk.old_start - 1 > pos:
+            start, stop = index.offset(pos), index.offset(hunk.old_start - 1)
+            if stop is None:
+                pieces.extend((original[start:], "\n"))
+                pos, at_end = original.count("\n") + 1, True
+            else:
+                pieces.append(original[start:stop])
+                pos = hunk.old_start - 1
+
+        def fail(message: str) -> PatchApplyError:
+            return PatchApplyError(f"Patch does not apply: {message} {pos + 1}", file_patch.path, hunk_index, pos + 1)
+
+        # Apply hunk - verify context matches for clean apply
+        for prefix, content in hunk.lines:
+            if prefix == "+":
+                pieces.append(content + "\n")
+                continue
+            line = None if at_end else index.line(pos)
+            if prefix == " ":
+                if line is None:
+                    raise fail("expected context line at")
+                if line != content:
+                    raise fail("context mismatch at line")
+                pieces.append(content + "\n")
+                pos += 1
+            elif prefix == "-":
+                if line is None:
+                    raise fail("expected line to remove at")
+                if line != content:
+                    raise fail("line to remove mismatch at")
+                pos += 1
+            at_end = at_end or index.offset(pos) is None
+
+    # Copy remaining lines
+    tail = None if at_end else index.offset(pos)
+    if tail is not None:
+        pieces.append(original[tail:])
+    elif pieces:
+        pieces[-1] = pieces[-1][:-1]
+    return "".join(pieces)
+
+
+def render_hunk(hunk: Hunk) -> str:
+    header = f"@@ -{hunk.old_start},{hunk.old_lines} +{hunk.new_start},{hunk.new_lines} @@"
+    return "\n".join([header] + [prefix + content for prefix, content in hunk.lines])
+
+
+def render_unified_diff(patches: list[FilePatch]) -> str:
+    """Serialize FilePatches back to unified diff text (inverse of parse_unified_diff)."""
+    out: list[str] = []
+    for fp in patches:
+        old = fp.old_path or fp.path
+        out.append(f"--- {old if old == '/dev/null' else 'a/' + old}")
+        out.append(f"+++ {fp.path if fp.path == '/dev/null' else 'b/' + fp.path}")
+        out.extend(render_hunk(h) for h in fp.hunks)
+    return "\n".join(out) + "\n"
@@ -2,14 +2,30 @@ import time
 from collections import defaultdict
 from typing import Annotated
 
+import httpx
 from fastapi import APIRouter, Depends, HTTPException
 
+from app.cache import TTLCache
+from app.config import get_settings
 from app.deps import get_current_user
 from app.models import User
-from app.schemas import AgentChatRequest, AgentChatResponse, AgentPatchRequest, AgentPatchResponse
-from app.services.agent import chat, generate_patch
-from app.services.github import get_branch_sha, get_file_content, get_tree
+from app.schemas import (
+    AgentChatRequest,
+    AgentChatResponse,
+    AgentPatchRequest,
+    AgentPatchResponse,
+    ChatSessionCreateRequest,
+    ChatSessionMessageRequest,
+    ChatSessionMessageResponse,
+    ChatSessionResponse,
+)
+from app.services.agent import PROMPT_VERSION, chat, generate_patch, prepare_patch
+from app.services.github import get_branch_sha, get_file_text, get_full_tree, get_tree, token_scope
+from app.services.prefetch import remember_files
+from app.services.repo_map import build_repo_map
+from app.services.sessions import SessionBusy, get_session_store, new_session
 from app.crud import get_github_token
+from app.tracing import span
 
 router = APIRouter(prefix="/agent", tags=["agent"])
 
@@ -18,14 +34,36 @@ _agent_requests: dict[int, list[float]] = defaultdict(list)
 RATE_LIMIT = 10
 RATE_WINDOW = 60
 
+# History compaction state for stateless /chat, keyed by user and conversation opener.
+_chat_history_states = TTLCache("chat_summary", maxsize=2048, ttl=3600)
+# /agent/patch responses, keyed by _patch_cache_key. Only patches that validated
+# and applied are kept, so a retry after a bad result still gets a new generation.
+_patch_results = TTLCache(
+    "agent_patch", maxsize=get_settings().patch_cache_max_entries, ttl=get_settings().patch_cache_ttl_seconds
+)
 
-def _format_tree(tree: list[dict]) -> str:
-    lines = []
-    for e in tree:
-        prefix = "  " * (e["path"].count("/"))
-        icon = "📁" if e["type"] == "tree" else "📄"
-        lines.append(f"{prefix}{icon} {e['path']}")
-    return "\n".join(lines) if lines else "(empty)"
+
+def _normalize(text: str | None) -> str:
+    return " ".join((text or "").split())
+
+
+def _patch_cache_key(token: str, body: AgentPatchRequest, tree_sha: str, blob_shas: dict[str, str], model: str) -> tuple:
+    """
+    Everything the generated patch depends on: content by SHA, request text
+    whitespace-normalized, and the model routing actually picked (not the one asked for).
+    """
+    return (
+        token_scope(token),
+        body.owner,
+        body.repo,
+        tree_sha,
+        tuple((path, blob_shas.get(path)) for path in body.selected_files[:20]),
+        tuple(body.edit_files) if body.edit_files is not None else None,
+        _normalize(body.user_goal),
+        _normalize(body.extra_instructions),
+        model,
+        PROMPT_VERSION,
+    )
 
 
 @router.post("/patch", response_model=AgentPatchResponse)
@@ -33,7 +71,11 @@ async def agent_patch(
     body: AgentPatchRequest,
     user: Annotated[User, Depends(get_current_user)],
 ):
-    """Generate patch via Claude. Claude key is passed per-request, never stored."""
+    """
+    Generate patch via Claude. Claude key is passed per-request, never stored.
+    A repeat of an earlier request against the same tree and file contents
+    returns the earlier response (cached=True) unless no_cache is set.
+    """
     now = time.time()
     _agent_requests[user.id] = [t for t in _agent_requests[user.id] if t > now - RATE_WINDOW]
     if len(_agent_requests[user.id]) >= RATE_LIMIT:
@@ -45,20 +87,46 @@ async def agent_patch(
         raise HTTPException(status_code=401, detail="GitHub token not found")
 
     # Fetch repo map
-    sha = await get_branch_sha(token, body.owner, body.repo, body.branch)
-    tree_data = await get_tree(token, body.owner, body.repo, sha)
-    repo_map = _format_tree(tree_data["tree"])
+    with span("agent.branch_sha"):
+        sha = await get_branch_sha(token, body.owner, body.repo, body.branch)
+    with span("agent.tree"):
+        full = await get_full_tree(token, body.owner, body.repo, sha)
+    blob_shas = {e["path"]: e["sha"] for e in full["tree"] if e["type"] == "blob"}
+    remember_files(user.id, body.owner, body.repo, body.selected_files[:20])
+    with span("agent.repo_map"):
+        repo_map = build_repo_map(full, body.selected_files, body.user_goal)
 
     # Fetch selected file contents
     selected_files: dict[str, str] = {}
-    for path in body.selected_files[:20]:  # Limit
+    with span("agent.files", count=min(len(body.selected_files), 20)):
+        for path in body.selected_files[:20]:  # Limit
+            try:
+                selected_files[path] = await get_file_text(token, body.owner, body.repo, path, sha, blob_shas.get(path))
+            except Exception:
+                pass  # Skip files we can't fetch
+
+    # Routing depends on the prompt, so the cache is checked once it is built (the
+    # reads above come from caches on a repeat); the model call is what a hit saves.
+    try:
+        prepared = prepare_patch(
+            repo_map, selected_files, body.user_goal, body.extra_instructions, body.model, body.edit_files, blob_shas
+        )
+    except ValueError as e:
+        raise HTTPException(status_code=400, detail=str(e))
+    cache_key = _patch_cache_key(token, body, full["sha"], blob_shas, prepared[1].model)
+    if not body.no_cache:
+        hit = _patch_results.get(cache_key)
+        if hit is not None:
+            return hit.model_copy(update={"cached": True})
+
+    async def load_file(path: str) -> str:
+        # Files a candidate touches beyond the selected ones, for its dry-run apply.
         try:
-            fc = await get_file_content(token, body.owner, body.repo, path, body.branch)
-            import base64
-            content = base64.b64decode(fc.get("content", "")).decode("utf-8", errors="replace")
-            selected_files[path] = content
-        except Exception:
-            pass  # Skip files we can't fetch
+            return await get_file_text(token, body.owner, body.repo, path, sha)
+        except httpx.HTTPStatusError as e:
+            if e.response.status_code == 404:
+                return ""  # new file
+            raise
 
     try:
         result = await generate_patch(
@@ -67,15 +135,28 @@ async def agent_patch(
             selected_files=selected_files,
             user_goal=body.user_goal,
             extra_instructions=body.extra_instructions,
+            candidates=min(body.candidates, get_settings().patch_max_candidates),
+            load_file=load_file,
+            model_override=body.model,
+            edit_files=body.edit_files,
+            prepared=prepared,
         )
-        return AgentPatchResponse(
+        response = AgentPatchResponse(
             plan=result["plan"],
             patch=result["patch"],
             summary=result["summary"],
             files_changed=result["files_changed"],
+            candidates_tried=result.get("candidates_tried", 1),
+            valid=result.get("valid"),
+            validation_error=result.get("validation_error"),
+            repair_calls=result.get("repair_calls", 0),
+            route=result.get("route"),
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+    if response.valid is not False:
+        _patch_results.set(cache_key, response)
+    return response
 
 
 @router.post("/chat", response_model=AgentChatResponse)
@@ -99,22 +180,26 @@ async def agent_chat(
         raise HTTPException(status_code=400, detail="Invalid repo format")
     owner, repo_name = parts[0], parts[1]
 
-    sha = await get_branch_sha(token, owner, repo_name, body.branch)
-    tree_data = await get_tree(token, owner, repo_name, sha)
-    repo_map = _format_tree(tree_data["tree"])
+    with span("agent.branch_sha"):
+        sha = await get_branch_sha(token, owner, repo_name, body.branch)
+    with span("agent.tree"):
+        full = await get_full_tree(token, owner, repo_name, sha)
+        tree_data = await get_tree(token, owner, repo_name, sha)
+    with span("agent.repo_map"):
+        repo_map = build_repo_map(full, goal=body.message)
 
     selected_files: dict[str, str] = {}
-    for path in tree_data["tree"][:30]:
-        if path.get("type") == "blob":
-            try:
-                fc = await get_file_content(token, owner, repo_name, path["path"], body.branch)
-                import base64
-                content = base64.b64decode(fc.get("content", "")).decode("utf-8", errors="replace")
-                selected_files[path["path"]] = content[:5000]
-            except Exception:
-                pass
+    with span("agent.files"):
+        for path in tree_data["tree"][:30]:
+            if path.get("type") == "blob":
+                try:
+                    content = await get_file_text(token, owner, repo_name, path["path"], body.branch)
+                    selected_files[path["path"]] = content[:5000]
+                except Exception:
+                    pass
 
     history = [{"role": h.role, "content": h.content} for h in body.history]
+    state_key = (user.id, body.repo, history[0]["content"]) if history else None
     try:
         result = await chat(
             api_key=body.claude_api_key,
@@ -122,11 +207,173 @@ async def agent_chat(
             selected_files=selected_files,
             message=body.message,
             history=history,
+            history_state=_chat_history_states.get(state_key) if state_key else None,
+            model_override=body.model,
         )
+        if state_key:
+            _chat_history_states.set(state_key, result["history_state"])
         return AgentChatResponse(
             content=result["content"],
             patch=result.get("patch"),
             files_changed=result.get("files_changed", []),
+            route=result.get("route"),
         )
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+
+# Chat sessions: context is snapshotted server-side, each turn sends only the new message.
+SESSION_MAX_FILES = 30
+SESSION_FILE_CHARS = 5000
+
+
+def _session_response(session: dict) -> ChatSessionResponse:
+    return ChatSessionResponse(
+        session_id=session["id"],
+        repo=f"{session['owner']}/{session['repo']}",
+        branch=session["branch"],
+        commit_sha=session["commit_sha"],
+        tree_sha=session["tree_sha"],
+        files=list(session["files"]),
+        turns=len(session["history"]) // 2,
+    )
+
+
+async def _refresh_session_context(token: str, session: dict, commit_sha: str, paths: list[str] | None = None) -> None:
+    """Point the session at commit_sha, refetching only files whose blob SHA changed."""
+    owner, repo = session["owner"], session["repo"]
+    with span("agent.tree"):
+        full = await get_full_tree(token, owner, repo, commit_sha)
+    blob_shas = {e["path"]: e["sha"] for e in full["tree"] if e["type"] == "blob"}
+    if paths is None:
+        paths = list(session["files"])
+    with span("agent.repo_map"):
+        session["repo_map"] = build_repo_map(full, paths[:SESSION_MAX_FILES])
+    files: dict[str, dict] = {}
+    with span("agent.files"):
+        for path in paths[:SESSION_MAX_FILES]:
+            sha = blob_shas.get(path)
+            if sha is None:
+                continue  # deleted or never existed
+            prev = session["files"].get(path)
+            if prev and prev["sha"] == sha:
+                files[path] = prev
+                continue
+            try:
+                content = await get_file_text(token, owner, repo, path, commit_sha)
+            except Exception:
+                continue
+            files[path] = {"sha": sha, "content": content[:SESSION_FILE_CHARS]}
+    session["files"] = files
+    session["commit_sha"] = commit_sha
+    session["tree_sha"] = full["sha"]
+
+
+async def _get_owned_session(session_id: str, user: User) -> dict:
+    session = await get_session_store().get(session_id)
+    if not session or session["user_id"] != user.id:
+        raise HTTPException(status_code=404, detail="Session not found")
+    return session
+
+
+@router.post("/chat/sessions", response_model=ChatSessionResponse)
+async def create_chat_session(
+    body: ChatSessionCreateRequest,
+    user: Annotated[User, Depends(get_current_user)],
+):
+    """Snapshot branch head, repo map and context files for a chat session."""
+    token = get_github_token(user)
+    if not token:
+        raise HTTPException(status_code=401, detail="GitHub token not found")
+    parts = body.repo.split("/", 1)
+    if len(parts) != 2:
+        raise HTTPException(status_code=400, detail="Invalid repo format")
+
+    session = new_session(user.id, parts[0], parts[1], body.branch)
+    with span("agent.branch_sha"):
+        commit_sha = await get_branch_sha(token, session["owner"], session["repo"], body.branch)
+    paths = body.selected_files
+    if not paths:
+        tree_data = await get_tree(token, session["owner"], session["repo"], commit_sha)
+        paths = [e["path"] for e in tree_data["tree"] if e["type"] == "blob"][:SESSION_MAX_FILES]
+    await _refresh_session_context(token, session, commit_sha, paths)
+    await get_session_store().save(session)
+    return _session_response(session)
+
+
+@router.get("/chat/sessions/{session_id}", response_model=ChatSessionResponse)
+async def get_chat_session(
+    session_id: str,
+    user: Annotated[User, Depends(get_current_user)],
+):
+    return _session_response(await _get_owned_session(session_id, user))
+
+
+@router.delete("/chat/sessions/{session_id}")
+async def delete_chat_session(
+    session_id: str,
+    user: Annotated[User, Depends(get_current_user)],
+):
+    await _get_owned_session(session_id, user)
+    await get_session_store().delete(session_id)
+    return {"deleted": True}
+
+
+@router.post("/chat/sessions/{session_id}/messages", response_model=ChatSessionMessageResponse)
+async def chat_session_message(
+    session_id: str,
+    body: ChatSessionMessageRequest,
+    user: Annotated[User, Depends(get_current_user)],
+):
+    """One chat turn. Repo context is refetched only when the branch head has moved."""
+    now = time.time()
+    _agent_requests[user.id] = [t for t in _agent_requests[user.id] if t > now - RATE_WINDOW]
+    if len(_agent_requests[user.id]) >= RATE_LIMIT:
+        raise HTTPException(status_code=429, detail="Rate limit exceeded")
+    _agent_requests[user.id].append(now)
+
+    token = get_github_token(user)
+    if not token:
+        raise HTTPException(status_code=401, detail="GitHub token not found")
+    try:
+        async with get_session_store().lock(session_id):
+            return await _session_turn(token, session_id, body, user)
+    except SessionBusy:
+        raise HTTPException(status_code=409, detail="Session is busy with another message; retry")
+
+
+async def _session_turn(token: str, session_id: str, body: ChatSessionMessageRequest, user: User) -> ChatSessionMessageResponse:
+    session = await _get_owned_session(session_id, user)
+
+    with span("agent.branch_sha"):
+        head = await get_branch_sha(token, session["owner"], session["repo"], session["branch"])
+    refreshed = head != session["commit_sha"]
+    if refreshed:
+        await _refresh_session_context(token, session, head)
+
+    try:
+        result = await chat(
+            api_key=body.claude_api_key,
+            repo_map=session["repo_map"],
+            selected_files={p: f["content"] for p, f in session["files"].items()},
+            message=body.message,
+            history=list(session["history"]),
+            history_state=session.get("history_state"),
+            model_override=body.model,
+        )
+    except Exception as e:
+        raise HTTPException(status_code=400, detail=str(e))
+
+    session["history_state"] = result["history_state"]
+    session["history"].append({"role": "user", "content": body.message})
+    session["history"].append({"role": "assistant", "content": result["content"]})
+    await get_session_store().save(session)
+    return ChatSessionMessageResponse(
+        session_id=session["id"],
+        content=result["content"],
+        patch=result.get("patch"),
+        files_changed=result.get("files_changed", []),
+        context_refreshed=refreshed,
+        commit_sha=session["commit_sha"],
+        route=result.get("route"),
+    )
@@ -90,8 +90,8 @@ async def github_oauth_callback_get(
     code: str,
     state: str,
     code_verifier: str,
-    redirect_uri: str | None = None,
     db: Annotated[AsyncSession, Depends(get_db)],
+    redirect_uri: str | None = None,
 ):
     """Exchange code for tokens (GET, for mobile). Returns user + access_token."""
     body = CallbackRequest(code=code, code_verifier=code_verifier, state=state, redirect_uri=redirect_uri)
@@ -1,15 +1,24 @@
-from typing import Annotated
+import asyncio
+import logging
+from typing import Annotated, Any, AsyncIterator, Optional
 
+import httpx
+import orjson
 from fastapi import APIRouter, Depends, HTTPException
+from fastapi.responses import StreamingResponse
 
 from app.crud import get_github_token
-from app.deps import get_current_user
+from app.deps import get_current_user, require_push
 from app.models import User
-from app.schemas import ApplyCommitRequest, ApplyCommitResponse, CreatePRRequest, CreatePRResponse
+from app.offload import validate_patch_async
+from app.schemas import ApplyCommitRequest, ApplyCommitResponse, CreatePRRequest, CreatePRResponse, ShipRequest
 from app.services.github import apply_patch_and_commit, create_pr, get_default_branch
-from app.services.patch_validator import validate_patch
+from app.services.ship import ShipError, ship_patch
 
 router = APIRouter(prefix="/git", tags=["git"])
+logger = logging.getLogger(__name__)
+# Ship pipelines outlive a disconnected client so a half-done one can still roll back.
+_ship_tasks: set[asyncio.Task] = set()
 
 
 @router.post("/apply-and-commit", response_model=ApplyCommitResponse)
@@ -21,8 +30,9 @@ async def apply_and_commit(
     token = get_github_token(user)
     if not token:
         raise HTTPException(status_code=401, detail="GitHub token not found")
+    await require_push(token, body.owner, body.repo)
 
-    valid, msg, _ = validate_patch(body.patch)
+    valid, msg, _ = await validate_patch_async(body.patch)
     if not valid:
         raise HTTPException(status_code=400, detail=msg or "Patch validation failed")
 
@@ -38,6 +48,10 @@ async def apply_and_commit(
         return ApplyCommitResponse(commit_sha=commit_sha, branch=body.branch)
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 422:
+            raise HTTPException(status_code=409, detail="Branch moved while committing; retry")
+        raise
 
 
 @router.post("/pr", response_model=CreatePRResponse)
@@ -49,6 +63,7 @@ async def create_pr_endpoint(
     token = get_github_token(user)
     if not token:
         raise HTTPException(status_code=401, detail="GitHub token not found")
+    await require_push(token, body.owner, body.repo)
 
     base = body.base
     if not base:
@@ -69,3 +84,52 @@ async def create_pr_endpoint(
         return CreatePRResponse(pr_url=pr_url, pr_number=pr_number)
     except Exception as e:
         raise HTTPException(status_code=400, detail=str(e))
+
+
+@router.post("/ship")
+async def ship(
+    body: ShipRequest,
+    user: Annotated[User, Depends(get_current_user)],
+):
+    """
+    Validate, create the branch, commit and open the PR in one call. Streams
+    NDJSON progress records ({"step", "status", ...}) and ends with
+    {"result": {branch, base, commit_sha, pr_url, pr_number}} or
+    {"error", "step", "status"}. The branch is deleted again if the PR fails.
+    """
+    token = get_github_token(user)
+    if not token:
+        raise HTTPException(status_code=401, detail="GitHub token not found")
+    await require_push(token, body.owner, body.repo)
+
+    valid, msg, _ = await validate_patch_async(body.patch)
+    if not valid:
+        raise HTTPException(status_code=400, detail=msg or "Patch validation failed")
+
+    queue: asyncio.Queue[Optional[dict[str, Any]]] = asyncio.Queue()
+
+    async def run() -> None:
+        try:
+            result = await ship_patch(
+                token, body.owner, body.repo, body.patch, body.branch, body.base,
+                body.commit_message, body.title, body.body, queue.put_nowait,
+            )
+            queue.put_nowait({"result": result})
+        except ShipError as e:
+            queue.put_nowait({"error": str(e), "step": e.step, "status": e.status})
+        except Exception as e:
+            # Anything else would end the stream with no final record; the client must see an outcome.
+            logger.exception("ship failed for %s/%s", body.owner, body.repo)
+            queue.put_nowait({"error": str(e) or type(e).__name__, "step": "internal", "status": 500})
+        finally:
+            queue.put_nowait(None)
+
+    task = asyncio.create_task(run())
+    _ship_tasks.add(task)
+    task.add_done_callback(_ship_tasks.discard)
+
+    async def stream() -> AsyncIterator[bytes]:
+        while (record := await queue.get()) is not None:
+            yield orjson.dumps(record) + b"\n"
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
@@ -5,7 +5,7 @@ from fastapi import APIRouter, Depends
 from app.deps import get_current_user
 from app.models import User
 from app.schemas import FileChange, ValidatePatchRequest, ValidatePatchResponse
-from app.services.patch_validator import validate_patch
+from app.offload import validate_patch_async
 
 router = APIRouter(prefix="/patch", tags=["patch"])
 
@@ -16,7 +16,7 @@ async def validate_patch_endpoint(
     user: Annotated[User, Depends(get_current_user)] = None,
 ):
     """Validate patch: apply check, limits, blocked paths, secrets scan."""
-    valid, message, file_changes = validate_patch(body.patch)
+    valid, message, file_changes = await validate_patch_async(body.patch)
     return ValidatePatchResponse(
         valid=valid,
         message=message,
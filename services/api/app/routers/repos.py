@@ -1,34 +1,55 @@
-from typing import Annotated
+import asyncio
+from contextlib import AsyncExitStack
+from typing import Annotated, AsyncIterator, Optional
 
-from fastapi import APIRouter, Depends, HTTPException
+import httpx
+import orjson
+from fastapi import APIRouter, Depends, Header, HTTPException, Query
+from fastapi.responses import ORJSONResponse, StreamingResponse
 from sqlalchemy.ext.asyncio import AsyncSession
 
+from app.config import get_settings
 from app.crud import get_github_token
-from app.deps import get_current_user
+from app.deps import get_current_user, require_push
 from app.database import get_db
 from app.models import User
+from app.offload import validate_patch_async
 from app.schemas import (
+    BatchCommitRequest,
+    BatchCommitResponse,
     BranchItem,
+    BulkFilesRequest,
     CreateBranchRequest,
     FileContentResponse,
     RepoCommitRequest,
     RepoItem,
     RepoPRRequest,
+    TreeDeltaResponse,
     TreeEntry,
     TreeResponse,
 )
 from app.services.github import (
+    compare_commits,
     create_branch,
     get_branch_sha,
     get_default_branch,
-    get_file_content,
+    get_file_text,
+    get_full_tree,
     get_tree,
     list_branches,
     list_repos,
+    read_file_lines,
+    stream_file_raw,
+    token_scope,
+    tree_cache,
 )
+from app.services.prefetch import start_prefetch
+from app.services.trees import compare_to_delta, diff_trees, limit_depth
 
 router = APIRouter(tags=["repos"])
 
+_TREE_ENTRY_FIELDS = tuple(TreeEntry.model_fields)
+
 
 @router.get("/me")
 async def get_me(user: Annotated[User, Depends(get_current_user)]):
@@ -60,11 +81,13 @@ async def get_branches(
     repo: str,
     user: Annotated[User, Depends(get_current_user)],
 ):
+    """Branches with head SHAs. Also starts a prefetch of the default branch for /agent/patch."""
     token = get_github_token(user)
     if not token:
         raise HTTPException(status_code=401, detail="GitHub token not found")
     branches = await list_branches(token, owner, repo)
-    return [BranchItem(name=b["name"], sha=b["commit"]["sha"]) for b in branches]
+    start_prefetch(user.id, token, owner, repo)
+    return ORJSONResponse([{"name": b["name"], "sha": b["commit"]["sha"]} for b in branches])
 
 
 @router.post("/repos/{owner}/{repo}/branches")
@@ -77,6 +100,7 @@ async def create_branch_endpoint(
     token = get_github_token(user)
     if not token:
         raise HTTPException(status_code=401, detail="GitHub token not found")
+    await require_push(token, owner, repo)
     from_ref = body.from_ref
     if from_ref == "HEAD":
         from_ref = await get_default_branch(token, owner, repo)
@@ -103,11 +127,61 @@ async def get_repo_tree(
         ref = await get_default_branch(token, owner, repo)
     sha = await get_branch_sha(token, owner, repo, ref)
     data = await get_tree(token, owner, repo, sha)
-    return TreeResponse(
-        sha=data["sha"],
-        tree=[TreeEntry(path=e["path"], type=e["type"], sha=e.get("sha")) for e in data["tree"]],
-        truncated=data.get("truncated", False),
-    )
+    start_prefetch(user.id, token, owner, repo, sha=sha)
+    # Project the cached entries onto the TreeEntry fields and serialize them
+    # directly, skipping per-entry model construction.
+    return ORJSONResponse({
+        "sha": data["sha"],
+        "tree": [{k: e.get(k) for k in _TREE_ENTRY_FIELDS} for e in data["tree"]],
+        "truncated": data.get("truncated", False),
+        "commit_sha": sha,
+    })
+
+
+@router.get("/repos/{owner}/{repo}/tree/delta", response_model=TreeDeltaResponse)
+async def get_repo_tree_delta(
+    owner: str,
+    repo: str,
+    base_tree: str,
+    base_commit: str | None = None,
+    ref: str | None = None,
+    branch: str | None = None,
+    user: Annotated[User, Depends(get_current_user)] = None,
+):
+    """Entries added/removed/modified between the client's tree (base_tree, the `sha`
+    from /tree) and the current ref. Diffs cached trees when possible, else uses the
+    compare API (needs base_commit, the `commit_sha` from /tree), else fetches base_tree."""
+    token = get_github_token(user)
+    if not token:
+        raise HTTPException(status_code=401, detail="GitHub token not found")
+    ref = ref or branch
+    if not ref:
+        ref = await get_default_branch(token, owner, repo)
+    head_commit = await get_branch_sha(token, owner, repo, ref)
+    head = await get_full_tree(token, owner, repo, head_commit)
+
+    delta = None
+    if head["sha"] == base_tree:
+        delta, source = {"added": [], "removed": [], "modified": []}, "unchanged"
+    elif (base := tree_cache.get((owner, repo, base_tree, token_scope(token)))) is not None:
+        delta, source = diff_trees(base["tree"], head["tree"]), "cache"
+    elif base_commit:
+        try:
+            cmp = await compare_commits(token, owner, repo, base_commit, head_commit)
+        except httpx.HTTPStatusError:
+            cmp = {}
+        files = cmp.get("files")
+        # Compare diffs against the merge base; after a force-push or rebase that is not
+        # base_commit, so fall through to a tree fetch. Likewise past the 300-file cap.
+        merge_base = (cmp.get("merge_base_commit") or {}).get("sha")
+        if files is not None and len(files) < 300 and merge_base == base_commit:
+            delta, source = compare_to_delta(files, head["tree"]), "compare"
+    if delta is None:
+        base = await get_full_tree(token, owner, repo, base_tree)
+        delta, source = diff_trees(base["tree"], head["tree"]), "fetch"
+
+    delta = limit_depth(delta, 4)
+    return ORJSONResponse({"base_sha": base_tree, "sha": head["sha"], "commit_sha": head_commit, **delta, "source": source})
 
 
 @router.get("/repos/{owner}/{repo}/file", response_model=FileContentResponse)
@@ -117,16 +191,173 @@ async def get_file(
     path: str,
     ref: str | None = None,
     branch: str | None = None,
+    sha: str | None = None,
+    start_line: int = Query(1, ge=1),
+    end_line: int | None = Query(None, ge=1),
     user: Annotated[User, Depends(get_current_user)] = None,
 ):
+    """File text via GitHub's raw media type. start_line/end_line (1-based, inclusive)
+    page through big files; sha (blob SHA from /tree) reads through the blob API."""
     token = get_github_token(user)
     if not token:
         raise HTTPException(status_code=401, detail="GitHub token not found")
+    if end_line is not None and end_line < start_line:
+        raise HTTPException(status_code=400, detail="end_line must be >= start_line")
     ref = ref or branch
-    fc = await get_file_content(token, owner, repo, path, ref)
-    import base64
-    content = base64.b64decode(fc.get("content", "")).decode("utf-8", errors="replace")
-    return FileContentResponse(content=content, path=fc.get("path", path))
+    try:
+        content, has_more = await read_file_lines(token, owner, repo, path, ref, start_line, end_line, sha)
+    except httpx.HTTPStatusError as e:
+        raise HTTPException(status_code=e.response.status_code, detail="Failed to fetch file")
+    return FileContentResponse(
+        content=content,
+        encoding="utf-8",
+        path=path,
+        start_line=start_line,
+        end_line=end_line,
+        has_more=has_more,
+    )
+
+
+def _parse_byte_range(header: str) -> Optional[tuple[Optional[int], Optional[int]]]:
+    """Parse a single 'bytes=a-b' / 'bytes=a-' / 'bytes=-n' range. Returns None if unsupported."""
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or "," in spec:
+        return None
+    first, _, last = spec.strip().partition("-")
+    try:
+        start = int(first) if first else None
+        end = int(last) if last else None
+    except ValueError:
+        return None
+    if start is None and end is None:
+        return None
+    if start is not None and end is not None and end < start:
+        return None
+    return start, end
+
+
+async def _slice_stream(chunks: AsyncIterator[bytes], start: int, end: Optional[int]) -> AsyncIterator[bytes]:
+    """Yield bytes start..end (inclusive) of a stream; stops reading once end is passed."""
+    offset = 0
+    async for chunk in chunks:
+        chunk_end = offset + len(chunk)
+        if chunk_end > start:
+            lo = max(start - offset, 0)
+            hi = len(chunk) if end is None else min(end + 1 - offset, len(chunk))
+            if hi > lo:
+                yield chunk[lo:hi]
+        offset = chunk_end
+        if end is not None and offset > end:
+            return
+
+
+@router.get("/repos/{owner}/{repo}/raw")
+async def get_file_raw(
+    owner: str,
+    repo: str,
+    path: str,
+    ref: str | None = None,
+    branch: str | None = None,
+    sha: str | None = None,
+    range_header: str | None = Header(None, alias="Range"),
+    user: Annotated[User, Depends(get_current_user)] = None,
+):
+    """Stream raw file bytes from GitHub. Honors a single byte Range."""
+    token = get_github_token(user)
+    if not token:
+        raise HTTPException(status_code=401, detail="GitHub token not found")
+    byte_range = _parse_byte_range(range_header) if range_header else None
+
+    stack = AsyncExitStack()
+    try:
+        r = await stack.enter_async_context(
+            stream_file_raw(token, owner, repo, path, ref or branch, sha, range_header if byte_range else None)
+        )
+    except httpx.HTTPStatusError as e:
+        await stack.aclose()
+        raise HTTPException(status_code=e.response.status_code, detail="Failed to fetch file")
+
+    headers = {"Accept-Ranges": "bytes"}
+    status_code = 200
+    # aiter_bytes() undoes any Content-Encoding, so upstream lengths only describe
+    # the bytes we send when the body was not encoded.
+    encoded = r.headers.get("content-encoding", "identity").lower() != "identity"
+    length = None if encoded else r.headers.get("content-length")
+    body: AsyncIterator[bytes] = r.aiter_bytes()
+    if r.status_code == 206 and encoded:
+        # We asked for identity; an encoded slice cannot be decoded on its own.
+        await stack.aclose()
+        raise HTTPException(status_code=502, detail="Upstream sent an encoded partial response")
+    if r.status_code == 206:
+        status_code = 206
+        for name in ("Content-Range", "Content-Length"):
+            if name.lower() in r.headers:
+                headers[name] = r.headers[name.lower()]
+    elif byte_range and length is not None:
+        # Upstream ignored the Range header; slice the stream ourselves.
+        total = int(length)
+        start, end = byte_range
+        if start is None:
+            start, end = max(total - (end or 0), 0), total - 1
+        if start >= total:
+            await stack.aclose()
+            raise HTTPException(status_code=416, detail="Range not satisfiable", headers={"Content-Range": f"bytes */{total}"})
+        end = total - 1 if end is None else min(end, total - 1)
+        headers["Content-Range"] = f"bytes {start}-{end}/{total}"
+        headers["Content-Length"] = str(end - start + 1)
+        status_code = 206
+        body = _slice_stream(body, start, end)
+    elif length is not None:
+        # Also the fallback for a Range we cannot place without the total: the whole file, 200.
+        headers["Content-Length"] = length
+
+    async def stream() -> AsyncIterator[bytes]:
+        try:
+            async for chunk in body:
+                yield chunk
+        finally:
+            await stack.aclose()
+
+    return StreamingResponse(stream(), status_code=status_code, media_type="application/octet-stream", headers=headers)
+
+
+@router.post("/repos/{owner}/{repo}/files")
+async def get_files_bulk(
+    owner: str,
+    repo: str,
+    body: BulkFilesRequest,
+    user: Annotated[User, Depends(get_current_user)],
+):
+    """Fetch several files concurrently. Streams one NDJSON record per file as it
+    completes: {"path", "content"} or {"path", "error", "status"}."""
+    token = get_github_token(user)
+    if not token:
+        raise HTTPException(status_code=401, detail="GitHub token not found")
+    paths = list(dict.fromkeys(body.paths))
+    sem = asyncio.Semaphore(get_settings().bulk_file_concurrency)
+
+    async def fetch(path: str) -> dict:
+        async with sem:
+            try:
+                return {"path": path, "content": await get_file_text(token, owner, repo, path, body.ref)}
+            except httpx.HTTPStatusError as e:
+                return {"path": path, "error": "Failed to fetch file", "status": e.response.status_code}
+            except httpx.HTTPError as e:
+                return {"path": path, "error": str(e) or type(e).__name__, "status": 502}
+            except Exception as e:
+                # One bad file (e.g. undecodable) must not cut the stream short for the rest.
+                return {"path": path, "error": str(e) or type(e).__name__, "status": 500}
+
+    async def stream() -> AsyncIterator[bytes]:
+        tasks = [asyncio.create_task(fetch(p)) for p in paths]
+        try:
+            for done in asyncio.as_completed(tasks):
+                yield orjson.dumps(await done) + b"\n"
+        finally:
+            for t in tasks:
+                t.cancel()
+
+    return StreamingResponse(stream(), media_type="application/x-ndjson")
 
 
 @router.post("/repos/{owner}/{repo}/commit")
@@ -138,14 +369,14 @@ async def repo_commit(
 ):
     """Commit patches to branch. Alias for /git/apply-and-commit."""
     from app.services.github import apply_patch_and_commit
-    from app.services.patch_validator import validate_patch
 
     token = get_github_token(user)
     if not token:
         raise HTTPException(status_code=401, detail="GitHub token not found")
+    await require_push(token, owner, repo)
 
     patch = "\n".join(body.patches) if body.patches else ""
-    valid, msg, _ = validate_patch(patch)
+    valid, msg, _ = await validate_patch_async(patch)
     if not valid:
         raise HTTPException(status_code=400, detail=msg or "Patch validation failed")
 
@@ -154,6 +385,37 @@ async def repo_commit(
         return {"commit_sha": sha, "branch": body.branch}
     except ValueError as e:
         raise HTTPException(status_code=400, detail=str(e))
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 422:
+            raise HTTPException(status_code=409, detail="Branch moved while committing; retry")
+        raise
+
+
+@router.post("/repos/{owner}/{repo}/commit/batch", response_model=BatchCommitResponse)
+async def repo_commit_batch(
+    owner: str,
+    repo: str,
+    body: BatchCommitRequest,
+    user: Annotated[User, Depends(get_current_user)],
+):
+    """
+    Validate independent patches one by one, drop invalid, conflicting or
+    non-applying ones, and commit the rest as a single commit. Results are per
+    patch, in request order; with dry_run nothing is committed.
+    """
+    from app.services.batch import commit_batch
+
+    token = get_github_token(user)
+    if not token:
+        raise HTTPException(status_code=401, detail="GitHub token not found")
+    if not body.dry_run:
+        await require_push(token, owner, repo)
+    try:
+        return await commit_batch(token, owner, repo, body.branch, body.message, body.patches, body.dry_run)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 422:
+            raise HTTPException(status_code=409, detail="Branch moved while committing; retry")
+        raise HTTPException(status_code=e.response.status_code, detail="GitHub request failed")
 
 
 @router.post("/repos/{owner}/{repo}/pr")
@@ -169,6 +431,7 @@ async def repo_pr(
     token = get_github_token(user)
     if not token:
         raise HTTPException(status_code=401, detail="GitHub token not found")
+    await require_push(token, owner, repo)
     base = body.base or await get_default_branch(token, owner, repo)
     try:
         pr_url = await create_pr(token, owner, repo, body.head, base, body.title, body.body)
@@ -0,0 +1,66 @@
+import hashlib
+import hmac
+from typing import Any, Optional
+
+import orjson
+from fastapi import APIRouter, Header, HTTPException, Request
+
+from app.config import get_settings
+from app.services.github import invalidate_branch, invalidate_repo_meta
+
+router = APIRouter(prefix="/webhooks", tags=["webhooks"])
+
+
+def verify_signature(secret: str, body: bytes, signature: Optional[str]) -> bool:
+    """Check GitHub's X-Hub-Signature-256 header (sha256=<hex HMAC of the raw body>)."""
+    if not signature or not signature.startswith("sha256="):
+        return False
+    expected = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return hmac.compare_digest(expected, signature[len("sha256="):])
+
+
+def _branch_for_event(event: str, payload: dict[str, Any]) -> Optional[str]:
+    if event == "push":
+        ref = payload.get("ref", "")
+        return ref[len("refs/heads/"):] if ref.startswith("refs/heads/") else None
+    if event in ("create", "delete") and payload.get("ref_type") == "branch":
+        return payload.get("ref")
+    return None
+
+
+@router.post("/github")
+async def github_webhook(
+    request: Request,
+    x_github_event: str = Header(""),
+    x_hub_signature_256: Optional[str] = Header(None),
+):
+    """
+    Invalidate cached branch heads on push/create/delete and cached repo
+    metadata on repository/member events. Nothing is refetched here: the next
+    request for the repo reloads the head with its caller's own token (branch
+    listings and tree loads also schedule a prefetch).
+    """
+    settings = get_settings()
+    if not settings.github_webhook_secret:
+        raise HTTPException(status_code=404, detail="Webhooks not configured")
+    body = await request.body()
+    if not verify_signature(settings.github_webhook_secret, body, x_hub_signature_256):
+        raise HTTPException(status_code=401, detail="Invalid signature")
+    if x_github_event == "ping":
+        return {"ok": True}
+
+    try:
+        payload = orjson.loads(body)
+    except orjson.JSONDecodeError:
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    if not isinstance(payload, dict):
+        raise HTTPException(status_code=400, detail="Invalid JSON payload")
+    repository = payload.get("repository") or {}
+    owner = (repository.get("owner") or {}).get("login")
+    repo = repository.get("name")
+    if owner and repo and x_github_event in ("repository", "member"):
+        return {"ok": True, "invalidated": invalidate_repo_meta(owner, repo)}
+    branch = _branch_for_event(x_github_event, payload)
+    if not owner or not repo or not branch:
+        return {"ok": True, "invalidated": 0}
+    return {"ok": True, "invalidated": invalidate_branch(owner, repo, branch)}
@@ -54,18 +54,39 @@ class TreeEntry(BaseModel):
     path: str
     type: str  # "blob" or "tree"
     sha: Optional[str] = None
+    mode: Optional[str] = None  # git file mode, e.g. "100644" or "100755"
+    size: Optional[int] = None  # bytes, blobs only
 
 
 class TreeResponse(BaseModel):
     sha: str
     tree: list[TreeEntry]
     truncated: bool = False
+    commit_sha: Optional[str] = None
+
+
+class TreeDeltaResponse(BaseModel):
+    base_sha: str
+    sha: str
+    commit_sha: str
+    added: list[TreeEntry]
+    removed: list[TreeEntry]
+    modified: list[TreeEntry]
+    source: str  # "unchanged" | "cache" | "compare" | "fetch"
 
 
 class FileContentResponse(BaseModel):
     content: str
     encoding: str = "base64"
     path: str
+    start_line: int = 1
+    end_line: Optional[int] = None
+    has_more: bool = False
+
+
+class BulkFilesRequest(BaseModel):
+    paths: list[str] = Field(..., min_length=1, max_length=100)
+    ref: Optional[str] = None
 
 
 # Agent
@@ -75,8 +96,21 @@ class AgentPatchRequest(BaseModel):
     branch: str
     user_goal: str = Field(..., max_length=2000)
     selected_files: list[str] = Field(default_factory=list, max_length=50)
+    # Subset of selected_files to send in full; the others are sent as symbol outlines
+    edit_files: Optional[list[str]] = Field(None, max_length=50)
     extra_instructions: Optional[str] = Field(None, max_length=500)
     claude_api_key: str = Field(..., min_length=1)
+    # > 1: generate this many candidates concurrently, return the first that applies cleanly
+    candidates: int = Field(1, ge=1, le=8)
+    model: Optional[str] = Field(None, max_length=100)  # "fast", "default" or an allowed model id
+    no_cache: bool = False  # skip the result cache and generate afresh
+
+
+class RouteInfo(BaseModel):
+    name: str  # "fast" | "default" | "override"
+    model: str
+    max_tokens: int
+    reason: str
 
 
 class AgentPatchResponse(BaseModel):
@@ -84,6 +118,12 @@ class AgentPatchResponse(BaseModel):
     patch: str
     summary: str
     files_changed: list[str]
+    candidates_tried: int = 1
+    valid: Optional[bool] = None  # did the returned patch validate and dry-run apply
+    validation_error: Optional[str] = None
+    repair_calls: int = 0  # hunk-level repair calls made for this patch
+    route: Optional[RouteInfo] = None
+    cached: bool = False  # served from the result cache, no model call made
 
 
 class AgentChatMessage(BaseModel):
@@ -97,12 +137,42 @@ class AgentChatRequest(BaseModel):
     message: str = Field(..., max_length=2000)
     history: list[AgentChatMessage] = Field(default_factory=list, max_length=20)
     claude_api_key: str = Field(..., min_length=1)
+    model: Optional[str] = Field(None, max_length=100)  # "fast", "default" or an allowed model id
 
 
 class AgentChatResponse(BaseModel):
     content: str
     patch: Optional[str] = None
     files_changed: list[str] = Field(default_factory=list)
+    route: Optional[RouteInfo] = None
+
+
+class ChatSessionCreateRequest(BaseModel):
+    repo: str  # "owner/repo"
+    branch: str
+    selected_files: list[str] = Field(default_factory=list, max_length=30)
+
+
+class ChatSessionResponse(BaseModel):
+    session_id: str
+    repo: str
+    branch: str
+    commit_sha: str
+    tree_sha: str
+    files: list[str]
+    turns: int = 0
+
+
+class ChatSessionMessageRequest(BaseModel):
+    message: str = Field(..., max_length=2000)
+    claude_api_key: str = Field(..., min_length=1)
+    model: Optional[str] = Field(None, max_length=100)
+
+
+class ChatSessionMessageResponse(AgentChatResponse):
+    session_id: str
+    context_refreshed: bool = False
+    commit_sha: str
 
 
 # Patch validation
@@ -154,12 +224,46 @@ class CreatePRResponse(BaseModel):
     pr_number: int
 
 
+class ShipRequest(BaseModel):
+    """Branch, commit and open a PR in one call (/git/ship)."""
+    owner: str
+    repo: str
+    branch: str  # new branch to create
+    base: Optional[str] = None  # default branch if not set
+    patch: str = Field(..., max_length=100_000)
+    commit_message: str = Field(..., max_length=500)
+    title: str = Field(..., max_length=200)
+    body: Optional[str] = Field(None, max_length=5000)
+
+
 class RepoCommitRequest(BaseModel):
     branch: str
     message: str = Field(..., max_length=500)
     patches: list[str] = Field(..., max_length=50)
 
 
+class BatchCommitRequest(BaseModel):
+    """Independent patches against the branch head, validated and reported one by one."""
+    branch: str
+    message: str = Field(..., max_length=500)
+    patches: list[str] = Field(..., min_length=1, max_length=50)
+    dry_run: bool = False  # validate, check conflicts and dry-run apply only
+
+
+class BatchPatchResult(BaseModel):
+    index: int
+    status: str  # ok (dry run), applied, invalid, conflict or does_not_apply
+    message: Optional[str] = None
+    files: list[str] = []
+
+
+class BatchCommitResponse(BaseModel):
+    branch: str
+    base_sha: str
+    commit_sha: Optional[str] = None  # None when nothing was committed
+    results: list[BatchPatchResult]
+
+
 class RepoPRRequest(BaseModel):
     head: str
     base: Optional[str] = None
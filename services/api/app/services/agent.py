@@ -1,10 +1,31 @@
 """
 Claude agent: generates unified diff patch from user goal and repo context.
 """
+import asyncio
 import re
-from typing import Any
+import time
+from typing import Any, Awaitable, Callable
 
-from anthropic import Anthropic
+from anthropic import AsyncAnthropic
+from anthropic.types import Usage
+
+from app.config import get_settings
+from app.metrics import LLM_STREAM_ABORTS, observe_llm
+from app.offload import check_patch_applies_async, parse_agent_response_async, validate_patch_async
+from app.patch_utils import parse_unified_diff
+from app.services.history import compact_history, estimate_tokens
+from app.services.outline import outline
+from app.services.repair import repair_patch
+from app.services.routing import Route, choose_route
+from app.services.stream_parser import AgentStreamParser
+from app.tracing import span
+
+# Candidate i uses CANDIDATE_TEMPERATURES[i]: one near-greedy draw, then increasingly varied ones.
+CANDIDATE_TEMPERATURES = (0.0, 0.5, 0.8, 1.0, 0.3)
+
+# Part of the /agent/patch result cache key: bump when AGENT_SYSTEM, the prompt
+# layout or candidate selection changes, so earlier results are not reused.
+PROMPT_VERSION = 1
 
 AGENT_SYSTEM = """You are a code assistant that generates unified diff patches only.
 You must NOT directly edit files. You output exactly:
@@ -35,6 +56,7 @@ def build_context_prompt(
     selected_files: dict[str, str],
     user_goal: str,
     extra_instructions: str | None = None,
+    outlines: dict[str, str] | None = None,
 ) -> str:
     parts = [
         "## Repo structure (directory tree)",
@@ -51,6 +73,17 @@ def build_context_prompt(
         parts.append("```")
         parts.append("")
 
+    if outlines:
+        parts.append("## Related file outlines (signatures with line numbers; bodies omitted)")
+        parts.append("Prefer editing the files shown in full above; patch these only if the goal requires it.")
+        parts.append("")
+        for path, text in outlines.items():
+            parts.append(f"### {path} (outline)")
+            parts.append("```")
+            parts.append(text)
+            parts.append("```")
+            parts.append("")
+
     parts.append("## User goal")
     parts.append(user_goal)
     if extra_instructions:
@@ -61,6 +94,55 @@ def build_context_prompt(
     return "\n".join(parts)
 
 
+def split_context(
+    selected_files: dict[str, str],
+    user_goal: str,
+    edit_files: list[str] | None = None,
+    full_text_chars: int | None = None,
+    blob_shas: dict[str, str] | None = None,
+) -> tuple[dict[str, str], dict[str, str]]:
+    """
+    Decide which selected files go into the prompt in full and which as outlines.
+    Returns (full, outlines).
+
+    edit_files, when given, are the files sent in full. Otherwise the full set is
+    the files named in the goal plus the smallest remaining files, until
+    CONTEXT_FULL_TEXT_CHARS is reached. Files left over are outlined if their
+    language is supported; if not, they are sent in full as before. blob_shas
+    (path -> tree blob SHA) saves hashing each file for the outline cache.
+    """
+    if full_text_chars is None:
+        full_text_chars = get_settings().context_full_text_chars
+    goal = user_goal.lower()
+
+    def named_in_goal(path: str) -> bool:
+        name = path.rsplit("/", 1)[-1].lower()
+        stem = name.rsplit(".", 1)[0]
+        return name in goal or path.lower() in goal or (len(stem) >= 4 and re.search(rf"\b{re.escape(stem)}\b", goal) is not None)
+
+    if edit_files is not None:
+        targets = [p for p in selected_files if p in set(edit_files)]
+    else:
+        targets = [p for p in selected_files if named_in_goal(p)]
+        used = sum(len(selected_files[p]) for p in targets)
+        for path in sorted((p for p in selected_files if p not in targets), key=lambda p: len(selected_files[p])):
+            if used + len(selected_files[path]) > full_text_chars:
+                break
+            targets.append(path)
+            used += len(selected_files[path])
+
+    blob_shas = blob_shas or {}
+    full: dict[str, str] = {}
+    outlines: dict[str, str] = {}
+    for path, content in selected_files.items():
+        text = None if path in targets else outline(path, content, blob_shas.get(path))
+        if text is None:
+            full[path] = content
+        else:
+            outlines[path] = text
+    return full, outlines
+
+
 def parse_agent_response(text: str) -> tuple[list[str], str, str]:
     """Parse agent response into plan, patch, summary."""
     plan: list[str] = []
@@ -83,50 +165,261 @@ def parse_agent_response(text: str) -> tuple[list[str], str, str]:
     return plan, patch, summary
 
 
+def _patch_files(patch: str) -> list[str]:
+    files_changed: list[str] = []
+    for line in patch.split("\n"):
+        if line.startswith("--- ") or line.startswith("+++ "):
+            path = line[4:].split("\t")[0].strip()
+            if path.startswith("a/") or path.startswith("b/"):
+                path = path[2:]
+            if path and path not in files_changed:
+                files_changed.append(path)
+    return files_changed
+
+
+async def _generate_once(
+    client: AsyncAnthropic,
+    prompt: str,
+    route: Route,
+    model: str | None = None,
+    temperature: float | None = None,
+) -> dict[str, Any]:
+    """
+    Stream one generation through AgentStreamParser. If the streamed patch is
+    certain to fail validation, the stream is closed right away and the partial
+    result carries rejected=(reason, message).
+    """
+    settings = get_settings()
+    parser = AgentStreamParser(settings.patch_max_files, settings.patch_max_lines)
+    model = model or route.model
+    kwargs: dict[str, Any] = {}
+    if temperature is not None:
+        kwargs["temperature"] = temperature
+    with span("agent.llm", model=model, route=route.name) as llm_span:
+        started = time.perf_counter()
+        usage = None
+        async with client.messages.stream(
+            model=model,
+            max_tokens=route.max_tokens,
+            system=AGENT_SYSTEM,
+            messages=[{"role": "user", "content": prompt}],
+            **kwargs,
+        ) as stream:
+            # Usage is taken from the events rather than the final message, so an
+            # aborted generation still records the tokens it was billed for.
+            async for event in stream:
+                if event.type == "message_start":
+                    usage = Usage(input_tokens=event.message.usage.input_tokens,
+                                  output_tokens=event.message.usage.output_tokens)
+                elif event.type == "message_delta" and usage is not None:
+                    usage.output_tokens = event.usage.output_tokens
+                elif event.type == "content_block_delta" and event.delta.type == "text_delta":
+                    parser.feed(event.delta.text)
+                    if parser.rejection:
+                        break
+        # Leaving the block closes the HTTP response, which stops generation on an early abort.
+        if parser.rejection:
+            llm_span.attributes["aborted"] = parser.rejection[0]
+            LLM_STREAM_ABORTS.labels(reason=parser.rejection[0]).inc()
+        observe_llm("patch", model, time.perf_counter() - started, usage)
+
+    with span("agent.parse"):
+        parser.close()
+        result = parser.result()
+    if parser.rejection:
+        result["rejected"] = parser.rejection
+    return result
+
+
+async def check_candidate(
+    result: dict[str, Any],
+    originals: dict[str, str],
+    load_file: Callable[[str], Awaitable[str]] | None = None,
+) -> str | None:
+    """
+    Validate and dry-run apply a generated patch. Files missing from originals
+    are fetched with load_file (and added to originals for later candidates).
+    Returns None if the patch is usable, else the reason it is not.
+    """
+    if result.get("rejected"):
+        return f"Generation stopped early: {result['rejected'][1]}"
+    if not result["patch"]:
+        return "No patch in response"
+    valid, error, _ = await validate_patch_async(result["patch"])
+    if not valid:
+        return error
+    if load_file is not None:
+        for fp in parse_unified_diff(result["patch"]):
+            if fp.path not in originals:
+                try:
+                    originals[fp.path] = await load_file(fp.path)
+                except Exception as e:
+                    return f"Could not fetch {fp.path}: {e}"
+    return await check_patch_applies_async(result["patch"], originals)
+
+
+def candidate_plan(n: int, model: str) -> list[tuple[str, float]]:
+    """(model, temperature) for each of n candidates: models round-robin, temperatures spread."""
+    models = get_settings().patch_candidate_models_list or [model]
+    return [(models[i % len(models)], CANDIDATE_TEMPERATURES[i % len(CANDIDATE_TEMPERATURES)]) for i in range(n)]
+
+
+async def _repair_candidate(
+    client: AsyncAnthropic,
+    route: Route,
+    result: dict[str, Any],
+    originals: dict[str, str],
+    max_attempts: int,
+) -> dict[str, Any]:
+    """
+    Repair the failing hunks of a checked candidate that passed validation but does
+    not apply (see app.services.repair). Returns the candidate, repaired if that worked.
+    """
+    if result["valid"] or not result["patch"] or max_attempts <= 0:
+        return result
+    paths = [fp.path for fp in parse_unified_diff(result["patch"])]
+    if not paths or any(p not in originals for p in paths) or not (await validate_patch_async(result["patch"]))[0]:
+        return result
+
+    async def ask_model(system: str, prompt: str) -> str:
+        with span("agent.llm", model=route.model, route=route.name, op="repair"):
+            started = time.perf_counter()
+            message = await client.messages.create(
+                model=route.model,
+                max_tokens=4000,
+                system=system,
+                messages=[{"role": "user", "content": prompt}],
+            )
+            observe_llm("repair", route.model, time.perf_counter() - started, getattr(message, "usage", None))
+        return "".join(block.text for block in message.content if hasattr(block, "text"))
+
+    with span("agent.repair"):
+        try:
+            patch, calls, _ = await repair_patch(result["patch"], originals, ask_model, max_attempts)
+        except Exception:
+            return result  # keep the unrepaired candidate and its validation error
+        error = await check_candidate({**result, "patch": patch}, originals)
+    if error is not None:
+        return {**result, "repair_calls": calls}
+    return {
+        **result,
+        "patch": patch,
+        "files_changed": _patch_files(patch),
+        "valid": True,
+        "validation_error": None,
+        "repair_calls": calls,
+    }
+
+
+async def _best_candidate(
+    client: AsyncAnthropic,
+    prompt: str,
+    route: Route,
+    originals: dict[str, str],
+    candidates: int,
+    load_file: Callable[[str], Awaitable[str]] | None,
+) -> dict[str, Any]:
+    plan = candidate_plan(candidates, route.model) if candidates > 1 else [(route.model, None)]
+    tasks = [
+        asyncio.create_task(_generate_once(client, prompt, route, model, temperature))
+        for model, temperature in plan
+    ]
+    tried = 0
+    fallback: dict[str, Any] | None = None
+    last_error: Exception | None = None
+    try:
+        with span("agent.candidates", count=len(tasks)):
+            for next_done in asyncio.as_completed(tasks):
+                try:
+                    result = await next_done
+                except Exception as e:
+                    last_error = e
+                    continue
+                tried += 1
+                error = await check_candidate(result, originals, load_file)
+                if error is None:
+                    return {**result, "candidates_tried": tried, "valid": True, "validation_error": None}
+                if fallback is None:
+                    fallback = {**result, "valid": False, "validation_error": error}
+    finally:
+        for t in tasks:
+            t.cancel()
+        await asyncio.gather(*tasks, return_exceptions=True)
+
+    if fallback is None:
+        raise last_error or RuntimeError("No patch candidates completed")
+    # Only once every candidate has failed: repairing a few hunks is cheaper than a new generation.
+    repaired = await _repair_candidate(client, route, fallback, originals, get_settings().patch_repair_max_attempts)
+    return {**repaired, "candidates_tried": tried}
+
+
+def prepare_patch(
+    repo_map: str,
+    selected_files: dict[str, str],
+    user_goal: str,
+    extra_instructions: str | None = None,
+    model_override: str | None = None,
+    edit_files: list[str] | None = None,
+    blob_shas: dict[str, str] | None = None,
+) -> tuple[str, Route]:
+    """
+    Build the patch prompt and route it. Callers that need the chosen model before
+    generating (e.g. for a cache key) pass the result to generate_patch as prepared.
+    Raises ValueError for a model_override that is not allowed.
+    """
+    with span("agent.prompt") as prompt_span:
+        full, outlines = split_context(selected_files, user_goal, edit_files, blob_shas=blob_shas)
+        prompt = build_context_prompt(repo_map, full, user_goal, extra_instructions, outlines)
+        route = choose_route("patch", estimate_tokens(prompt), len(user_goal), len(full), model_override)
+        prompt_span.attributes.update(
+            route=route.name, model=route.model, route_reason=route.reason, full_files=len(full), outlined_files=len(outlines)
+        )
+    return prompt, route
+
+
 async def generate_patch(
     api_key: str,
     repo_map: str,
     selected_files: dict[str, str],
     user_goal: str,
     extra_instructions: str | None = None,
+    candidates: int = 1,
+    load_file: Callable[[str], Awaitable[str]] | None = None,
+    model_override: str | None = None,
+    edit_files: list[str] | None = None,
+    prepared: tuple[str, Route] | None = None,
+    blob_shas: dict[str, str] | None = None,
 ) -> dict[str, Any]:
     """
     Call Claude to generate a patch. Uses transient API key (never stored).
-    Returns {plan, patch, summary, files_changed}.
-    """
-    client = Anthropic(api_key=api_key)
-    prompt = build_context_prompt(repo_map, selected_files, user_goal, extra_instructions)
-
-    message = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=16000,
-        system=AGENT_SYSTEM,
-        messages=[{"role": "user", "content": prompt}],
-    )
+    Returns {plan, patch, summary, files_changed, route}; route records the model
+    and max_tokens picked by app.services.routing (or model_override).
 
-    text = ""
-    for block in message.content:
-        if hasattr(block, "text"):
-            text += block.text
+    Selected files the patch is unlikely to touch are sent as symbol outlines
+    (see split_context); the dry run below still uses their full text.
 
-    plan, patch, summary = parse_agent_response(text)
+    When load_file is given (or candidates > 1) the patch is validated and dry-run
+    applied against selected_files plus files fetched with load_file, and the result
+    also carries valid, validation_error, candidates_tried and repair_calls.
 
-    # Extract file paths from patch
-    files_changed: list[str] = []
-    for line in patch.split("\n"):
-        if line.startswith("--- ") or line.startswith("+++ "):
-            path = line[4:].split("\t")[0].strip()
-            if path.startswith("a/") or path.startswith("b/"):
-                path = path[2:]
-            if path and path not in files_changed:
-                files_changed.append(path)
+    With candidates > 1, that many generations run concurrently (varying model and
+    temperature) and are checked as they complete; the first one that applies
+    cleanly is returned and the rest are cancelled. A patch that does not apply gets
+    up to PATCH_REPAIR_MAX_ATTEMPTS hunk-level repair calls before it is returned
+    with valid=False. prepared is a (prompt, route) pair from prepare_patch;
+    blob_shas (path -> tree blob SHA) keys the outline cache without rehashing.
+    """
+    settings = get_settings()
+    prompt, route = prepared or prepare_patch(
+        repo_map, selected_files, user_goal, extra_instructions, model_override, edit_files, blob_shas
+    )
 
-    return {
-        "plan": plan,
-        "patch": patch,
-        "summary": summary,
-        "files_changed": files_changed,
-    }
+    async with AsyncAnthropic(api_key=api_key, base_url=settings.anthropic_base_url or None) as client:
+        if candidates <= 1 and load_file is None:
+            result = await _generate_once(client, prompt, route)
+        else:
+            result = await _best_candidate(client, prompt, route, dict(selected_files), candidates, load_file)
+    return {**result, "route": route.as_dict()}
 
 
 async def chat(
@@ -135,9 +428,15 @@ async def chat(
     selected_files: dict[str, str],
     message: str,
     history: list[dict[str, str]],
+    history_state: dict[str, Any] | None = None,
+    model_override: str | None = None,
 ) -> dict[str, Any]:
-    """Conversational chat with Claude. Returns content and optional patch."""
-    client = Anthropic(api_key=api_key)
+    """
+    Conversational chat with Claude. Returns content, optional patch, the route
+    taken and the history compaction state to pass back on the next turn of this
+    conversation.
+    """
+    settings = get_settings()
     context = ""
     if repo_map:
         context += f"## Repo structure\n{repo_map}\n\n"
@@ -146,24 +445,42 @@ async def chat(
         for path, content in list(selected_files.items())[:10]:
             context += f"### {path}\n```\n{content[:8000]}\n```\n\n"
 
+    with span("agent.history"):
+        budget = settings.chat_prompt_token_ceiling - estimate_tokens(context) - estimate_tokens(message)
+        recent, summary_text, history_state = compact_history(
+            history,
+            token_ceiling=max(budget, settings.chat_history_min_tokens),
+            keep_recent=settings.chat_history_keep_recent,
+            state=history_state,
+        )
+    if summary_text:
+        context = f"## Earlier conversation (summary)\n{summary_text}\n\n" + context
+
     messages = []
-    for h in history[-10:]:
+    for h in recent:
         messages.append({"role": h["role"], "content": h["content"]})
     messages.append({"role": "user", "content": f"{context}\n\nUser: {message}"})
 
-    msg = client.messages.create(
-        model="claude-sonnet-4-20250514",
-        max_tokens=8000,
-        system="You are a code assistant. When making code changes, output a unified diff in a ## PATCH section. Format: ## PLAN (bullets), ## PATCH (unified diff), ## SUMMARY.",
-        messages=messages,
-    )
+    prompt_tokens = sum(estimate_tokens(m["content"]) for m in messages)
+    route = choose_route("chat", prompt_tokens, len(message), override=model_override)
+    with span("agent.llm", model=route.model, route=route.name):
+        started = time.perf_counter()
+        async with AsyncAnthropic(api_key=api_key, base_url=settings.anthropic_base_url or None) as client:
+            msg = await client.messages.create(
+                model=route.model,
+                max_tokens=route.max_tokens,
+                system="You are a code assistant. When making code changes, output a unified diff in a ## PATCH section. Format: ## PLAN (bullets), ## PATCH (unified diff), ## SUMMARY.",
+                messages=messages,
+            )
+        observe_llm("chat", route.model, time.perf_counter() - started, getattr(msg, "usage", None))
 
     text = ""
     for block in msg.content:
         if hasattr(block, "text"):
             text += block.text
 
-    plan, patch, summary = parse_agent_response(text)
+    with span("agent.parse"):
+        plan, patch, summary = await parse_agent_response_async(text)
     files_changed = []
     for line in patch.split("\n"):
         if line.startswith("--- ") or line.startswith("+++"):
@@ -175,4 +492,6 @@ async def chat(
         "content": text,
         "patch": patch if patch else None,
         "files_changed": files_changed,
+        "history_state": history_state,
+        "route": route.as_dict(),
     }
@@ -0,0 +1,245 @@
+"""
+Batch commit of independent patches to one branch, with per-patch results.
+
+Every patch is written against the current branch head, and each one is judged
+on its own:
+1. Validate all patches in parallel.
+2. Check each patch against the patches before it. A patch conflicts when its
+   changes touch or border lines already changed by an earlier patch. It also
+   conflicts when either patch creates, deletes or renames a file the other
+   touches.
+3. Dry-run each remaining patch against the file at the head.
+Patches that pass all three are merged into a single edit per file. They land
+in one commit through the git data API, and the branch is fast-forwarded to it.
+A bad patch is reported and left out; it does not sink the batch.
+"""
+import asyncio
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+import httpx
+
+from app.config import get_settings
+from app.offload import apply_patch_async, parse_unified_diff_async, run_cpu, validate_patch_async
+from app.patch_utils import FilePatch
+from app.services.github import (
+    create_blob,
+    create_commit,
+    create_tree,
+    get_branch_sha,
+    get_file_text,
+    get_full_tree,
+    invalidate_branch,
+    update_branch,
+)
+from app.services.outline import git_blob_sha
+
+DEFAULT_MODE = "100644"
+
+# (removed original line indices, lines inserted before original index)
+Edits = tuple[set[int], dict[int, list[str]]]
+
+
+@dataclass
+class PatchOutcome:
+    index: int
+    status: str = "ok"  # ok, applied, invalid, conflict or does_not_apply
+    message: Optional[str] = None
+    files: list[str] = field(default_factory=list)
+    file_patches: list[FilePatch] = field(default_factory=list, repr=False)
+
+    def fail(self, status: str, message: str) -> None:
+        self.status, self.message = status, message
+
+    def as_dict(self) -> dict[str, Any]:
+        return {"index": self.index, "status": self.status, "message": self.message, "files": self.files}
+
+
+def hunk_edits(fp: FilePatch) -> Edits:
+    """Edits fp makes, located the same way apply_patch locates hunks (at old_start, no fuzz)."""
+    removed: set[int] = set()
+    inserts: dict[int, list[str]] = {}
+    for hunk in fp.hunks:
+        pos = hunk.old_start - 1
+        for prefix, content in hunk.lines:
+            if prefix == "+":
+                inserts.setdefault(pos, []).append(content)
+            else:
+                if prefix == "-":
+                    removed.add(pos)
+                pos += 1
+    return removed, inserts
+
+
+def touched_gaps(edits: Edits) -> set[int]:
+    """Line gaps (gap i is just before original line i) that the edits change or border."""
+    removed, inserts = edits
+    return {g for r in removed for g in (r, r + 1)} | set(inserts)
+
+
+def apply_edits(original: str, edits: list[Edits]) -> str:
+    """Apply non-conflicting edits to original in one pass."""
+    lines = original.split("\n")
+    removed: set[int] = set().union(*(r for r, _ in edits))
+    inserts: dict[int, list[str]] = {}
+    for _, ins in edits:
+        for at, added in ins.items():
+            inserts.setdefault(at, []).extend(added)
+    out: list[str] = []
+    for i, line in enumerate(lines):
+        out.extend(inserts.get(i, ()))
+        if i not in removed:
+            out.append(line)
+    out.extend(inserts.get(len(lines), ()))
+    return "\n".join(out)
+
+
+def _exclusive(fp: FilePatch) -> bool:
+    """Creates, deletes or renames a file: nothing else may touch it in the same batch."""
+    return fp.source is None or fp.path == "/dev/null" or fp.source != fp.path
+
+
+def find_conflicts(outcomes: list[PatchOutcome]) -> None:
+    """Mark ok outcomes that conflict with an earlier ok outcome."""
+    # path -> [(patch index, exclusive, gaps)]
+    claims: dict[str, list[tuple[int, bool, set[int]]]] = {}
+    for o in outcomes:
+        if o.status != "ok":
+            continue
+        mine: list[tuple[str, bool, set[int]]] = []
+        for fp in o.file_patches:
+            exclusive, gaps = _exclusive(fp), touched_gaps(hunk_edits(fp))
+            mine.extend((p, exclusive, gaps) for p in {fp.source, fp.path} - {None, "/dev/null"})
+        clash = next(
+            ((j, path) for path, excl, gaps in mine for j, other_excl, other in claims.get(path, ())
+             if excl or other_excl or gaps & other),
+            None,
+        )
+        if clash:
+            o.fail("conflict", f"Conflicts with patch {clash[0]} in {clash[1]}")
+            continue
+        for path, excl, gaps in mine:
+            claims.setdefault(path, []).append((o.index, excl, gaps))
+
+
+async def _read_originals(
+    token: str, owner: str, repo: str, ref: str, paths: set[str], tree: dict[str, Any]
+) -> dict[str, Optional[tuple[Optional[str], str]]]:
+    """
+    path -> (text, blob SHA) at ref, or None when the file does not exist.
+    Files are read raw by the blob SHA in tree, so size is no limit. text is
+    None for files that are not UTF-8; patching them would corrupt them.
+    """
+    sem = asyncio.Semaphore(get_settings().bulk_file_concurrency)
+    blobs = {e["path"]: e.get("sha") for e in tree["tree"] if e.get("type") == "blob"}
+
+    async def one(path: str) -> tuple[str, Optional[tuple[Optional[str], str]]]:
+        sha = blobs.get(path)
+        if sha is None and not tree.get("truncated"):
+            return path, None
+        async with sem:
+            try:
+                text = await get_file_text(token, owner, repo, path, ref, sha, strict=True)
+            except httpx.HTTPStatusError as e:
+                if e.response.status_code == 404:
+                    return path, None
+                raise
+            except ValueError:
+                return path, (None, sha)
+        return path, (text, sha or git_blob_sha(text))
+
+    return dict(await asyncio.gather(*(one(p) for p in sorted(paths))))
+
+
+async def _dry_run(o: PatchOutcome, originals: dict[str, Optional[tuple[Optional[str], str]]], tree_paths: set[str]) -> None:
+    for fp in o.file_patches:
+        if fp.source is None:
+            if fp.path in tree_paths:
+                o.fail("does_not_apply", f"{fp.path} already exists")
+                return
+            original = ""
+        elif originals.get(fp.source) is None:
+            o.fail("does_not_apply", f"{fp.source} not found")
+            return
+        elif originals[fp.source][0] is None:
+            o.fail("does_not_apply", f"{fp.source} is not UTF-8 text and cannot be patched")
+            return
+        else:
+            original = originals[fp.source][0]
+        if fp.path == "/dev/null":
+            continue
+        try:
+            await apply_patch_async(original, fp)
+        except ValueError as e:
+            o.fail("does_not_apply", f"{fp.path}: {e}")
+            return
+
+
+async def commit_batch(
+    token: str,
+    owner: str,
+    repo: str,
+    branch: str,
+    message: str,
+    patches: list[str],
+    dry_run: bool = False,
+) -> dict[str, Any]:
+    """
+    Validate, merge and (unless dry_run) commit patches on branch as one commit.
+    Returns {branch, base_sha, commit_sha, results}. commit_sha is None when
+    nothing was committed. Each result is {index, status, message, files}.
+    If the branch moves before it is updated, the 422 from GitHub is re-raised.
+    """
+    outcomes = [PatchOutcome(i) for i in range(len(patches))]
+    checks = await asyncio.gather(*(validate_patch_async(p) for p in patches))
+    for o, patch, (valid, error, changes) in zip(outcomes, patches, checks):
+        if not valid:
+            o.fail("invalid", error or "Patch validation failed")
+            continue
+        o.files = [c["path"] for c in changes]
+        o.file_patches = await parse_unified_diff_async(patch)
+    find_conflicts(outcomes)
+
+    ok = [o for o in outcomes if o.status == "ok"]
+    head = await get_branch_sha(token, owner, repo, branch)
+    sources = {fp.source for o in ok for fp in o.file_patches if fp.source}
+    tree = await get_full_tree(token, owner, repo, head)
+    originals = await _read_originals(token, owner, repo, head, sources, tree)
+    modes = {e["path"]: e.get("mode") for e in tree["tree"]}
+    await asyncio.gather(*(_dry_run(o, originals, set(modes)) for o in ok))
+    ok = [o for o in ok if o.status == "ok"]
+
+    result = {"branch": branch, "base_sha": head, "commit_sha": None, "results": [o.as_dict() for o in outcomes]}
+    if dry_run or not ok:
+        return result
+
+    # One merged edit per target file; deletions and rename sources become removals.
+    by_target: dict[str, tuple[Optional[str], list[Edits]]] = {}
+    entries: list[dict[str, Any]] = []
+    for o in ok:
+        for fp in o.file_patches:
+            if fp.source and fp.source != fp.path:
+                entries.append({"path": fp.source, "mode": modes.get(fp.source) or DEFAULT_MODE, "type": "blob", "sha": None})
+            if fp.path != "/dev/null":
+                by_target.setdefault(fp.path, (fp.source, []))[1].append(hunk_edits(fp))
+
+    async def upload(path: str, source: Optional[str], edits: list[Edits]) -> dict[str, Any]:
+        original = originals[source][0] if source else ""
+        text = await run_cpu(apply_edits, original, edits, size=len(original), op="merge")
+        sha = await create_blob(token, owner, repo, text)
+        mode = modes.get(source or path) or DEFAULT_MODE
+        return {"path": path, "mode": mode, "type": "blob", "sha": sha}
+
+    entries += await asyncio.gather(*(upload(path, src, edits) for path, (src, edits) in by_target.items()))
+    tree_sha = await create_tree(token, owner, repo, tree["sha"], entries)
+    commit_sha = await create_commit(token, owner, repo, message, tree_sha, [head])
+    try:
+        await update_branch(token, owner, repo, branch, commit_sha)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 422:
+            invalidate_branch(owner, repo, branch)  # our cached head was stale
+        raise
+    for o in ok:
+        o.status = "applied"
+    result.update(commit_sha=commit_sha, results=[o.as_dict() for o in outcomes])
+    return result
@@ -1,109 +1,479 @@
-from typing import Any, Optional
+import asyncio
+import codecs
+import functools
+import hashlib
+import ssl
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Optional
 
 import httpx
 
-GITHUB_API = "https://api.github.com"
+from app.cache import SingleFlight, TTLCache
+from app.config import get_settings
+from app.metrics import GITHUB_EVENT_HOOKS
+from app.services import invalidation
+from app.tracing import traced
+
+_settings = get_settings()
+
+GITHUB_API = _settings.github_api_url.rstrip("/")
+RAW_MEDIA_TYPE = "application/vnd.github.raw"
+# Trees are content-addressed, so entries never go stale; keyed by (owner, repo,
+# commit-or-tree sha, token scope) so a cached tree is only served to a token that
+# has already read it. A SHA is not a credential: anyone can send one.
+tree_cache = TTLCache("tree", maxsize=_settings.tree_cache_max_entries, ttl=_settings.tree_cache_ttl_seconds)
+# Branch heads move; keyed by (owner, repo, branch, token scope) and dropped by
+# our own writes and by push/create/delete webhooks, in every worker (see invalidation).
+branch_sha_cache = TTLCache("branch_sha", maxsize=4096, ttl=_settings.branch_sha_cache_ttl_seconds)
+# Repo metadata (default branch, visibility, push permission, size) per
+# (owner, repo, token scope). Seeded by list_repos; trusted for
+# REPO_META_FRESH_SECONDS, then revalidated with If-None-Match (a 304 does not
+# count against the rate limit). Entries live for the longer cache TTL so there
+# is an ETag to revalidate with.
+repo_meta_cache = TTLCache("repo_meta", maxsize=4096, ttl=_settings.repo_meta_cache_ttl_seconds)
+# File text per (owner, repo, blob sha, token scope), filled by get_file_text
+# reads by SHA. Blobs are content-addressed, so entries never go stale; the
+# token scope keeps them private to tokens that read them, as for tree_cache.
+blob_text_cache = TTLCache("blob_text", maxsize=_settings.blob_cache_max_entries, ttl=_settings.blob_cache_ttl_seconds)
+# Identical reads in flight at the same time share one upstream call; keyed by
+# (token scope, method, url, params) so users never see each other's results.
+github_flight = SingleFlight("github")
+
+
+@functools.lru_cache(maxsize=1)
+def _ssl_context() -> ssl.SSLContext:
+    """Built once; loading the CA bundle costs ~40 ms of CPU for every new client otherwise."""
+    return httpx.create_ssl_context()
+
+
+def _client(**kwargs: Any) -> httpx.AsyncClient:
+    """AsyncClient for GitHub calls, instrumented for per-endpoint metrics."""
+    return httpx.AsyncClient(event_hooks=GITHUB_EVENT_HOOKS, verify=_ssl_context(), **kwargs)
+
+
+def token_scope(access_token: str) -> str:
+    """Stable, non-reversible cache key component for a user's GitHub token."""
+    return hashlib.sha256(access_token.encode()).hexdigest()[:16]
+
+
+def invalidate_repo_meta(owner: str, repo: str) -> int:
+    """Drop cached metadata for a repo across all users and workers. Returns entries removed here."""
+    invalidation.publish({"kind": "repo_meta", "owner": owner, "repo": repo})
+    return repo_meta_cache.delete_where(lambda k: k[:2] == (owner, repo))
+
+
+def _repo_meta(data: dict[str, Any], etag: Optional[str] = None) -> dict[str, Any]:
+    perms = data.get("permissions")
+    return {
+        "default_branch": data.get("default_branch", "main"),
+        "private": bool(data.get("private", False)),
+        "can_push": bool(perms.get("push")) if perms else None,  # None: GitHub did not say
+        "size": data.get("size", 0),  # KB
+        "etag": etag,
+        "checked": time.monotonic(),
+    }
+
+
+async def _get_json(access_token: str, url: str, params: Optional[dict[str, Any]] = None) -> Any:
+    """GET a JSON resource, coalesced with identical concurrent requests. Do not mutate the result."""
+    params = params or {}
+    key = (token_scope(access_token), "GET", url, tuple(sorted(params.items())))
+
+    async def fetch() -> Any:
+        async with _client() as client:
+            r = await client.get(
+                url,
+                headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
+                params=params,
+            )
+            r.raise_for_status()
+            return r.json()
+
+    return await github_flight.do(key, fetch)
 
 
+def invalidate_branch(owner: str, repo: str, branch: str) -> int:
+    """Drop cached heads for a branch across all users and workers. Returns entries removed here."""
+    invalidation.publish({"kind": "branch", "owner": owner, "repo": repo, "branch": branch})
+    return branch_sha_cache.delete_where(lambda k: k[:3] == (owner, repo, branch))
+
+
+def apply_invalidation(message: dict[str, Any]) -> None:
+    """Drop the entries another worker invalidated (the invalidation.listen callback)."""
+    owner, repo = message.get("owner"), message.get("repo")
+    if message.get("kind") == "branch":
+        branch_sha_cache.delete_where(lambda k: k[:3] == (owner, repo, message.get("branch")))
+    elif message.get("kind") == "repo_meta":
+        repo_meta_cache.delete_where(lambda k: k[:2] == (owner, repo))
+
+
+@traced("github.get_user")
 async def get_user(access_token: str) -> dict[str, Any]:
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{GITHUB_API}/user",
-            headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
-        )
-        r.raise_for_status()
-        return r.json()
+    return await _get_json(access_token, f"{GITHUB_API}/user")
 
 
+@traced("github.list_repos")
 async def list_repos(access_token: str) -> list[dict[str, Any]]:
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{GITHUB_API}/user/repos",
-            headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
-            params={"per_page": 100, "sort": "updated"},
-        )
+    repos = await _get_json(access_token, f"{GITHUB_API}/user/repos", {"per_page": 100, "sort": "updated"})
+    scope = token_scope(access_token)
+    for r in repos:
+        owner = (r.get("owner") or {}).get("login")
+        if owner and r.get("name"):
+            repo_meta_cache.set((owner, r["name"], scope), _repo_meta(r))
+    return repos
+
+
+@traced("github.get_repo_meta")
+async def get_repo_meta(access_token: str, owner: str, repo: str) -> dict[str, Any]:
+    """
+    {default_branch, private, can_push, size, etag, checked} for a repo as seen
+    by this token; from cache while fresh, else revalidated or fetched.
+    """
+    key = (owner, repo, token_scope(access_token))
+    cached = repo_meta_cache.get(key)
+    if cached is not None and time.monotonic() - cached["checked"] < get_settings().repo_meta_fresh_seconds:
+        return cached
+    url = f"{GITHUB_API}/repos/{owner}/{repo}"
+
+    async def fetch() -> dict[str, Any]:
+        headers = {"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"}
+        if cached is not None and cached["etag"]:
+            headers["If-None-Match"] = cached["etag"]
+        async with _client() as client:
+            r = await client.get(url, headers=headers)
+        if r.status_code == 304 and cached is not None:
+            return {**cached, "checked": time.monotonic()}
         r.raise_for_status()
-        return r.json()
+        return _repo_meta(r.json(), r.headers.get("etag"))
+
+    meta = await github_flight.do((key[2], "GET", url, "meta"), fetch)
+    repo_meta_cache.set(key, meta)
+    return meta
 
 
+@traced("github.get_default_branch")
 async def get_default_branch(access_token: str, owner: str, repo: str) -> str:
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{GITHUB_API}/repos/{owner}/{repo}",
+    return (await get_repo_meta(access_token, owner, repo))["default_branch"]
+
+
+@traced("github.list_branches")
+async def list_branches(access_token: str, owner: str, repo: str) -> list[dict[str, Any]]:
+    """Branches with their head commits; the heads also seed branch_sha_cache."""
+    branches = await _get_json(access_token, f"{GITHUB_API}/repos/{owner}/{repo}/branches", {"per_page": 100})
+    scope = token_scope(access_token)
+    for b in branches:
+        branch_sha_cache.set((owner, repo, b["name"], scope), b["commit"]["sha"])
+    return branches
+
+
+@traced("github.get_branch_sha")
+async def get_branch_sha(access_token: str, owner: str, repo: str, branch: str) -> str:
+    key = (owner, repo, branch, token_scope(access_token))
+    cached = branch_sha_cache.get(key)
+    if cached is not None:
+        return cached
+    data = await _get_json(access_token, f"{GITHUB_API}/repos/{owner}/{repo}/git/ref/heads/{branch}")
+    sha = data["object"]["sha"]
+    branch_sha_cache.set(key, sha)
+    return sha
+
+
+@traced("github.create_branch")
+async def create_branch(access_token: str, owner: str, repo: str, name: str, from_sha: str) -> dict[str, Any]:
+    async with _client() as client:
+        r = await client.post(
+            f"{GITHUB_API}/repos/{owner}/{repo}/git/refs",
             headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
+            json={"ref": f"refs/heads/{name}", "sha": from_sha},
         )
         r.raise_for_status()
-        data = r.json()
-        return data.get("default_branch", "main")
+    invalidate_branch(owner, repo, name)
+    return r.json()
 
 
-async def list_branches(access_token: str, owner: str, repo: str) -> list[dict[str, Any]]:
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{GITHUB_API}/repos/{owner}/{repo}/branches",
+@traced("github.update_branch")
+async def update_branch(access_token: str, owner: str, repo: str, name: str, sha: str) -> None:
+    """Fast-forward a branch to sha; GitHub answers 422 if that is not a fast-forward."""
+    async with _client() as client:
+        r = await client.patch(
+            f"{GITHUB_API}/repos/{owner}/{repo}/git/refs/heads/{name}",
             headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
-            params={"per_page": 100},
+            json={"sha": sha, "force": False},
         )
         r.raise_for_status()
-        return r.json()
+    invalidate_branch(owner, repo, name)
 
 
-async def get_branch_sha(access_token: str, owner: str, repo: str, branch: str) -> str:
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{GITHUB_API}/repos/{owner}/{repo}/git/ref/heads/{branch}",
+@traced("github.delete_branch")
+async def delete_branch(access_token: str, owner: str, repo: str, name: str) -> None:
+    async with _client() as client:
+        r = await client.delete(
+            f"{GITHUB_API}/repos/{owner}/{repo}/git/refs/heads/{name}",
             headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
         )
         r.raise_for_status()
-        return r.json()["object"]["sha"]
+    invalidate_branch(owner, repo, name)
 
 
-async def create_branch(access_token: str, owner: str, repo: str, name: str, from_sha: str) -> dict[str, Any]:
-    async with httpx.AsyncClient() as client:
+@traced("github.create_blob")
+async def create_blob(access_token: str, owner: str, repo: str, content: str) -> str:
+    """Upload file content as a git blob. Returns the blob SHA."""
+    async with _client() as client:
         r = await client.post(
-            f"{GITHUB_API}/repos/{owner}/{repo}/git/refs",
+            f"{GITHUB_API}/repos/{owner}/{repo}/git/blobs",
             headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
-            json={"ref": f"refs/heads/{name}", "sha": from_sha},
+            json={"content": __b64encode(content), "encoding": "base64"},
         )
         r.raise_for_status()
-        return r.json()
+        return r.json()["sha"]
 
 
-async def get_tree(access_token: str, owner: str, repo: str, sha: str, depth: int = 4, max_entries: int = 500) -> dict[str, Any]:
-    async with httpx.AsyncClient() as client:
-        r = await client.get(
-            f"{GITHUB_API}/repos/{owner}/{repo}/git/trees/{sha}",
+@traced("github.create_tree")
+async def create_tree(access_token: str, owner: str, repo: str, base_tree: str, entries: list[dict[str, Any]]) -> str:
+    """
+    Tree on top of base_tree with entries ({path, mode, type, sha}; sha None
+    deletes the path). Returns the new tree SHA.
+    """
+    async with _client() as client:
+        r = await client.post(
+            f"{GITHUB_API}/repos/{owner}/{repo}/git/trees",
             headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
-            params={"recursive": "1"},
+            json={"base_tree": base_tree, "tree": entries},
         )
         r.raise_for_status()
-        data = r.json()
-        tree = data.get("tree", [])
-        limited = []
-        for entry in tree:
-            if len(limited) >= max_entries:
-                break
-            path = entry.get("path", "")
-            parts = path.split("/")
-            if len(parts) > depth:
-                continue
-            limited.append({"path": path, "type": entry.get("type", "blob"), "sha": entry.get("sha")})
-        return {"sha": data.get("sha", sha), "tree": limited, "truncated": len(tree) > max_entries}
+        return r.json()["sha"]
 
 
-async def get_file_content(access_token: str, owner: str, repo: str, path: str, ref: Optional[str] = None) -> dict[str, Any]:
-    async with httpx.AsyncClient() as client:
-        url = f"{GITHUB_API}/repos/{owner}/{repo}/contents/{path}"
-        params = {"ref": ref} if ref else {}
-        r = await client.get(
-            url,
+@traced("github.create_commit")
+async def create_commit(access_token: str, owner: str, repo: str, message: str, tree: str, parents: list[str]) -> str:
+    """Commit object for tree; no ref is moved. Returns the commit SHA."""
+    async with _client() as client:
+        r = await client.post(
+            f"{GITHUB_API}/repos/{owner}/{repo}/git/commits",
             headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
-            params=params,
+            json={"message": message, "tree": tree, "parents": parents},
         )
         r.raise_for_status()
-        return r.json()
+        return r.json()["sha"]
+
+
+@traced("github.get_full_tree")
+async def get_full_tree(access_token: str, owner: str, repo: str, sha: str) -> dict[str, Any]:
+    """
+    Full recursive tree for a commit or tree SHA: {sha, tree: [{path, type, sha}], truncated}.
+    Cached per repo and token under both the requested SHA and the root tree SHA.
+    """
+    scope = token_scope(access_token)
+    cached = tree_cache.get((owner, repo, sha, scope))
+    if cached is not None:
+        return cached
+    data = await _get_json(access_token, f"{GITHUB_API}/repos/{owner}/{repo}/git/trees/{sha}", {"recursive": "1"})
+    full = {
+        "sha": data.get("sha", sha),
+        "tree": [
+            {"path": e.get("path", ""), "type": e.get("type", "blob"), "sha": e.get("sha"), "mode": e.get("mode"), "size": e.get("size")}
+            for e in data.get("tree", [])
+        ],
+        "truncated": data.get("truncated", False),
+    }
+    tree_cache.set((owner, repo, sha, scope), full)
+    tree_cache.set((owner, repo, full["sha"], scope), full)
+    return full
+
+
+async def get_tree(access_token: str, owner: str, repo: str, sha: str, depth: int = 4, max_entries: int = 500) -> dict[str, Any]:
+    data = await get_full_tree(access_token, owner, repo, sha)
+    tree = data["tree"]
+    limited = []
+    for entry in tree:
+        if len(limited) >= max_entries:
+            break
+        if entry["path"].count("/") + 1 > depth:
+            continue
+        limited.append(entry)
+    return {"sha": data["sha"], "tree": limited, "truncated": len(tree) > max_entries}
+
+
+@traced("github.compare_commits")
+async def compare_commits(access_token: str, owner: str, repo: str, base: str, head: str) -> dict[str, Any]:
+    return await _get_json(access_token, f"{GITHUB_API}/repos/{owner}/{repo}/compare/{base}...{head}", {"per_page": 300})
 
 
+@traced("github.get_commit")
+async def get_commit(access_token: str, owner: str, repo: str, sha: str) -> dict[str, Any]:
+    """Single commit with its changed files ({files: [{filename, status, ...}], ...})."""
+    return await _get_json(access_token, f"{GITHUB_API}/repos/{owner}/{repo}/commits/{sha}")
+
+
+@traced("github.get_file_content")
+async def get_file_content(access_token: str, owner: str, repo: str, path: str, ref: Optional[str] = None) -> dict[str, Any]:
+    params = {"ref": ref} if ref else {}
+    return await _get_json(access_token, f"{GITHUB_API}/repos/{owner}/{repo}/contents/{path}", params)
+
+
+async def _resolve_blob_sha(client: httpx.AsyncClient, access_token: str, owner: str, repo: str, path: str, ref: Optional[str]) -> str:
+    """Look up a file's blob SHA from its parent directory listing (works for files of any size)."""
+    parent, _, name = path.rpartition("/")
+    r = await client.get(
+        f"{GITHUB_API}/repos/{owner}/{repo}/contents/{parent}",
+        headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
+        params={"ref": ref} if ref else {},
+    )
+    r.raise_for_status()
+    for entry in r.json():
+        if entry.get("name") == name and entry.get("type") == "file":
+            return entry["sha"]
+    raise httpx.HTTPStatusError("File not found", request=r.request, response=httpx.Response(404, request=r.request))
+
+
+async def _is_too_large(r: httpx.Response) -> bool:
+    """Is this 403 the contents API's "too large, use the blob API" refusal (not a rate limit or permission error)?"""
+    if r.headers.get("X-RateLimit-Remaining") == "0":
+        return False
+    await r.aread()
+    try:
+        data = r.json()
+    except ValueError:
+        return False
+    codes = [e.get("code") for e in data.get("errors", []) if isinstance(e, dict)]
+    message = (data.get("message") or "").lower().replace("_", " ")
+    return "too_large" in codes or "too large" in message
+
+
+@asynccontextmanager
+async def stream_file_raw(
+    access_token: str,
+    owner: str,
+    repo: str,
+    path: str,
+    ref: Optional[str] = None,
+    sha: Optional[str] = None,
+    byte_range: Optional[str] = None,
+) -> AsyncIterator[httpx.Response]:
+    """
+    Open a streaming response with the raw file bytes (no JSON/base64 wrapping).
+    Uses the blob API when the blob SHA is known or the contents API refuses the
+    file as too large. byte_range is forwarded as a Range header; callers must
+    check for a 206 since GitHub may ignore it. Ranged reads ask for an
+    uncompressed body, so offsets and lengths describe the file's own bytes.
+    """
+    headers = {"Authorization": f"Bearer {access_token}", "Accept": RAW_MEDIA_TYPE}
+    if byte_range:
+        headers["Range"] = byte_range
+        headers["Accept-Encoding"] = "identity"
+    async with _client(timeout=httpx.Timeout(30.0, read=120.0)) as client:
+        if sha:
+            req = client.build_request("GET", f"{GITHUB_API}/repos/{owner}/{repo}/git/blobs/{sha}", headers=headers)
+        else:
+            req = client.build_request(
+                "GET",
+                f"{GITHUB_API}/repos/{owner}/{repo}/contents/{path}",
+                headers=headers,
+                params={"ref": ref} if ref else {},
+            )
+        r = await client.send(req, stream=True)
+        if r.status_code == 403 and not sha and await _is_too_large(r):
+            # Contents API refuses very large files; retry through the blob API.
+            await r.aclose()
+            blob_sha = await _resolve_blob_sha(client, access_token, owner, repo, path, ref)
+            req = client.build_request("GET", f"{GITHUB_API}/repos/{owner}/{repo}/git/blobs/{blob_sha}", headers=headers)
+            r = await client.send(req, stream=True)
+        try:
+            if r.status_code >= 400:
+                await r.aread()
+                r.raise_for_status()
+            yield r
+        finally:
+            await r.aclose()
+
+
+@traced("github.read_file_lines")
+async def read_file_lines(
+    access_token: str,
+    owner: str,
+    repo: str,
+    path: str,
+    ref: Optional[str] = None,
+    start_line: int = 1,
+    end_line: Optional[int] = None,
+    sha: Optional[str] = None,
+) -> tuple[str, bool]:
+    """
+    Return lines start_line..end_line (1-based, inclusive) of a file and whether
+    more lines follow. Streams the raw file and stops reading once end_line is reached.
+    """
+    decoder = codecs.getincrementaldecoder("utf-8")(errors="replace")
+    out: list[str] = []
+    lineno = 1
+    pending = ""
+    async with stream_file_raw(access_token, owner, repo, path, ref, sha) as r:
+        async for chunk in r.aiter_bytes():
+            pending += decoder.decode(chunk)
+            *complete, pending = pending.split("\n")
+            for line in complete:
+                if end_line is not None and lineno > end_line:
+                    return "\n".join(out), True
+                if lineno >= start_line:
+                    out.append(line)
+                lineno += 1
+        pending += decoder.decode(b"", final=True)
+    if end_line is not None and lineno > end_line:
+        return "\n".join(out), pending != ""
+    if lineno >= start_line:
+        out.append(pending)
+    return "\n".join(out), False
+
+
+@traced("github.get_file_text")
+async def get_file_text(
+    access_token: str,
+    owner: str,
+    repo: str,
+    path: str,
+    ref: Optional[str] = None,
+    sha: Optional[str] = None,
+    strict: bool = False,
+) -> str:
+    """
+    Fetch a whole file as text via the raw media type (coalesced like _get_json).
+    With the blob sha (from a tree) it is read through the blob API, which has
+    no size limit and is shared by every path and ref holding that content;
+    such reads are also kept in blob_text_cache.
+
+    Bytes that are not UTF-8 are replaced with U+FFFD, which is fine for showing
+    a file but would corrupt it if written back. Callers that commit the text
+    pass strict=True to get a ValueError instead.
+    """
+    scope = token_scope(access_token)
+    if sha:
+        cached = blob_text_cache.get((owner, repo, sha, scope))
+        if cached is not None:
+            return cached
+        key = (scope, "GET", f"{GITHUB_API}/repos/{owner}/{repo}/git/blobs/{sha}", RAW_MEDIA_TYPE)
+    else:
+        key = (scope, "GET", f"{GITHUB_API}/repos/{owner}/{repo}/contents/{path}", RAW_MEDIA_TYPE, ref)
+
+    async def fetch() -> tuple[str, bool]:
+        async with stream_file_raw(access_token, owner, repo, path, ref, sha) as r:
+            data = await r.aread()
+        try:
+            return data.decode("utf-8"), True
+        except UnicodeDecodeError:
+            return data.decode("utf-8", errors="replace"), False
+
+    text, exact = await github_flight.do(key, fetch)
+    if not exact:
+        if strict:
+            raise ValueError(f"{path} is not UTF-8 text and cannot be patched")
+        return text
+    # Only exact text is cached, so cache hits are safe for strict reads.
+    if sha and len(text) <= get_settings().blob_cache_max_bytes:
+        blob_text_cache.set((owner, repo, sha, scope), text)
+    return text
+
+
+@traced("github.create_or_update_file")
 async def create_or_update_file(
     access_token: str, owner: str, repo: str, path: str, content: str, message: str, branch: str, sha: Optional[str] = None
 ) -> dict[str, Any]:
@@ -114,7 +484,7 @@ async def create_or_update_file(
     }
     if sha:
         payload["sha"] = sha
-    async with httpx.AsyncClient() as client:
+    async with _client() as client:
         r = await client.put(
             f"{GITHUB_API}/repos/{owner}/{repo}/contents/{path}",
             headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
@@ -124,6 +494,7 @@ async def create_or_update_file(
         return r.json()
 
 
+@traced("github.apply_patch_and_commit")
 async def apply_patch_and_commit(
     access_token: str,
     owner: str,
@@ -132,38 +503,63 @@ async def apply_patch_and_commit(
     patch_content: str,
     commit_message: str,
 ) -> str:
-    """Apply patch via GitHub API and commit. Returns commit SHA."""
-    from app.patch_utils import apply_patch, parse_unified_diff
+    """
+    Apply patch to the branch head and commit it as one commit through the git
+    data API. Returns commit SHA. Originals are read raw by blob SHA and results
+    uploaded as blobs, so files past the contents API's 1 MB limit work too.
+    If the branch moves before it is updated, the 422 from GitHub is re-raised.
+    """
+    from app.offload import apply_patch_async
+    from app.patch_utils import FilePatch, parse_unified_diff
 
     patches = parse_unified_diff(patch_content)
     if not patches:
         raise ValueError("Invalid patch")
 
-    last_commit_sha = None
-    for fp in patches:
-        path = fp.path
-        try:
-            fc = await get_file_content(access_token, owner, repo, path, branch)
-            current_content = __b64decode(fc.get("content", ""))
-            current_sha = fc.get("sha")
-        except httpx.HTTPStatusError as e:
-            if e.response.status_code == 404:
-                current_content = ""
-                current_sha = None
-            else:
-                raise
-
-        result = apply_patch(current_content, fp)
-        res = await create_or_update_file(
-            access_token, owner, repo, path, result, commit_message, branch, current_sha
-        )
-        last_commit_sha = res.get("commit", {}).get("sha")
-
-    if not last_commit_sha:
-        raise ValueError("No commits created")
-    return last_commit_sha
-
-
+    head = await get_branch_sha(access_token, owner, repo, branch)
+    tree = await get_full_tree(access_token, owner, repo, head)
+    by_path = {e["path"]: e for e in tree["tree"]}
+    sem = asyncio.Semaphore(get_settings().bulk_file_concurrency)
+
+    async def upload(fp: FilePatch) -> list[dict[str, Any]]:
+        src = fp.source
+        current = by_path.get(src) if src else None
+        mode = (current or {}).get("mode") or "100644"
+        entries: list[dict[str, Any]] = []
+        if fp.path == "/dev/null" or (src and src != fp.path):
+            entries.append({"path": src, "mode": mode, "type": "blob", "sha": None})
+        if fp.path == "/dev/null":
+            return entries
+        if src is None and fp.path in by_path:
+            raise ValueError(f"{fp.path} already exists")
+        original = ""
+        async with sem:
+            if current is not None or (src and tree.get("truncated")):
+                try:
+                    original = await get_file_text(
+                        access_token, owner, repo, src, head, (current or {}).get("sha"), strict=True
+                    )
+                except httpx.HTTPStatusError as e:
+                    if e.response.status_code != 404:
+                        raise
+            result = await apply_patch_async(original, fp)
+            sha = await create_blob(access_token, owner, repo, result)
+        entries.append({"path": fp.path, "mode": mode, "type": "blob", "sha": sha})
+        return entries
+
+    uploaded = await asyncio.gather(*(upload(fp) for fp in patches))
+    tree_sha = await create_tree(access_token, owner, repo, tree["sha"], [e for entries in uploaded for e in entries])
+    commit_sha = await create_commit(access_token, owner, repo, commit_message, tree_sha, [head])
+    try:
+        await update_branch(access_token, owner, repo, branch, commit_sha)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 422:
+            invalidate_branch(owner, repo, branch)  # our cached head was stale
+        raise
+    return commit_sha
+
+
+@traced("github.create_pr")
 async def create_pr(
     access_token: str,
     owner: str,
@@ -174,7 +570,7 @@ async def create_pr(
     body: Optional[str] = None,
 ) -> str:
     """Create PR. Returns PR URL."""
-    async with httpx.AsyncClient() as client:
+    async with _client() as client:
         r = await client.post(
             f"{GITHUB_API}/repos/{owner}/{repo}/pulls",
             headers={"Authorization": f"Bearer {access_token}", "Accept": "application/vnd.github+json"},
@@ -193,8 +589,3 @@ async def create_pr(
 def __b64encode(s: str) -> str:
     import base64
     return base64.b64encode(s.encode("utf-8")).decode("ascii")
-
-
-def __b64decode(s: str) -> str:
-    import base64
-    return base64.b64decode(s).decode("utf-8")
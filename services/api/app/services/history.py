@@ -0,0 +1,146 @@
+"""
+Chat history compaction: keep recent turns verbatim, fold older turns into a
+running summary, and strip patch bodies that a later patch superseded, so the
+prompt stays under a token ceiling however long the conversation gets. When the
+recent turns alone are over the ceiling, they are truncated, oldest first.
+
+Compaction is incremental. The returned state records how many messages the
+summary already covers (and a digest of them), so the next turn only folds the
+messages that newly fell out of the window.
+"""
+import hashlib
+import re
+from typing import Any, Optional
+
+PATCH_SECTION_RE = re.compile(r"(##\s*PATCH\s*\n)(.*?)(?=\n##|\Z)", re.DOTALL | re.IGNORECASE)
+SUMMARY_LINE_CHARS = 240
+OMITTED = "- (earlier turns omitted)"
+TRUNCATED = "\n…(truncated)"
+
+
+def estimate_tokens(text: str) -> int:
+    """Rough token estimate (~4 chars per token) used for budgeting, not billing."""
+    return len(text) // 4 + 1
+
+
+def patch_files(patch: str) -> list[str]:
+    files: list[str] = []
+    for line in patch.split("\n"):
+        if line.startswith("+++ "):
+            path = line[4:].split("\t")[0].strip()
+            if path.startswith("b/"):
+                path = path[2:]
+            if path and path != "/dev/null" and path not in files:
+                files.append(path)
+    return files
+
+
+def strip_patch_body(content: str) -> str:
+    """Replace the body of a ## PATCH section with the list of files it touched."""
+    def repl(m: re.Match) -> str:
+        files = patch_files(m.group(2))
+        return f"{m.group(1)}(superseded patch omitted; files: {', '.join(files) or 'none'})"
+    return PATCH_SECTION_RE.sub(repl, content)
+
+
+def _digest(messages: list[dict[str, str]]) -> str:
+    h = hashlib.sha256()
+    for m in messages:
+        h.update(m["role"].encode())
+        h.update(b"\0")
+        h.update(m["content"].encode())
+        h.update(b"\0")
+    return h.hexdigest()
+
+
+def _summary_line(message: dict[str, str]) -> str:
+    content = message["content"]
+    m = PATCH_SECTION_RE.search(content)
+    if m:
+        files = patch_files(m.group(2))
+        content = PATCH_SECTION_RE.sub("", content)
+        suffix = f" [proposed patch: {', '.join(files)}]" if files else ""
+    else:
+        suffix = ""
+    text = " ".join(content.split())
+    if len(text) > SUMMARY_LINE_CHARS:
+        text = text[:SUMMARY_LINE_CHARS].rstrip() + "…"
+    return f"- {message['role']}: {text}{suffix}"
+
+
+def _truncate(content: str, max_tokens: int) -> str:
+    """Cut content to at most max_tokens (by estimate_tokens), marking the cut when it fits."""
+    if estimate_tokens(content) <= max_tokens:
+        return content
+    chars = max(0, (max_tokens - 1) * 4)
+    if chars < len(TRUNCATED):
+        return content[:chars]
+    return content[:chars - len(TRUNCATED)] + TRUNCATED
+
+
+def _fold(summary: str, messages: list[dict[str, str]], max_tokens: int) -> str:
+    lines = summary.split("\n") if summary else []
+    lines.extend(_summary_line(m) for m in messages)
+    # Keep the summary itself bounded: drop the oldest lines first.
+    dropped = False
+    while len(lines) > 1 and estimate_tokens("\n".join(lines)) > max_tokens:
+        lines.pop(0)
+        dropped = True
+    if dropped and lines[0] != OMITTED:
+        lines.insert(0, OMITTED)
+    return "\n".join(lines)
+
+
+def compact_history(
+    history: list[dict[str, str]],
+    token_ceiling: int,
+    keep_recent: int = 4,
+    state: Optional[dict[str, Any]] = None,
+) -> tuple[list[dict[str, str]], str, dict[str, Any]]:
+    """
+    Return (messages to send verbatim, running summary, new state).
+
+    Older assistant messages lose their patch bodies when a later message carries
+    a patch. Oldest messages are folded into the summary until the verbatim part
+    plus the summary fits token_ceiling; the newest keep_recent messages are never
+    folded, and the verbatim part always starts with a user turn. If those are
+    still over the ceiling they are truncated, oldest first, until they fit.
+    """
+    covered = 0
+    summary = ""
+    if state and state.get("covered", 0) <= len(history):
+        if _digest(history[: state["covered"]]) == state.get("digest"):
+            covered, summary = state["covered"], state.get("summary", "")
+
+    messages = [dict(m) for m in history[covered:]]
+    last_patch = max((i for i, m in enumerate(messages) if PATCH_SECTION_RE.search(m["content"])), default=-1)
+    for i, m in enumerate(messages):
+        if i < last_patch and m["role"] == "assistant":
+            m["content"] = strip_patch_body(m["content"])
+
+    summary_budget = max(token_ceiling // 4, 64)
+    fold = 0
+    total = sum(estimate_tokens(m["content"]) for m in messages)
+    # Reserve the summary's full budget: it grows as messages are folded into it.
+    reserve = max(estimate_tokens(summary), summary_budget) if (summary or total > token_ceiling) else 0
+    while fold < len(messages) - keep_recent and total + reserve > token_ceiling:
+        total -= estimate_tokens(messages[fold]["content"])
+        fold += 1
+    while fold < len(messages) and messages[fold]["role"] != "user":
+        fold += 1
+    if fold:
+        # Summarize the originals: stripped copies no longer list the patched files.
+        summary = _fold(summary, history[covered:covered + fold], summary_budget)
+        covered += fold
+
+    recent = messages[fold:]
+    over = sum(estimate_tokens(m["content"]) for m in recent) + (estimate_tokens(summary) if summary else 0) - token_ceiling
+    for m in recent:
+        if over <= 0:
+            break
+        tokens = estimate_tokens(m["content"])
+        m["content"] = _truncate(m["content"], max(tokens - over, 1))
+        over -= tokens - estimate_tokens(m["content"])
+
+    new_state = {"covered": covered, "digest": _digest(history[:covered]), "summary": summary}
+    return recent, summary, new_state
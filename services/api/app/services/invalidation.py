@@ -0,0 +1,77 @@
+"""
+Cache invalidation shared between worker processes.
+
+Branch heads and repo metadata are cached in each process (app/cache.py), but a
+webhook or one of our own writes reaches only the worker that handled it. So
+every invalidation is also published on a Redis channel, and each worker runs
+listen() to drop the same entries when another worker publishes.
+
+Without REDIS_URL invalidation stays local to the process. If Redis is down,
+or while the listener reconnects, other workers miss the message and their
+entries live until the cache TTL, which is the same bound as no webhook at all.
+"""
+import asyncio
+import logging
+import secrets
+from functools import lru_cache
+from typing import Any, Callable
+
+import orjson
+
+from app.config import get_settings
+
+logger = logging.getLogger(__name__)
+
+CHANNEL = "zappr:invalidate"
+RECONNECT_SECONDS = 5.0
+# Lets a worker skip its own messages; it has already applied them locally.
+ORIGIN = secrets.token_hex(8)
+_publish_tasks: set[asyncio.Task] = set()
+
+
+@lru_cache
+def _redis() -> Any:
+    import redis.asyncio as redis
+
+    return redis.from_url(get_settings().redis_url)
+
+
+async def _publish(message: dict[str, Any]) -> None:
+    try:
+        await _redis().publish(CHANNEL, orjson.dumps({**message, "origin": ORIGIN}))
+    except Exception as e:
+        logger.warning("cache invalidation not published: %s", e)
+
+
+def publish(message: dict[str, Any]) -> None:
+    """Send an invalidation to the other workers without waiting; a no-op without Redis."""
+    if not get_settings().redis_url:
+        return
+    try:
+        loop = asyncio.get_running_loop()
+    except RuntimeError:
+        return
+    task = loop.create_task(_publish(message))
+    _publish_tasks.add(task)
+    task.add_done_callback(_publish_tasks.discard)
+
+
+async def listen(apply: Callable[[dict[str, Any]], Any]) -> None:
+    """Call apply with each invalidation published by another worker, until cancelled."""
+    while True:
+        pubsub = _redis().pubsub()
+        try:
+            await pubsub.subscribe(CHANNEL)
+            async for message in pubsub.listen():
+                if message.get("type") != "message":
+                    continue
+                data = orjson.loads(message["data"])
+                if data.get("origin") != ORIGIN:
+                    apply(data)
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.warning("cache invalidation listener failed, reconnecting: %s", e)
+            await asyncio.sleep(RECONNECT_SECONDS)
+        finally:
+            await pubsub.aclose()
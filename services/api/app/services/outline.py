@@ -0,0 +1,121 @@
+"""
+Symbol outlines: class, function and method signatures with line numbers, used
+in agent prompts in place of full bodies for files that are context only.
+
+Python is outlined with ast. JS/TS, Go and Java use line-based regexes, which
+are cheap and good enough for a skeleton. Outlines are cached by git blob SHA
+and extension, so an unchanged file is outlined once however many requests
+include it.
+"""
+import ast
+import hashlib
+import re
+from typing import Optional
+
+from app.cache import TTLCache
+from app.config import get_settings
+
+outline_cache = TTLCache("outline", maxsize=4096, ttl=get_settings().tree_cache_ttl_seconds)
+
+MAX_OUTLINE_LINES = 200
+
+JS_PATTERNS = [
+    re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:abstract\s+)?class\s+\w+[^{]*"),
+    re.compile(r"^\s*(?:export\s+)?(?:default\s+)?(?:async\s+)?function\s*\*?\s*\w*\s*(?:<[^>]*>)?\([^)]*\)[^{]*"),
+    re.compile(r"^\s*(?:export\s+)?(?:const|let|var)\s+\w+\s*(?::[^=]+)?=\s*(?:async\s+)?(?:\([^)]*\)|\w+)\s*(?::[^=]+)?=>"),
+    re.compile(r"^\s*(?:export\s+)?(?:interface|enum)\s+\w+[^{]*"),
+    re.compile(r"^\s*(?:export\s+)?type\s+\w+(?:<[^>]*>)?\s*="),
+    # class members: "  async name(args) {", "  static get x() {", "  private foo(a: T): R {"
+    re.compile(r"^\s+(?:(?:public|private|protected|static|readonly|async|get|set|override)\s+)*"
+               r"(?!if\b|for\b|while\b|switch\b|catch\b|return\b)\w+\s*(?:<[^>]*>)?\([^)]*\)\s*(?::\s*[^{]+)?\{"),
+]
+GO_PATTERNS = [
+    re.compile(r"^func\s+(?:\([^)]*\)\s*)?\w+(?:\[[^\]]*\])?\([^)]*\)[^{]*"),
+    re.compile(r"^type\s+\w+(?:\[[^\]]*\])?\s+(?:struct|interface)\b"),
+    re.compile(r"^type\s+\w+\s+\w+"),
+]
+JAVA_PATTERNS = [
+    re.compile(r"^\s*(?:(?:public|private|protected|static|final|abstract|sealed)\s+)*(?:class|interface|enum|record)\s+\w+[^{]*"),
+    re.compile(r"^\s+(?:(?:public|private|protected|static|final|abstract|synchronized|native|default)\s+)+"
+               r"(?:<[^>]+>\s+)?[\w<>\[\],.? ]+\s+\w+\s*\([^)]*\)[^{;]*"),
+]
+REGEX_LANGUAGES = {
+    ".js": JS_PATTERNS, ".jsx": JS_PATTERNS, ".mjs": JS_PATTERNS, ".cjs": JS_PATTERNS,
+    ".ts": JS_PATTERNS, ".tsx": JS_PATTERNS,
+    ".go": GO_PATTERNS,
+    ".java": JAVA_PATTERNS,
+}
+
+
+def git_blob_sha(text: str) -> str:
+    """The SHA git (and the GitHub trees API) reports for a blob with this content."""
+    data = text.encode("utf-8")
+    return hashlib.sha1(b"blob %d\0" % len(data) + data).hexdigest()
+
+
+def _python_outline(text: str) -> Optional[list[str]]:
+    try:
+        tree = ast.parse(text)
+    except (SyntaxError, ValueError):
+        return None
+    lines: list[str] = []
+
+    def visit(nodes: list[ast.stmt], depth: int) -> None:
+        indent = "    " * depth
+        for node in nodes:
+            if isinstance(node, ast.ClassDef):
+                bases = ", ".join(ast.unparse(b) for b in node.bases + node.keywords)
+                for d in node.decorator_list:
+                    lines.append(f"{d.lineno}: {indent}@{ast.unparse(d)}")
+                lines.append(f"{node.lineno}: {indent}class {node.name}{f'({bases})' if bases else ''}:")
+                visit(node.body, depth + 1)
+            elif isinstance(node, (ast.FunctionDef, ast.AsyncFunctionDef)):
+                prefix = "async def" if isinstance(node, ast.AsyncFunctionDef) else "def"
+                returns = f" -> {ast.unparse(node.returns)}" if node.returns else ""
+                for d in node.decorator_list:
+                    lines.append(f"{d.lineno}: {indent}@{ast.unparse(d)}")
+                lines.append(f"{node.lineno}: {indent}{prefix} {node.name}({ast.unparse(node.args)}){returns}: ...")
+            elif depth == 0 and isinstance(node, (ast.Assign, ast.AnnAssign)):
+                targets = node.targets if isinstance(node, ast.Assign) else [node.target]
+                names = [t.id for t in targets if isinstance(t, ast.Name) and t.id.isupper()]
+                if names:
+                    lines.append(f"{node.lineno}: {' = '.join(names)} = ...")
+
+    visit(tree.body, 0)
+    return lines
+
+
+def _regex_outline(text: str, patterns: list[re.Pattern]) -> list[str]:
+    lines = []
+    for n, line in enumerate(text.split("\n"), 1):
+        for p in patterns:
+            m = p.match(line)
+            if m:
+                lines.append(f"{n}: {m.group(0).rstrip().rstrip('{').rstrip()}")
+                break
+    return lines
+
+
+def outline(path: str, text: str, blob_sha: Optional[str] = None) -> Optional[str]:
+    """
+    Outline for a file, or None when its language is not supported or it does not
+    parse. Cached by blob_sha (computed from text if omitted) and extension, since
+    the same content outlines differently as another language.
+    """
+    dot = path.rfind(".")
+    ext = path[dot:].lower() if dot > path.rfind("/") else ""
+    if ext != ".py" and ext not in REGEX_LANGUAGES:
+        return None
+    key = (blob_sha or git_blob_sha(text), ext)
+    cached = outline_cache.get(key)
+    if cached is not None:
+        return cached or None
+    lines = _python_outline(text) if ext == ".py" else _regex_outline(text, REGEX_LANGUAGES[ext])
+    result = ""
+    if lines:
+        total = text.count("\n") + 1
+        if len(lines) > MAX_OUTLINE_LINES:
+            lines = lines[:MAX_OUTLINE_LINES] + [f"... {len(lines) - MAX_OUTLINE_LINES} more symbols"]
+        result = "\n".join(lines + [f"({total} lines)"])
+    outline_cache.set(key, result)  # "" records "no outline" so it is not recomputed
+    return result or None
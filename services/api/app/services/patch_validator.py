@@ -5,7 +5,8 @@ import re
 from typing import Any
 
 from app.config import get_settings
-from app.patch_utils import FilePatch, parse_unified_diff
+from app.metrics import PATCH_VALIDATIONS
+from app.patch_utils import FilePatch, apply_patch, parse_unified_diff
 
 BLOCKED_PATTERNS = [
     r"\.env$",
@@ -41,24 +42,38 @@ def validate_patch(
     Validate patch. Returns (valid, error_message, file_changes).
     file_changes: list of {path, additions, deletions, hunks}
     """
+    result, message, file_changes = classify_patch(patch_text, max_files, max_lines)
+    PATCH_VALIDATIONS.labels(result=result).inc()
+    return result == "ok", message, file_changes
+
+
+def classify_patch(
+    patch_text: str,
+    max_files: int | None = None,
+    max_lines: int | None = None,
+) -> tuple[str, str | None, list[dict[str, Any]]]:
+    """
+    validate_patch without the metric, for callers that run it in another process.
+    Returns ("ok" or the rejection reason, error_message, file_changes).
+    """
     settings = get_settings()
     max_files = max_files or settings.patch_max_files
     max_lines = max_lines or settings.patch_max_lines
 
     # Secrets in diff
     if SECRET_RE.search(patch_text):
-        return False, "Patch contains potential API keys or secrets", []
+        return "secrets", "Patch contains potential API keys or secrets", []
 
     try:
         patches = parse_unified_diff(patch_text)
     except Exception as e:
-        return False, f"Invalid patch format: {e}", []
+        return "invalid_format", f"Invalid patch format: {e}", []
 
     if not patches:
-        return False, "Empty or invalid patch", []
+        return "empty", "Empty or invalid patch", []
 
     if len(patches) > max_files:
-        return False, f"Too many files changed (max {max_files})", []
+        return "too_many_files", f"Too many files changed (max {max_files})", []
 
     total_add = 0
     total_del = 0
@@ -67,7 +82,7 @@ def validate_patch(
     for fp in patches:
         path = fp.path
         if BLOCKED_RE.search(path):
-            return False, f"Blocked path: {path}", []
+            return "blocked_path", f"Blocked path: {path}", []
 
         # Check binary (heuristic: non-utf8 or null bytes)
         add = 0
@@ -81,7 +96,7 @@ def validate_patch(
                     try:
                         content.encode("utf-8")
                     except UnicodeEncodeError:
-                        return False, f"Binary or invalid UTF-8 in {path}", []
+                        return "invalid_utf8", f"Binary or invalid UTF-8 in {path}", []
                 elif prefix == "-":
                     del_ += 1
 
@@ -102,6 +117,27 @@ def validate_patch(
         })
 
     if total_add + total_del > max_lines:
-        return False, f"Too many lines changed (max {max_lines})", []
+        return "too_many_lines", f"Too many lines changed (max {max_lines})", []
+
+    return "ok", None, file_changes
 
-    return True, None, file_changes
+
+def check_patch_applies(patch_text: str, originals: dict[str, str]) -> str | None:
+    """
+    Dry-run apply patch_text against originals (path -> current content; "" for
+    new files). Returns None if every file applies cleanly, else the first error.
+    """
+    try:
+        patches = parse_unified_diff(patch_text)
+    except Exception as e:
+        return f"Invalid patch format: {e}"
+    if not patches:
+        return "Empty or invalid patch"
+    for fp in patches:
+        if fp.path not in originals:
+            return f"No content for {fp.path}"
+        try:
+            apply_patch(originals[fp.path], fp)
+        except ValueError as e:
+            return f"{fp.path}: {e}"
+    return None
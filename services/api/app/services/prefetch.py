@@ -0,0 +1,192 @@
+"""
+Speculative prefetch for /agent/patch.
+
+Before its model call, /agent/patch resolves the branch, loads the tree and
+reads the selected files. When the app lists branches or loads a tree, the user
+is usually about to do exactly that, so those requests call start_prefetch(),
+which runs prefetch() in a detached task: the response (and its latency metric)
+does not wait for it. It warms the same caches: branch_sha_cache, tree_cache,
+and blob_text_cache for the files a request is likely to select.
+
+Likely files are picked by recency, then by type:
+1. files this user recently sent to /agent/patch for the repo;
+2. files changed by the head commit;
+3. entry points and manifests, then other source files, shallow and small first.
+
+Every GitHub call it makes is charged to a per-user token bucket of
+PREFETCH_BUDGET_PER_MINUTE calls (cache hits are free). An empty bucket ends
+the prefetch, so speculative reads never eat the rate limit the user's own
+requests need. Files are fetched one at a time for the same reason.
+"""
+import asyncio
+import logging
+import posixpath
+import time
+from typing import Any, Optional
+
+from app.cache import TTLCache
+from app.config import get_settings
+from app.metrics import PREFETCH_FILES
+from app.services.github import (
+    blob_text_cache,
+    branch_sha_cache,
+    get_branch_sha,
+    get_commit,
+    get_default_branch,
+    get_file_text,
+    get_full_tree,
+    token_scope,
+    tree_cache,
+)
+
+logger = logging.getLogger(__name__)
+
+RECENT_MAX = 20
+ENTRY_NAMES = {
+    "readme.md", "package.json", "pyproject.toml", "setup.py", "requirements.txt", "go.mod", "cargo.toml",
+    "main.py", "app.py", "__init__.py", "index.ts", "index.tsx", "index.js", "app.tsx", "main.go", "main.rs", "lib.rs",
+}
+SOURCE_EXTENSIONS = {
+    ".py", ".ts", ".tsx", ".js", ".jsx", ".go", ".rs", ".java", ".kt", ".swift", ".rb", ".php", ".c", ".h", ".cpp",
+    ".cs", ".md", ".toml", ".yaml", ".yml",
+}
+SKIP_DIRS = {"node_modules", "vendor", "dist", "build", "__pycache__", ".git"}
+
+# (user id, owner, repo) -> paths sent to /agent/patch, most recent first.
+_recent_files = TTLCache("prefetch_recent", maxsize=4096, ttl=86400)
+# (owner, repo, commit sha) -> paths that commit changed. Commits never change.
+_commit_files = TTLCache("prefetch_commit_files", maxsize=1024, ttl=3600)
+# user id -> (tokens left, monotonic time of last update). A bucket idle for a
+# minute is full again, so expiring it loses nothing.
+_buckets = TTLCache("prefetch_budget", maxsize=4096, ttl=60)
+_running: set[tuple[int, str, str, Optional[str]]] = set()
+# Prefetches run detached from the request that started them.
+_prefetch_tasks: set[asyncio.Task] = set()
+
+
+def remember_files(user_id: int, owner: str, repo: str, paths: list[str]) -> None:
+    """Record paths a user just asked about; they rank first in later prefetches."""
+    key = (user_id, owner, repo)
+    previous = _recent_files.get(key) or []
+    _recent_files.set(key, list(dict.fromkeys([*paths, *previous]))[:RECENT_MAX])
+
+
+def _take(user_id: int) -> bool:
+    """Spend one GitHub call from the user's bucket; False when it is empty."""
+    rate = get_settings().prefetch_budget_per_minute
+    now = time.monotonic()
+    tokens, updated = _buckets.get(user_id) or (float(rate), now)
+    tokens = min(float(rate), tokens + (now - updated) * rate / 60)
+    if tokens < 1:
+        _buckets.set(user_id, (tokens, now))
+        return False
+    _buckets.set(user_id, (tokens - 1, now))
+    return True
+
+
+def _type_rank(path: str) -> Optional[int]:
+    """0 for entry points and manifests, 1 for other source files, None for files not worth prefetching."""
+    parts = path.split("/")
+    if SKIP_DIRS.intersection(parts[:-1]):
+        return None
+    if parts[-1].lower() in ENTRY_NAMES:
+        return 0
+    return 1 if posixpath.splitext(path)[1].lower() in SOURCE_EXTENSIONS else None
+
+
+def rank_files(
+    tree: list[dict[str, Any]], recent: list[str], changed: list[str], limit: int, max_bytes: int
+) -> list[dict[str, Any]]:
+    """Up to limit blob entries of tree, most likely to be selected first (see module docstring)."""
+    blobs = {
+        e["path"]: e for e in tree
+        if e.get("type") == "blob" and e.get("sha") and (e.get("size") or 0) <= max_bytes
+    }
+    changed = [p for p in changed if _type_rank(p) is not None]
+    picked = [p for p in dict.fromkeys([*recent, *changed]) if p in blobs]
+    if len(picked) < limit:
+        typed = [(rank, p.count("/"), blobs[p].get("size") or 0, p) for p in blobs if (rank := _type_rank(p)) is not None]
+        chosen = set(picked)
+        picked += [p for *_, p in sorted(typed) if p not in chosen]
+    return [blobs[p] for p in picked[:limit]]
+
+
+async def _changed_files(user_id: int, token: str, owner: str, repo: str, sha: str) -> list[str]:
+    cached = _commit_files.get((owner, repo, sha))
+    if cached is not None:
+        return cached
+    if not _take(user_id):
+        return []
+    commit = await get_commit(token, owner, repo, sha)
+    files = [f["filename"] for f in commit.get("files", []) if f.get("status") != "removed"]
+    _commit_files.set((owner, repo, sha), files)
+    return files
+
+
+async def prefetch(
+    user_id: int,
+    token: str,
+    owner: str,
+    repo: str,
+    branch: Optional[str] = None,
+    sha: Optional[str] = None,
+) -> int:
+    """
+    Warm caches for a later /agent/patch on sha, or on the head of branch (the
+    default branch when both are None). Meant to run detached (start_prefetch):
+    errors are logged, not raised. Returns the number of files fetched.
+    """
+    settings = get_settings()
+    key = (user_id, owner, repo)
+    run_key = (*key, sha or branch)
+    if not settings.prefetch_enabled or run_key in _running:
+        return 0
+    _running.add(run_key)
+    try:
+        if sha is None:
+            # Repo metadata is revalidated with ETags, and a 304 costs no rate limit.
+            branch = branch or await get_default_branch(token, owner, repo)
+            sha = branch_sha_cache.get((owner, repo, branch, token_scope(token)))
+            if sha is None:
+                if not _take(user_id):
+                    return 0
+                sha = await get_branch_sha(token, owner, repo, branch)
+        if tree_cache.get((owner, repo, sha, token_scope(token))) is None and not _take(user_id):
+            return 0
+        tree = await get_full_tree(token, owner, repo, sha)
+        recent = _recent_files.get(key) or []
+        changed = await _changed_files(user_id, token, owner, repo, sha)
+
+        fetched = 0
+        for entry in rank_files(tree["tree"], recent, changed, settings.prefetch_max_files, settings.blob_cache_max_bytes):
+            if blob_text_cache.get((owner, repo, entry["sha"], token_scope(token))) is not None:
+                PREFETCH_FILES.labels(result="cached").inc()
+                continue
+            if not _take(user_id):
+                PREFETCH_FILES.labels(result="over_budget").inc()
+                break
+            await get_file_text(token, owner, repo, entry["path"], sha, entry["sha"])
+            PREFETCH_FILES.labels(result="fetched").inc()
+            fetched += 1
+        return fetched
+    except Exception as e:
+        logger.info("prefetch failed for %s/%s@%s: %r", owner, repo, sha or branch, e)
+        return 0
+    finally:
+        _running.discard(run_key)
+
+
+def start_prefetch(
+    user_id: int,
+    token: str,
+    owner: str,
+    repo: str,
+    branch: Optional[str] = None,
+    sha: Optional[str] = None,
+) -> None:
+    """Run prefetch() in a task of its own; the caller does not wait for it."""
+    if not get_settings().prefetch_enabled:
+        return
+    task = asyncio.create_task(prefetch(user_id, token, owner, repo, branch, sha))
+    _prefetch_tasks.add(task)
+    task.add_done_callback(_prefetch_tasks.discard)
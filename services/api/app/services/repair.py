@@ -0,0 +1,132 @@
+"""
+Hunk-level patch repair: when a generated patch does not apply, fix only the
+failing hunks instead of regenerating the whole patch.
+
+Each round first relocates hunks whose old side appears verbatim at a different
+line (drifted line numbers, no model call needed). The hunks still failing go
+to the model together with the actual file region around them. The corrected
+hunks are spliced back into the patch and the result is checked again.
+"""
+import re
+from typing import Awaitable, Callable
+
+from app.patch_utils import FilePatch, Hunk, parse_unified_diff, render_hunk, render_unified_diff
+
+REGION_MARGIN = 15  # extra file lines shown around a failing hunk
+HUNK_HEADER_RE = re.compile(r"^###\s*HUNK\s+(\d+)\s*$", re.MULTILINE)
+
+REPAIR_SYSTEM = """You fix unified diff hunks that no longer apply to a file.
+For each failing hunk you get the hunk and the actual current file region (with 1-based line numbers).
+Rewrite each hunk so its context and removed lines match the file exactly, keeping the intended change.
+Output only the corrected hunks, each preceded by its id line, for example:
+
+### HUNK 1
+@@ -10,3 +10,4 @@
+ context
++added
+ context
+"""
+
+
+def _old_side(hunk: Hunk) -> list[str]:
+    return [content for prefix, content in hunk.lines if prefix != "+"]
+
+
+def _matches_at(orig_lines: list[str], old: list[str], start: int) -> bool:
+    if not old:
+        return True  # pure insertion (e.g. new file): nothing to match
+    return start >= 0 and orig_lines[start:start + len(old)] == old
+
+
+def failing_hunks(original: str, fp: FilePatch) -> list[int]:
+    """Indices of hunks whose old side (context and removed lines) is not found at old_start."""
+    orig_lines = original.split("\n")
+    return [
+        i for i, h in enumerate(fp.hunks)
+        if not _matches_at(orig_lines, _old_side(h), h.old_start - 1)
+    ]
+
+
+def relocate_hunk(original: str, hunk: Hunk) -> bool:
+    """Move hunk to the unique place its old side matches. Returns True on success."""
+    old = _old_side(hunk)
+    if not old:
+        return False
+    orig_lines = original.split("\n")
+    starts = [i for i in range(len(orig_lines) - len(old) + 1) if orig_lines[i:i + len(old)] == old]
+    if len(starts) != 1:
+        return False
+    hunk.old_start = starts[0] + 1
+    return True
+
+
+def renumber(fp: FilePatch) -> None:
+    """Recompute hunk counts and new_start from hunk lines and old_start; keep hunks in file order."""
+    fp.hunks.sort(key=lambda h: h.old_start)
+    offset = 0
+    for h in fp.hunks:
+        h.old_lines = sum(1 for prefix, _ in h.lines if prefix != "+")
+        h.new_lines = sum(1 for prefix, _ in h.lines if prefix != "-")
+        h.new_start = h.old_start + offset
+        offset += h.new_lines - h.old_lines
+
+
+def build_repair_prompt(failures: list[tuple[int, FilePatch, Hunk]], originals: dict[str, str]) -> str:
+    parts = []
+    for hunk_id, fp, hunk in failures:
+        orig_lines = originals[fp.path].split("\n")
+        lo = max(hunk.old_start - 1 - REGION_MARGIN, 0)
+        hi = min(hunk.old_start - 1 + hunk.old_lines + REGION_MARGIN, len(orig_lines))
+        region = "\n".join(f"{n + 1:>6} | {orig_lines[n]}" for n in range(lo, hi))
+        parts.append(f"## HUNK {hunk_id} ({fp.path})\n```diff\n{render_hunk(hunk)}\n```\n")
+        parts.append(f"Actual file lines {lo + 1}-{hi} of {fp.path}:\n```\n{region}\n```\n")
+    return "\n".join(parts)
+
+
+def parse_repaired_hunks(text: str) -> dict[int, Hunk]:
+    """Map hunk id -> corrected Hunk from the model's ### HUNK n sections."""
+    text = text.replace("```diff", "").replace("```", "")
+    marks = list(HUNK_HEADER_RE.finditer(text))
+    repaired: dict[int, Hunk] = {}
+    for n, m in enumerate(marks):
+        body = text[m.end():marks[n + 1].start() if n + 1 < len(marks) else len(text)].strip("\n")
+        parsed = parse_unified_diff(f"--- a/x\n+++ b/x\n{body}\n")
+        if parsed and parsed[0].hunks:
+            repaired[int(m.group(1))] = parsed[0].hunks[0]
+    return repaired
+
+
+async def repair_patch(
+    patch_text: str,
+    originals: dict[str, str],
+    ask_model: Callable[[str, str], Awaitable[str]],
+    max_attempts: int,
+) -> tuple[str, int, list[str]]:
+    """
+    Repair failing hunks of patch_text against originals (path -> current content).
+    ask_model(system, prompt) returns the model's text. Returns (patch, model calls
+    made, descriptions of hunks still failing); an empty list means the patch applies.
+    """
+    patches = parse_unified_diff(patch_text)
+    calls = 0
+    while True:
+        failures: list[tuple[int, FilePatch, Hunk]] = []
+        for fp in patches:
+            original = originals.get(fp.path, "")
+            for i in failing_hunks(original, fp):
+                if not relocate_hunk(original, fp.hunks[i]):
+                    failures.append((len(failures) + 1, fp, fp.hunks[i]))
+            renumber(fp)
+        if not failures or calls >= max_attempts:
+            break
+        calls += 1
+        repaired = parse_repaired_hunks(await ask_model(REPAIR_SYSTEM, build_repair_prompt(failures, originals)))
+        if not repaired:
+            break
+        for hunk_id, fp, hunk in failures:
+            if hunk_id in repaired:
+                at = next(i for i, h in enumerate(fp.hunks) if h is hunk)
+                fp.hunks[at] = repaired[hunk_id]
+
+    remaining = [f"{fp.path} hunk @@ -{h.old_start},{h.old_lines} @@" for _, fp, h in failures]
+    return render_unified_diff(patches), calls, remaining
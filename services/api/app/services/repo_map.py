@@ -0,0 +1,206 @@
+"""
+Compact, hierarchical repo map for agent prompts.
+
+Directories start collapsed into one summary line (file count and dominant
+extensions) and are expanded greedily under a token budget: first the ones on
+the way to the selected files, then the ones whose paths match words from the
+goal, then the rest breadth-first. Large directories list at most
+DIR_FILE_LIMIT files, relevant ones first.
+
+The directory index is cached per tree SHA; rendered maps are cached per
+(tree SHA, budget, focus files, goal keywords).
+"""
+import heapq
+import re
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Iterable, Optional
+
+from app.cache import TTLCache
+from app.config import get_settings
+from app.services.history import estimate_tokens
+
+DIR_FILE_LIMIT = 40
+TOP_EXTENSIONS = 3
+KEYWORD_RE = re.compile(r"[a-z0-9]{4,}")
+STOPWORDS = frozenset(
+    "about also code change file files from function have into make need please "
+    "should that their them then there this update when where which with would".split()
+)
+
+_settings = get_settings()
+index_cache = TTLCache("repo_map_index", maxsize=64, ttl=_settings.tree_cache_ttl_seconds)
+map_cache = TTLCache("repo_map", maxsize=512, ttl=_settings.tree_cache_ttl_seconds)
+
+
+@dataclass
+class DirNode:
+    path: str  # "" for the root
+    name: str
+    depth: int
+    dirs: dict[str, "DirNode"] = field(default_factory=dict)
+    files: list[str] = field(default_factory=list)  # names, sorted
+    total_files: int = 0
+    extensions: Counter = field(default_factory=Counter)
+
+
+@dataclass
+class RepoIndex:
+    root: DirNode
+    paths: list[str]  # every blob path, for relevance matching
+    dirs: int
+
+
+def _ext(name: str) -> str:
+    dot = name.rfind(".")
+    return name[dot:] if dot > 0 else "other"
+
+
+def build_index(entries: Iterable[dict[str, Any]]) -> RepoIndex:
+    root = DirNode("", "", 0)
+    paths: list[str] = []
+    dirs = 0
+    for e in entries:
+        if e.get("type") != "blob":
+            continue
+        path = e["path"]
+        paths.append(path)
+        *parents, name = path.split("/")
+        node = root
+        ext = _ext(name)
+        node.total_files += 1
+        node.extensions[ext] += 1
+        for part in parents:
+            child = node.dirs.get(part)
+            if child is None:
+                child = node.dirs[part] = DirNode(f"{node.path}/{part}" if node.path else part, part, node.depth + 1)
+                dirs += 1
+            node = child
+            node.total_files += 1
+            node.extensions[ext] += 1
+        node.files.append(name)
+    stack = [root]
+    while stack:
+        node = stack.pop()
+        node.files.sort()
+        stack.extend(node.dirs.values())
+    return RepoIndex(root, paths, dirs)
+
+
+def goal_keywords(goal: str) -> tuple[str, ...]:
+    return tuple(sorted({w for w in KEYWORD_RE.findall(goal.lower()) if w not in STOPWORDS}))
+
+
+def _ancestors(path: str) -> Iterable[str]:
+    parts = path.split("/")[:-1]
+    for i in range(1, len(parts) + 1):
+        yield "/".join(parts[:i])
+
+
+class _Renderer:
+    def __init__(self, index: RepoIndex, focus: Iterable[str], keywords: tuple[str, ...]) -> None:
+        self.index = index
+        self.focus = set(focus)
+        self.keyword_files = {p for p in index.paths if any(k in p.lower() for k in keywords)} if keywords else set()
+        # relevance: 2 = leads to a selected file, 1 = contains a goal keyword match
+        self.relevance: dict[str, int] = {}
+        for paths, score in ((self.keyword_files, 1), (self.focus, 2)):
+            for p in paths:
+                for d in _ancestors(p):
+                    self.relevance[d] = max(self.relevance.get(d, 0), score)
+
+    def summary(self, node: DirNode, indent: str) -> str:
+        exts = ", ".join(f"{n} {e}" for e, n in node.extensions.most_common(TOP_EXTENSIONS))
+        return f"{indent}{node.name}/ ({node.total_files} files: {exts})"
+
+    def shown_files(self, node: DirNode) -> tuple[list[str], int]:
+        if len(node.files) <= DIR_FILE_LIMIT:
+            return node.files, 0
+        prefix = f"{node.path}/" if node.path else ""
+
+        def rank(name: str) -> tuple[int, str]:
+            full = prefix + name
+            return (0 if full in self.focus else 1 if full in self.keyword_files else 2, name)
+
+        shown = sorted(sorted(node.files, key=rank)[:DIR_FILE_LIMIT])
+        return shown, len(node.files) - len(shown)
+
+    def children(self, node: DirNode, expanded: set[str]) -> list[str]:
+        """Lines for node's contents, with subdirectories expanded per `expanded`."""
+        indent = "  " * node.depth
+        lines: list[str] = []
+        for name in sorted(node.dirs):
+            child = node.dirs[name]
+            if child.path in expanded:
+                lines.append(f"{indent}{name}/")
+                lines.extend(self.children(child, expanded))
+            else:
+                lines.append(self.summary(child, indent))
+        files, hidden = self.shown_files(node)
+        lines.extend(f"{indent}{f}" for f in files)
+        if hidden:
+            lines.append(f"{indent}... {hidden} more files")
+        return lines
+
+    def expansion_cost(self, node: DirNode) -> int:
+        indent = "  " * (node.depth - 1)
+        lines = [f"{indent}{node.name}/"] + self.children(node, set())
+        return sum(estimate_tokens(line) for line in lines) - estimate_tokens(self.summary(node, indent))
+
+    def render(self, budget: int) -> str:
+        root = self.index.root
+        header = (
+            f"{root.total_files} files in {self.index.dirs} directories. "
+            "Lines like 'name/ (N files: ...)' are collapsed directories."
+        )
+        used = estimate_tokens(header) + sum(estimate_tokens(line) for line in self.children(root, set()))
+        expanded: set[str] = set()
+        heap: list[tuple[int, int, str, DirNode]] = []
+
+        def push_children(node: DirNode) -> None:
+            for child in node.dirs.values():
+                heapq.heappush(heap, (-self.relevance.get(child.path, 0), child.depth, child.path, child))
+
+        push_children(root)
+        while heap:
+            _, _, _, node = heapq.heappop(heap)
+            cost = self.expansion_cost(node)
+            if used + cost > budget:
+                continue  # a smaller directory may still fit
+            used += cost
+            expanded.add(node.path)
+            push_children(node)
+        return "\n".join([header] + self.children(root, expanded))
+
+
+def get_index(tree: dict[str, Any]) -> RepoIndex:
+    index = index_cache.get(tree["sha"])
+    if index is None:
+        index = build_index(tree["tree"])
+        index_cache.set(tree["sha"], index)
+    return index
+
+
+def build_repo_map(
+    tree: dict[str, Any],
+    focus: Iterable[str] = (),
+    goal: str = "",
+    token_budget: Optional[int] = None,
+) -> str:
+    """
+    Repo map for a full tree ({sha, tree: [{path, type}]}, as from get_full_tree),
+    within token_budget (REPO_MAP_TOKEN_BUDGET by default).
+    """
+    budget = token_budget or get_settings().repo_map_token_budget
+    focus = tuple(sorted(set(focus)))
+    keywords = goal_keywords(goal)
+    key = (tree["sha"], budget, focus, keywords)
+    cached = map_cache.get(key)
+    if cached is not None:
+        return cached
+    index = get_index(tree)
+    if not index.paths:
+        return "(empty)"
+    text = _Renderer(index, focus, keywords).render(budget)
+    map_cache.set(key, text)
+    return text
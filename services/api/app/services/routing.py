@@ -0,0 +1,70 @@
+"""
+Model routing: pick the model and max_tokens for each agent call from the
+endpoint kind, the prompt size, the goal length and (for patches) the number
+of files in play. Thresholds and model ids come from Settings (LLM_*, ROUTE_*).
+"""
+from dataclasses import asdict, dataclass
+from typing import Any, Literal, Optional
+
+from app.config import get_settings
+from app.metrics import LLM_ROUTES
+
+Kind = Literal["patch", "chat"]
+
+
+@dataclass(frozen=True)
+class Route:
+    name: str  # "fast", "default" or "override"
+    model: str
+    max_tokens: int
+    reason: str
+
+    def as_dict(self) -> dict[str, Any]:
+        return asdict(self)
+
+
+def _default(kind: Kind, reason: str) -> Route:
+    s = get_settings()
+    return Route("default", s.llm_default_model, s.patch_max_tokens if kind == "patch" else s.chat_max_tokens, reason)
+
+
+def _fast(reason: str) -> Route:
+    s = get_settings()
+    return Route("fast", s.llm_fast_model, s.llm_fast_max_tokens, reason)
+
+
+def choose_route(
+    kind: Kind,
+    prompt_tokens: int,
+    goal_chars: int,
+    files: Optional[int] = None,
+    override: Optional[str] = None,
+) -> Route:
+    """
+    Route one call. override may be "fast", "default" or a model id listed in
+    LLM_OVERRIDES_ALLOWED; anything else raises ValueError. Without an override,
+    small requests go to LLM_FAST_MODEL (when set) and everything else to LLM_DEFAULT_MODEL.
+    """
+    s = get_settings()
+    if override:
+        if override == "default":
+            route = _default(kind, "requested")
+        elif override == "fast" and s.llm_fast_model:
+            route = _fast("requested")
+        elif override in s.llm_overrides_allowed_list:
+            max_tokens = s.patch_max_tokens if kind == "patch" else s.chat_max_tokens
+            route = Route("override", override, max_tokens, "requested")
+        else:
+            raise ValueError(f"Model not allowed: {override}")
+    elif not s.llm_fast_model:
+        route = _default(kind, "no fast model configured")
+    elif prompt_tokens > s.route_fast_max_prompt_tokens:
+        route = _default(kind, f"prompt ~{prompt_tokens} tokens > {s.route_fast_max_prompt_tokens}")
+    elif goal_chars > s.route_fast_max_goal_chars:
+        route = _default(kind, f"goal {goal_chars} chars > {s.route_fast_max_goal_chars}")
+    elif files is not None and files > s.route_fast_max_files:
+        route = _default(kind, f"{files} files > {s.route_fast_max_files}")
+    else:
+        route = _fast("small request")
+    LLM_ROUTES.labels(operation=kind, route=route.name).inc()
+    return route
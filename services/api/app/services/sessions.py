@@ -0,0 +1,135 @@
+"""
+Server-side chat sessions: a snapshot of the repo context (tree SHA, repo map,
+file contents with their blob SHAs) plus the conversation, so each chat turn
+only sends the new message.
+
+Stored in Redis with a sliding TTL when REDIS_URL is set, otherwise in process
+memory (single worker / local dev only).
+
+A turn reads the session, calls the model and writes the whole session back,
+so turns on one session are serialized with lock(): a second message waits for
+the first instead of overwriting the history it appended.
+"""
+import asyncio
+import secrets
+import time
+from contextlib import asynccontextmanager
+from functools import lru_cache
+from typing import Any, AsyncContextManager, AsyncIterator, Optional, Protocol
+
+import orjson
+
+from app.cache import TTLCache
+from app.config import get_settings
+
+# Longest a turn may hold its session's lock; a crashed worker's Redis lock expires after this.
+SESSION_LOCK_SECONDS = 300
+
+
+class SessionBusy(Exception):
+    """Another turn held the session for longer than SESSION_LOCK_SECONDS."""
+
+
+def new_session(user_id: int, owner: str, repo: str, branch: str) -> dict[str, Any]:
+    now = time.time()
+    return {
+        "id": secrets.token_urlsafe(16),
+        "user_id": user_id,
+        "owner": owner,
+        "repo": repo,
+        "branch": branch,
+        "commit_sha": "",
+        "tree_sha": "",
+        "repo_map": "",
+        "files": {},  # path -> {"sha": blob sha, "content": str}
+        "history": [],  # [{"role", "content"}]
+        "created_at": now,
+        "updated_at": now,
+    }
+
+
+class SessionStore(Protocol):
+    async def get(self, session_id: str) -> Optional[dict[str, Any]]: ...
+    async def save(self, session: dict[str, Any]) -> None: ...
+    async def delete(self, session_id: str) -> None: ...
+    def lock(self, session_id: str) -> AsyncContextManager[None]: ...
+
+
+class RedisSessionStore:
+    def __init__(self, url: str, ttl: int) -> None:
+        import redis.asyncio as redis
+
+        self._redis = redis.from_url(url)
+        self.ttl = ttl
+
+    @staticmethod
+    def _key(session_id: str) -> str:
+        return f"zappr:chat:{session_id}"
+
+    async def get(self, session_id: str) -> Optional[dict[str, Any]]:
+        raw = await self._redis.get(self._key(session_id))
+        return orjson.loads(raw) if raw else None
+
+    async def save(self, session: dict[str, Any]) -> None:
+        session["updated_at"] = time.time()
+        await self._redis.set(self._key(session["id"]), orjson.dumps(session), ex=self.ttl)
+
+    async def delete(self, session_id: str) -> None:
+        await self._redis.delete(self._key(session_id))
+
+    @asynccontextmanager
+    async def lock(self, session_id: str) -> AsyncIterator[None]:
+        from redis.exceptions import LockError
+
+        lock = self._redis.lock(
+            f"{self._key(session_id)}:lock", timeout=SESSION_LOCK_SECONDS, blocking_timeout=SESSION_LOCK_SECONDS
+        )
+        if not await lock.acquire():
+            raise SessionBusy(session_id)
+        try:
+            yield
+        finally:
+            try:
+                await lock.release()
+            except LockError:
+                pass  # expired and possibly taken by the next turn
+
+
+class MemorySessionStore:
+    def __init__(self, ttl: int, maxsize: int = 1024) -> None:
+        self._cache = TTLCache("chat_session", maxsize=maxsize, ttl=ttl)
+        # session id -> (lock, number of turns holding or waiting for it)
+        self._locks: dict[str, tuple[asyncio.Lock, int]] = {}
+
+    async def get(self, session_id: str) -> Optional[dict[str, Any]]:
+        raw = self._cache.get(session_id)
+        return orjson.loads(raw) if raw else None
+
+    async def save(self, session: dict[str, Any]) -> None:
+        session["updated_at"] = time.time()
+        self._cache.set(session["id"], orjson.dumps(session))
+
+    async def delete(self, session_id: str) -> None:
+        self._cache.delete(session_id)
+
+    @asynccontextmanager
+    async def lock(self, session_id: str) -> AsyncIterator[None]:
+        lock, users = self._locks.get(session_id, (asyncio.Lock(), 0))
+        self._locks[session_id] = (lock, users + 1)
+        try:
+            async with lock:
+                yield
+        finally:
+            lock, users = self._locks[session_id]
+            if users == 1:
+                del self._locks[session_id]
+            else:
+                self._locks[session_id] = (lock, users - 1)
+
+
+@lru_cache
+def get_session_store() -> SessionStore:
+    settings = get_settings()
+    if settings.redis_url:
+        return RedisSessionStore(settings.redis_url, settings.chat_session_ttl_seconds)
+    return MemorySessionStore(settings.chat_session_ttl_seconds)
@@ -0,0 +1,203 @@
+"""
+One-shot "branch, commit and open PR" for a patch, through the git data API.
+
+The base ref is resolved once and, while that is in flight, new files are
+uploaded as blobs; patched files are read by their blob SHA in the resolved base
+tree (so a branch that moves meanwhile cannot mix versions) and uploaded too. A
+single tree and commit are then built on the base commit, the branch ref is
+created pointing at it, and the PR is opened.
+Nothing is visible on GitHub until the ref exists, so a failure before that
+leaves only unreferenced objects; if opening the PR fails, the new branch is
+deleted again.
+
+Progress is reported through emit() as {"step", "status": "started" | "done" |
+"failed", ...} records.
+"""
+import asyncio
+import time
+from contextlib import asynccontextmanager
+from typing import Any, AsyncIterator, Callable, Optional
+
+import httpx
+
+from app.config import get_settings
+from app.offload import apply_patch_async
+from app.patch_utils import FilePatch, parse_unified_diff
+from app.services.github import (
+    create_blob,
+    create_branch,
+    create_commit,
+    create_pr,
+    create_tree,
+    delete_branch,
+    get_branch_sha,
+    get_default_branch,
+    get_file_text,
+    get_full_tree,
+)
+
+Emit = Callable[[dict[str, Any]], None]
+DEFAULT_MODE = "100644"
+
+
+class ShipError(Exception):
+    """A pipeline step failed. status is the HTTP status to report for it."""
+
+    def __init__(self, step: str, message: str, status: int = 502) -> None:
+        super().__init__(message)
+        self.step = step
+        self.status = status
+
+
+def _error_status(e: Exception) -> tuple[str, int]:
+    if isinstance(e, ShipError):
+        return str(e), e.status
+    if isinstance(e, httpx.HTTPStatusError):
+        return f"GitHub returned {e.response.status_code}", e.response.status_code
+    if isinstance(e, ValueError):
+        return str(e), 400
+    return str(e) or type(e).__name__, 502
+
+
+@asynccontextmanager
+async def _step(emit: Emit, name: str, **info: Any) -> AsyncIterator[dict[str, Any]]:
+    """Emit started/done/failed for a step; failures are re-raised as ShipError."""
+    emit({"step": name, "status": "started", **info})
+    start = time.perf_counter()
+    done: dict[str, Any] = {}
+    try:
+        yield done
+    except Exception as e:
+        message, status = _error_status(e)
+        emit({"step": name, "status": "failed", "error": message, "ms": round((time.perf_counter() - start) * 1000)})
+        if isinstance(e, ShipError):
+            raise
+        raise ShipError(name, message, status) from e
+    emit({"step": name, "status": "done", "ms": round((time.perf_counter() - start) * 1000), **done})
+
+
+async def _read_original(
+    token: str, owner: str, repo: str, base_sha: str, base_tree: dict[str, Any], src: str
+) -> str:
+    """
+    Text of src in the base tree, read by its blob SHA. A file the tree does not
+    list, or that GitHub no longer has (404), reads as empty, as in
+    apply_patch_and_commit: a patch with context lines then fails to apply.
+    """
+    current = next((e for e in base_tree["tree"] if e["path"] == src), None)
+    if current is None and not base_tree.get("truncated"):
+        return ""
+    try:
+        # A truncated tree may not list src; reading at the base commit still pins the version.
+        return await get_file_text(token, owner, repo, src, base_sha, (current or {}).get("sha"), strict=True)
+    except httpx.HTTPStatusError as e:
+        if e.response.status_code == 404:
+            return ""
+        raise
+
+
+def _tree_entries(patches: list[FilePatch], uploads: list[Optional[str]], base_tree: dict[str, Any]) -> list[dict[str, Any]]:
+    """Tree entries for the uploaded blobs; removals for deleted and renamed sources."""
+    by_path = {e["path"]: e for e in base_tree["tree"]}
+    entries: list[dict[str, Any]] = []
+    for fp, new_sha in zip(patches, uploads):
+        src = fp.source
+        current = by_path.get(src) if src else None
+        if src is None and fp.path in by_path:
+            raise ShipError("create_tree", f"{fp.path} already exists", 409)
+        if fp.path == "/dev/null" and current is None and not base_tree.get("truncated"):
+            raise ShipError("create_tree", f"{src} not found", 409)
+        mode = (current or {}).get("mode") or DEFAULT_MODE
+        if fp.path == "/dev/null" or (src and src != fp.path):
+            entries.append({"path": src, "mode": mode, "type": "blob", "sha": None})
+        if fp.path != "/dev/null":
+            entries.append({"path": fp.path, "mode": mode, "type": "blob", "sha": new_sha})
+    return entries
+
+
+async def ship_patch(
+    token: str,
+    owner: str,
+    repo: str,
+    patch: str,
+    branch: str,
+    base: Optional[str],
+    commit_message: str,
+    title: str,
+    body: Optional[str],
+    emit: Emit,
+) -> dict[str, Any]:
+    """
+    Commit patch on a new branch off base (default branch if None) and open a PR.
+    The patch must already be validated. Returns {branch, base, commit_sha,
+    pr_url, pr_number}; raises ShipError after emitting the failed step.
+    """
+    patches = parse_unified_diff(patch)
+    if not patches:
+        raise ShipError("validate", "Invalid patch", 400)
+
+    if not base:
+        async with _step(emit, "default_branch") as done:
+            base = await get_default_branch(token, owner, repo)
+            done["base"] = base
+
+    async def resolve_base() -> tuple[str, dict[str, Any]]:
+        async with _step(emit, "resolve_base", base=base) as done:
+            sha = await get_branch_sha(token, owner, repo, base)
+            tree = await get_full_tree(token, owner, repo, sha)
+            done["sha"] = sha
+        return sha, tree
+
+    base_task = asyncio.create_task(resolve_base())
+
+    async def upload_blobs() -> list[Optional[str]]:
+        sem = asyncio.Semaphore(get_settings().bulk_file_concurrency)
+
+        async def one(fp: FilePatch) -> Optional[str]:
+            if fp.path == "/dev/null":
+                return None
+            if fp.source:
+                base_sha, base_tree = await base_task
+            async with sem:
+                original = await _read_original(token, owner, repo, base_sha, base_tree, fp.source) if fp.source else ""
+                return await create_blob(token, owner, repo, await apply_patch_async(original, fp))
+
+        async with _step(emit, "upload_blobs", files=len(patches)):
+            return list(await asyncio.gather(*(one(fp) for fp in patches)))
+
+    blobs_task = asyncio.create_task(upload_blobs())
+    try:
+        (base_sha, base_tree), uploads = await asyncio.gather(base_task, blobs_task)
+    finally:
+        for t in (base_task, blobs_task):
+            t.cancel()
+        await asyncio.gather(base_task, blobs_task, return_exceptions=True)
+
+    async with _step(emit, "create_tree") as done:
+        tree_sha = await create_tree(token, owner, repo, base_tree["sha"], _tree_entries(patches, uploads, base_tree))
+        done["sha"] = tree_sha
+    async with _step(emit, "create_commit") as done:
+        commit_sha = await create_commit(token, owner, repo, commit_message, tree_sha, [base_sha])
+        done["sha"] = commit_sha
+    async with _step(emit, "create_branch", branch=branch):
+        await create_branch(token, owner, repo, branch, commit_sha)
+
+    try:
+        async with _step(emit, "open_pr") as done:
+            pr_url = await create_pr(token, owner, repo, branch, base, title, body)
+            done["pr_url"] = pr_url
+    except ShipError:
+        try:
+            async with _step(emit, "rollback", branch=branch):
+                await delete_branch(token, owner, repo, branch)
+        except ShipError:
+            pass  # reported by the rollback step; the PR failure is what the caller sees
+        raise
+
+    return {
+        "branch": branch,
+        "base": base,
+        "commit_sha": commit_sha,
+        "pr_url": pr_url,
+        "pr_number": int(pr_url.rstrip("/").split("/")[-1]) if pr_url else 0,
+    }
@@ -0,0 +1,176 @@
+"""
+Incremental parser for streamed agent output (## PLAN / ## PATCH / ## SUMMARY).
+
+Consumes text deltas as they arrive and emits plan bullets, per-file diffs and
+the summary as each completes, in a single pass. While the patch streams it
+applies the same blocked-path, secrets and size checks as validate_patch, so
+a generation that is certain to be rejected can be stopped early.
+"""
+import re
+from dataclasses import dataclass, field
+from typing import Any, Optional
+
+from app.services.patch_validator import BLOCKED_RE, SECRET_RE
+
+SECTION_RE = re.compile(r"^##\s*(PLAN|PATCH|SUMMARY)\s*$", re.IGNORECASE)
+HUNK_RE = re.compile(r"@@ -(\d+)(?:,(\d+))? \+(\d+)(?:,(\d+))? @@")
+
+
+@dataclass
+class StreamedFile:
+    path: str
+    old_path: str
+    lines: list[str] = field(default_factory=list)
+    additions: int = 0
+    deletions: int = 0
+
+    @property
+    def display_path(self) -> str:
+        return self.old_path if self.path == "/dev/null" else self.path
+
+
+class AgentStreamParser:
+    """
+    feed() text deltas, then close(). Both return events as (kind, value):
+    ("plan", bullet), ("file", StreamedFile) when a file diff is complete, and
+    ("summary", text). After a check fails, `rejection` holds (reason, message)
+    with the same reasons validate_patch reports, and further input is ignored.
+    """
+
+    def __init__(self, max_files: int, max_lines: int) -> None:
+        self.max_files = max_files
+        self.max_lines = max_lines
+        self.plan: list[str] = []
+        self.files: list[StreamedFile] = []
+        self.rejection: Optional[tuple[str, str]] = None
+        self._patch_lines: list[str] = []
+        self._summary_lines: list[str] = []
+        self._buf = ""
+        self._section: Optional[str] = None
+        self._file: Optional[StreamedFile] = None
+        self._path_pending = False  # saw "--- ", "+++ " may follow
+        self._in_hunk = False
+        self._changed = 0
+        self._events: list[tuple[str, Any]] = []
+
+    def feed(self, text: str) -> list[tuple[str, Any]]:
+        self._buf += text
+        *lines, self._buf = self._buf.split("\n")
+        for line in lines:
+            if self.rejection:
+                break
+            self._line(line)
+        return self._drain()
+
+    def close(self) -> list[tuple[str, Any]]:
+        if self._buf and not self.rejection:
+            self._line(self._buf)
+        self._buf = ""
+        self._enter(None)
+        return self._drain()
+
+    def result(self) -> dict[str, Any]:
+        """Same shape as parse_agent_response plus files_changed."""
+        return {
+            "plan": self.plan,
+            "patch": "\n".join(self._patch_lines).strip(),
+            "summary": "\n".join(self._summary_lines).strip(),
+            "files_changed": [f.display_path for f in self.files],
+        }
+
+    def _drain(self) -> list[tuple[str, Any]]:
+        events, self._events = self._events, []
+        return events
+
+    def _reject(self, reason: str, message: str) -> None:
+        if self.rejection is None:
+            self.rejection = (reason, message)
+
+    def _enter(self, section: Optional[str]) -> None:
+        if self._section == "patch":
+            self._close_file()
+        elif self._section == "summary":
+            self._events.append(("summary", "\n".join(self._summary_lines).strip()))
+        self._section = section
+
+    def _line(self, line: str) -> None:
+        m = SECTION_RE.match(line)
+        if m:
+            self._enter(m.group(1).lower())
+            return
+        if line.startswith("##"):
+            self._enter(None)  # any other heading ends the section, as in parse_agent_response
+            return
+        if self._section == "plan":
+            bullet = line.strip().lstrip("-•*").strip()
+            if bullet:
+                self.plan.append(bullet)
+                self._events.append(("plan", bullet))
+        elif self._section == "summary":
+            self._summary_lines.append(line)
+        elif self._section == "patch":
+            self._patch_lines.append(line)
+            self._patch_line(line)
+
+    # Mirrors parse_unified_diff's state machine so the counts match validate_patch.
+    def _patch_line(self, line: str) -> None:
+        if SECRET_RE.search(line):
+            self._reject("secrets", "Patch contains potential API keys or secrets")
+            return
+        if line.startswith("--- "):
+            self._close_file()
+            old_path = line[4:].split("\t")[0].strip()
+            if old_path.startswith("a/"):
+                old_path = old_path[2:]
+            self._file = StreamedFile(path=old_path, old_path=old_path, lines=[line])
+            self._path_pending = True
+            self._in_hunk = False
+            return
+        if self._file is None:
+            return
+        self._file.lines.append(line)
+        if self._path_pending:
+            # The line after "--- " is the "+++ " header or is skipped, as in parse_unified_diff.
+            self._path_pending = False
+            if line.startswith("+++ "):
+                new_path = line[4:].split("\t")[0].strip()
+                if new_path.startswith("b/"):
+                    new_path = new_path[2:]
+                self._file.path = new_path or self._file.old_path
+            self._open_file()
+            return
+        if line.startswith("@@ "):
+            self._in_hunk = HUNK_RE.match(line) is not None
+            return
+        if not self._in_hunk:
+            return
+        if line.startswith("+++") or line.startswith("---"):
+            self._in_hunk = False
+            return
+        if line.startswith("+"):
+            self._file.additions += 1
+        elif line.startswith("-"):
+            self._file.deletions += 1
+        elif not line.startswith(" ") and line != "\\ No newline at end of file":
+            self._in_hunk = False
+            return
+        else:
+            return
+        self._changed += 1
+        if self._changed > self.max_lines:
+            self._reject("too_many_lines", f"Too many lines changed (max {self.max_lines})")
+
+    def _open_file(self) -> None:
+        assert self._file is not None
+        if len(self.files) + 1 > self.max_files:
+            self._reject("too_many_files", f"Too many files changed (max {self.max_files})")
+        elif BLOCKED_RE.search(self._file.path):
+            self._reject("blocked_path", f"Blocked path: {self._file.path}")
+
+    def _close_file(self) -> None:
+        if self._file is not None and not self._path_pending:  # a trailing "--- " alone is dropped
+            self.files.append(self._file)
+            self._events.append(("file", self._file))
+        self._file = None
+        self._path_pending = False
+        self._in_hunk = False
@@ -0,0 +1,74 @@
+"""
+Tree deltas between two snapshots of a repo, so clients can refresh a file
+browser without refetching the whole tree.
+"""
+from typing import Any
+
+
+def diff_trees(old: list[dict[str, Any]], new: list[dict[str, Any]]) -> dict[str, list[dict[str, Any]]]:
+    """
+    Compare two flat tree listings ({path, type, sha}).
+    Directories are reported only when they appear or disappear; a directory
+    whose SHA changed is implied by the blob changes underneath it.
+    """
+    old_by_path = {e["path"]: e for e in old}
+    new_by_path = {e["path"]: e for e in new}
+    added = [e for p, e in new_by_path.items() if p not in old_by_path]
+    removed = [e for p, e in old_by_path.items() if p not in new_by_path]
+    modified = []
+    for p, e in new_by_path.items():
+        prev = old_by_path.get(p)
+        if prev is None:
+            continue
+        if prev["type"] != e["type"]:
+            removed.append(prev)
+            added.append(e)
+        elif e["type"] == "blob" and prev.get("sha") != e.get("sha"):
+            modified.append(e)
+    return {"added": added, "removed": removed, "modified": modified}
+
+
+def _ancestors(path: str) -> list[str]:
+    parts = path.split("/")
+    return ["/".join(parts[:i]) for i in range(1, len(parts))]
+
+
+def compare_to_delta(files: list[dict[str, Any]], head_tree: list[dict[str, Any]]) -> dict[str, list[dict[str, Any]]]:
+    """
+    Turn the `files` list of GitHub's compare API into the diff_trees shape.
+    The compare API lists blobs only; directories that appeared or disappeared
+    are derived from those blobs and head_tree (the full tree at the head), so
+    the result matches diff_trees on the two full trees.
+    """
+    added: list[dict[str, Any]] = []
+    removed: list[dict[str, Any]] = []
+    modified: list[dict[str, Any]] = []
+    for f in files:
+        entry = {"path": f["filename"], "type": "blob", "sha": f.get("sha")}
+        status = f.get("status")
+        if status == "added" or status == "copied":
+            added.append(entry)
+        elif status == "removed":
+            removed.append({**entry, "sha": None})
+        elif status == "renamed":
+            removed.append({"path": f.get("previous_filename", ""), "type": "blob", "sha": None})
+            added.append(entry)
+        else:
+            modified.append(entry)
+
+    # A head directory is new unless something under it already existed at the base:
+    # a removed or modified blob, or a blob that was not added.
+    head_dirs = {e["path"]: e for e in head_tree if e["type"] == "tree"}
+    added_paths = {e["path"] for e in added}
+    existed = {d for e in removed + modified for d in _ancestors(e["path"])}
+    existed.update(d for e in head_tree if e["type"] == "blob" and e["path"] not in added_paths for d in _ancestors(e["path"]))
+    new_dirs = dict.fromkeys(d for e in added for d in _ancestors(e["path"]) if d in head_dirs and d not in existed)
+    gone_dirs = dict.fromkeys(d for e in removed for d in _ancestors(e["path"]) if d not in head_dirs)
+    added += [head_dirs[d] for d in new_dirs]
+    removed += [{"path": d, "type": "tree", "sha": None} for d in gone_dirs]
+    return {"added": added, "removed": removed, "modified": modified}
+
+
+def limit_depth(delta: dict[str, list[dict[str, Any]]], depth: int) -> dict[str, list[dict[str, Any]]]:
+    """Keep only entries /tree would have listed (at most `depth` path components)."""
+    return {k: [e for e in v if e["path"].count("/") + 1 <= depth] for k, v in delta.items()}
@@ -0,0 +1,206 @@
+"""
+Lightweight span tracing for request pipelines.
+
+Spans nest through contextvars, so instrumented code in routers and services
+needs no explicit plumbing. Every request gets a Server-Timing header summing
+finished span durations by name, and completed traces go to the configured
+exporter: "console" (log lines), "otlp-file" (OTLP/JSON, one export request
+per line), or anything passed to set_exporter().
+"""
+import functools
+import json
+import logging
+import secrets
+import threading
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field
+from typing import Any, Callable, Iterator, Optional, Protocol
+
+from starlette.datastructures import MutableHeaders
+from starlette.types import ASGIApp, Message, Receive, Scope, Send
+
+logger = logging.getLogger("app.tracing")
+
+
+@dataclass
+class Span:
+    name: str
+    trace_id: str
+    span_id: str
+    parent_id: Optional[str]
+    start_ns: int
+    end_ns: Optional[int] = None
+    attributes: dict[str, Any] = field(default_factory=dict)
+    error: Optional[str] = None
+
+    @property
+    def duration_ms(self) -> float:
+        return ((self.end_ns or time.time_ns()) - self.start_ns) / 1e6
+
+
+@dataclass
+class Trace:
+    trace_id: str
+    spans: list[Span] = field(default_factory=list)
+
+
+class SpanExporter(Protocol):
+    def export(self, spans: list[Span]) -> None: ...
+
+
+class ConsoleExporter:
+    def export(self, spans: list[Span]) -> None:
+        for s in spans:
+            logger.info(
+                "span trace=%s id=%s parent=%s name=%s dur=%.1fms%s",
+                s.trace_id, s.span_id, s.parent_id or "-", s.name, s.duration_ms,
+                f" error={s.error}" if s.error else "",
+            )
+
+
+class OTLPFileExporter:
+    """Append traces as OTLP/JSON ExportTraceServiceRequest objects, one per line."""
+
+    def __init__(self, path: str, service_name: str = "zappr-api") -> None:
+        self.path = path
+        self.service_name = service_name
+        self._lock = threading.Lock()
+
+    def export(self, spans: list[Span]) -> None:
+        doc = {
+            "resourceSpans": [{
+                "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": self.service_name}}]},
+                "scopeSpans": [{
+                    "scope": {"name": "app.tracing"},
+                    "spans": [self._span(s) for s in spans],
+                }],
+            }]
+        }
+        line = json.dumps(doc, separators=(",", ":"))
+        with self._lock, open(self.path, "a", encoding="utf-8") as f:
+            f.write(line + "\n")
+
+    @staticmethod
+    def _span(s: Span) -> dict[str, Any]:
+        out: dict[str, Any] = {
+            "traceId": s.trace_id,
+            "spanId": s.span_id,
+            "name": s.name,
+            "kind": 1,
+            "startTimeUnixNano": str(s.start_ns),
+            "endTimeUnixNano": str(s.end_ns or s.start_ns),
+            "attributes": [{"key": k, "value": {"stringValue": str(v)}} for k, v in s.attributes.items()],
+            "status": {"code": 2, "message": s.error} if s.error else {"code": 1},
+        }
+        if s.parent_id:
+            out["parentSpanId"] = s.parent_id
+        return out
+
+
+_exporter: Optional[SpanExporter] = None
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("zappr_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("zappr_span", default=None)
+
+
+def set_exporter(exporter: Optional[SpanExporter]) -> None:
+    global _exporter
+    _exporter = exporter
+
+
+def configure_from_settings(kind: str, path: str) -> None:
+    if kind == "console":
+        set_exporter(ConsoleExporter())
+    elif kind == "otlp-file":
+        set_exporter(OTLPFileExporter(path))
+    elif kind:
+        raise ValueError(f"Unknown trace exporter: {kind}")
+
+
+@contextmanager
+def span(name: str, **attributes: Any) -> Iterator[Span]:
+    """Time a block as a child of the current span. No-op bookkeeping outside a request."""
+    trace = _current_trace.get()
+    parent = _current_span.get()
+    s = Span(
+        name=name,
+        trace_id=trace.trace_id if trace else secrets.token_hex(16),
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        start_ns=time.time_ns(),
+        attributes=attributes,
+    )
+    token = _current_span.set(s)
+    try:
+        yield s
+    except BaseException as e:
+        s.error = type(e).__name__
+        raise
+    finally:
+        s.end_ns = time.time_ns()
+        _current_span.reset(token)
+        if trace is not None:
+            trace.spans.append(s)
+
+
+def traced(name: str) -> Callable:
+    """Decorator: wrap an async function in span(name)."""
+    def decorator(fn: Callable) -> Callable:
+        @functools.wraps(fn)
+        async def wrapper(*args: Any, **kwargs: Any) -> Any:
+            with span(name):
+                return await fn(*args, **kwargs)
+        return wrapper
+    return decorator
+
+
+def server_timing(trace: Trace) -> str:
+    """Server-Timing value with durations summed per span name, in first-seen order."""
+    totals: dict[str, float] = {}
+    counts: dict[str, int] = {}
+    for s in trace.spans:
+        if s.end_ns is None or s.parent_id is None:
+            continue
+        totals[s.name] = totals.get(s.name, 0.0) + s.duration_ms
+        counts[s.name] = counts.get(s.name, 0) + 1
+    parts = []
+    for name, dur in totals.items():
+        desc = f';desc="x{counts[name]}"' if counts[name] > 1 else ""
+        parts.append(f"{name};dur={dur:.1f}{desc}")
+    return ", ".join(parts)
+
+
+class TracingMiddleware:
+    """Open a root span per request, add Server-Timing, export the finished trace."""
+
+    def __init__(self, app: ASGIApp) -> None:
+        self.app = app
+
+    async def __call__(self, scope: Scope, receive: Receive, send: Send) -> None:
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+        trace = Trace(trace_id=secrets.token_hex(16))
+        trace_token = _current_trace.set(trace)
+
+        async def send_wrapper(message: Message) -> None:
+            if message["type"] == "http.response.start":
+                timing = server_timing(trace)
+                if timing:
+                    MutableHeaders(raw=message["headers"]).append("Server-Timing", timing)
+            await send(message)
+
+        try:
+            with span(f"{scope['method']} {scope['path']}") as root:
+                await self.app(scope, receive, send_wrapper)
+                route = scope.get("route")
+                if route is not None:
+                    root.name = f"{scope['method']} {route.path}"
+        finally:
+            _current_trace.reset(trace_token)
+            if _exporter is not None:
+                try:
+                    _exporter.export(trace.spans)
+                except Exception:
+                    logger.exception("trace export failed")
@@ -0,0 +1,93 @@
+"""
+Event-loop latency under mixed patch load, with and without the process-pool
+offload (app/offload.py).
+
+A ticker coroutine sleeps for --tick-ms in a loop and records how late each
+wake-up is; that lateness is what every other request on the worker waits.
+Meanwhile --small small patches and --large large_file patches (see
+benchmarks/patchgen.py) are validated and applied concurrently through the
+offload helpers the API uses.
+
+    python benchmarks/bench_event_loop.py
+    python benchmarks/bench_event_loop.py --large 8 --workers 4 --min-bytes 32768
+"""
+import argparse
+import asyncio
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app import offload  # noqa: E402
+from app.config import get_settings  # noqa: E402
+from app.patch_utils import parse_unified_diff  # noqa: E402
+from benchmarks.patchgen import DiffCase, scenario  # noqa: E402
+
+
+def _percentile(values: list[float], pct: float) -> float:
+    ordered = sorted(values)
+    return ordered[min(len(ordered) - 1, int(len(ordered) * pct))]
+
+
+async def _job(case: DiffCase) -> None:
+    valid, msg, _ = await offload.validate_patch_async(case.patch, max_files=10**6, max_lines=10**9)
+    if not valid:
+        raise SystemExit(f"{case.name}: {msg}")
+    for fp in parse_unified_diff(case.patch):
+        if await offload.apply_patch_async(case.originals[fp.path], fp) != case.expected[fp.path]:
+            raise SystemExit(f"{case.name}: unexpected apply result for {fp.path}")
+
+
+async def _run(small: DiffCase, large: DiffCase, n_small: int, n_large: int, tick: float) -> dict[str, float]:
+    lags: list[float] = []
+    stop = asyncio.Event()
+
+    async def ticker() -> None:
+        while not stop.is_set():
+            t0 = time.perf_counter()
+            await asyncio.sleep(tick)
+            lags.append((time.perf_counter() - t0 - tick) * 1000)
+
+    tick_task = asyncio.create_task(ticker())
+    await asyncio.sleep(tick * 5)  # settle
+    t0 = time.perf_counter()
+    await asyncio.gather(*([_job(small) for _ in range(n_small)] + [_job(large) for _ in range(n_large)]))
+    wall = time.perf_counter() - t0
+    stop.set()
+    await tick_task
+    return {
+        "wall_s": wall,
+        "lag_p50_ms": statistics.median(lags),
+        "lag_p99_ms": _percentile(lags, 0.99),
+        "lag_max_ms": max(lags),
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--small", type=int, default=200, help="small patches")
+    ap.add_argument("--large", type=int, default=4, help="large_file patches")
+    ap.add_argument("--workers", type=int, default=2)
+    ap.add_argument("--min-bytes", type=int, default=get_settings().offload_min_bytes)
+    ap.add_argument("--tick-ms", type=float, default=5.0)
+    args = ap.parse_args()
+
+    settings = get_settings()
+    small, large = scenario("small"), scenario("large_file")
+    print(f"small patch {len(small.patch)} B, large patch {len(large.patch)} B against "
+          f"{sum(len(v) for v in large.originals.values()) // 1024} KB of originals")
+    print(f"{'mode':<10} {'wall s':>8} {'lag p50 ms':>11} {'lag p99 ms':>11} {'lag max ms':>11}")
+    for mode, workers in (("inline", 0), ("offload", args.workers)):
+        settings.offload_workers = workers
+        settings.offload_min_bytes = args.min_bytes
+        settings.offload_max_pending = max(settings.offload_max_pending, args.large)
+        r = asyncio.run(_run(small, large, args.small, args.large, args.tick_ms / 1000))
+        offload.shutdown_pool()
+        print(f"{mode:<10} {r['wall_s']:>8.2f} {r['lag_p50_ms']:>11.2f} {r['lag_p99_ms']:>11.2f} {r['lag_max_ms']:>11.2f}")
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
@@ -0,0 +1,105 @@
+"""
+Microbenchmarks for parse_unified_diff, apply_patch and validate_patch on
+synthetic diffs (see benchmarks/patchgen.py), with stored baselines.
+
+    python benchmarks/bench_patch.py                     # compare against baseline
+    python benchmarks/bench_patch.py --update-baseline   # record a new baseline
+    python benchmarks/bench_patch.py --threshold 0.3 --scenarios small,large_file
+
+Exits with status 1 when any (scenario, operation) median is slower than its
+baseline by more than the threshold. Baselines are machine-specific: record
+them on the machine (or CI runner class) that runs the comparison.
+"""
+import argparse
+import json
+import statistics
+import sys
+import time
+from pathlib import Path
+from typing import Callable
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from app.patch_utils import apply_patch, parse_unified_diff  # noqa: E402
+from app.services.patch_validator import validate_patch  # noqa: E402
+from benchmarks.patchgen import SCENARIOS, DiffCase, scenario  # noqa: E402
+
+BASELINE = Path(__file__).parent / "baselines" / "patch.json"
+
+
+def _time(fn: Callable[[], object], rounds: int, min_time: float = 0.2) -> float:
+    """Median milliseconds per call over `rounds` samples (each sample loops until min_time/rounds)."""
+    fn()  # warm-up
+    t0 = time.perf_counter()
+    fn()
+    single = time.perf_counter() - t0
+    loops = max(1, int(min_time / rounds / max(single, 1e-9)))
+    samples = []
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        for _ in range(loops):
+            fn()
+        samples.append((time.perf_counter() - t0) / loops * 1000)
+    return statistics.median(samples)
+
+
+def bench_case(case: DiffCase, rounds: int) -> dict[str, float]:
+    file_patches = parse_unified_diff(case.patch)
+    for fp in file_patches:
+        if apply_patch(case.originals[fp.path], fp) != case.expected[fp.path]:
+            raise SystemExit(f"{case.name}: apply_patch produced unexpected output for {fp.path}")
+
+    def apply_all() -> None:
+        for fp in file_patches:
+            apply_patch(case.originals[fp.path], fp)
+
+    return {
+        "parse_unified_diff": _time(lambda: parse_unified_diff(case.patch), rounds),
+        "apply_patch": _time(apply_all, rounds),
+        "validate_patch": _time(lambda: validate_patch(case.patch, max_files=10**6, max_lines=10**9), rounds),
+    }
+
+
+def main() -> int:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--scenarios", default=",".join(SCENARIOS))
+    ap.add_argument("--rounds", type=int, default=7)
+    ap.add_argument("--threshold", type=float, default=0.25, help="allowed slowdown, 0.25 = +25%%")
+    ap.add_argument("--baseline", type=Path, default=BASELINE)
+    ap.add_argument("--update-baseline", action="store_true")
+    args = ap.parse_args()
+
+    baseline = json.loads(args.baseline.read_text()) if args.baseline.exists() else {}
+    results: dict[str, dict[str, float]] = {}
+    regressions = []
+
+    print(f"{'scenario':<16} {'operation':<20} {'ms':>10} {'baseline':>10} {'delta':>8}")
+    for name in [n.strip() for n in args.scenarios.split(",") if n.strip()]:
+        results[name] = bench_case(scenario(name), args.rounds)
+        for op, ms in results[name].items():
+            base = baseline.get(name, {}).get(op)
+            delta = f"{(ms / base - 1) * 100:+.0f}%" if base else "n/a"
+            flag = ""
+            if base and ms > base * (1 + args.threshold):
+                regressions.append((name, op, base, ms))
+                flag = "  REGRESSION"
+            base_col = f"{base:.3f}" if base else "n/a"
+            print(f"{name:<16} {op:<20} {ms:>10.3f} {base_col:>10} {delta:>8}{flag}")
+
+    if args.update_baseline:
+        merged = {**baseline, **{k: {op: round(v, 4) for op, v in ops.items()} for k, ops in results.items()}}
+        args.baseline.parent.mkdir(parents=True, exist_ok=True)
+        args.baseline.write_text(json.dumps(merged, indent=2, sort_keys=True) + "\n")
+        print(f"baseline written to {args.baseline}")
+        return 0
+
+    if regressions:
+        print(f"\n{len(regressions)} regression(s) above {args.threshold:.0%}:")
+        for name, op, base, ms in regressions:
+            print(f"  {name}/{op}: {base:.3f} ms -> {ms:.3f} ms")
+        return 1
+    return 0
+
+
+if __name__ == "__main__":
+    sys.exit(main())
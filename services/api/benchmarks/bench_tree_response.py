@@ -0,0 +1,86 @@
+"""
+Compare /repos/{owner}/{repo}/tree serialization paths for a large tree.
+
+    python benchmarks/bench_tree_response.py [--entries 5000] [--rounds 50]
+
+"before": one TreeEntry per entry, TreeResponse -> FastAPI JSONResponse.
+"after": the get_tree dicts serialized directly with ORJSONResponse.
+Also reports the wire size with gzip and brotli.
+"""
+import argparse
+import gzip
+import statistics
+import sys
+import time
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).resolve().parents[1]))
+
+from fastapi.encoders import jsonable_encoder  # noqa: E402
+from fastapi.responses import JSONResponse, ORJSONResponse  # noqa: E402
+
+from app.schemas import TreeEntry, TreeResponse  # noqa: E402
+
+try:
+    import brotli
+except ImportError:
+    brotli = None
+
+
+def make_tree(n: int) -> dict:
+    tree = []
+    for i in range(n):
+        d = f"src/pkg{i % 40}/mod{i % 7}"
+        if i % 10 == 0:
+            tree.append({"path": d, "type": "tree", "sha": f"{i:040x}"})
+        else:
+            tree.append({"path": f"{d}/file_{i}.py", "type": "blob", "sha": f"{i:040x}"})
+    return {"sha": "f" * 40, "tree": tree, "truncated": False}
+
+
+def before(data: dict) -> bytes:
+    model = TreeResponse(
+        sha=data["sha"],
+        tree=[TreeEntry(path=e["path"], type=e["type"], sha=e.get("sha")) for e in data["tree"]],
+        truncated=data.get("truncated", False),
+    )
+    # FastAPI validates the returned model against response_model, then encodes it.
+    validated = TreeResponse.model_validate(model.model_dump())
+    return JSONResponse(jsonable_encoder(validated)).body
+
+
+def after(data: dict) -> bytes:
+    return ORJSONResponse({"sha": data["sha"], "tree": data["tree"], "truncated": data.get("truncated", False)}).body
+
+
+def bench(fn, data: dict, rounds: int) -> tuple[float, bytes]:
+    timings = []
+    body = b""
+    for _ in range(rounds):
+        t0 = time.perf_counter()
+        body = fn(data)
+        timings.append((time.perf_counter() - t0) * 1000)
+    return statistics.median(timings), body
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("--entries", type=int, default=5000)
+    ap.add_argument("--rounds", type=int, default=50)
+    args = ap.parse_args()
+
+    data = make_tree(args.entries)
+    t_before, body_before = bench(before, data, args.rounds)
+    t_after, body_after = bench(after, data, args.rounds)
+
+    print(f"entries: {args.entries}")
+    print(f"before (pydantic + JSONResponse): {t_before:8.2f} ms  {len(body_before):>9} bytes")
+    print(f"after  (dicts + ORJSONResponse):  {t_after:8.2f} ms  {len(body_after):>9} bytes")
+    print(f"speedup: {t_before / t_after:.1f}x")
+    print(f"gzip -6:   {len(gzip.compress(body_after, 6)):>9} bytes")
+    if brotli is not None:
+        print(f"brotli q4: {len(brotli.compress(body_after, quality=4)):>9} bytes")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""
+Local stand-in for the Anthropic messages endpoint.
+
+Returns a fixed PLAN/PATCH/SUMMARY answer whose patch applies to the fake
+GitHub repository, after a configurable delay. Supports both plain JSON and
+`stream: true` (server-sent events) requests and counts calls per model.
+"""
+import asyncio
+import json
+from collections import Counter
+
+from fastapi import FastAPI, Request
+from fastapi.responses import StreamingResponse
+
+PATCH_TARGET = "src/pkg0/module_0.py"
+
+RESPONSE_TEXT = "\n".join([
+    "## PLAN",
+    "- Import os in module_0",
+    "",
+    "## PATCH",
+    f"--- a/{PATCH_TARGET}",
+    f"+++ b/{PATCH_TARGET}",
+    "@@ -1,3 +1,4 @@",
+    ' """Synthetic module 0."""',
+    "+import os",
+    " ",
+    " ",
+    "",
+    "## SUMMARY",
+    f"- {PATCH_TARGET}: add import",
+    "",
+])
+
+
+def create_fake_anthropic(latency_ms: float = 1500.0, text: str = RESPONSE_TEXT) -> tuple[FastAPI, Counter]:
+    app = FastAPI()
+    calls: Counter = Counter()
+
+    @app.post("/v1/messages")
+    async def messages(request: Request):
+        body = await request.json()
+        model = body.get("model", "unknown")
+        calls[model] += 1
+        prompt_chars = sum(len(m["content"]) if isinstance(m["content"], str) else 0 for m in body.get("messages", []))
+        usage = {"input_tokens": prompt_chars // 4, "output_tokens": len(text) // 4}
+        message = {
+            "id": "msg_loadtest",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+        }
+
+        if not body.get("stream"):
+            await asyncio.sleep(latency_ms / 1000)
+            return {**message, "content": [{"type": "text", "text": text}], "usage": usage}
+
+        async def events():
+            def sse(event: str, data: dict) -> bytes:
+                return f"event: {event}\ndata: {json.dumps(data)}\n\n".encode()
+
+            # Spread the latency over the stream the way token generation would.
+            chunks = [text[i:i + 64] for i in range(0, len(text), 64)] or [""]
+            delay = latency_ms / 1000 / (len(chunks) + 1)
+            await asyncio.sleep(delay)
+            yield sse("message_start", {"type": "message_start", "message": {
+                **message, "content": [], "stop_reason": None,
+                "usage": {"input_tokens": usage["input_tokens"], "output_tokens": 0},
+            }})
+            yield sse("content_block_start", {"type": "content_block_start", "index": 0, "content_block": {"type": "text", "text": ""}})
+            for chunk in chunks:
+                await asyncio.sleep(delay)
+                yield sse("content_block_delta", {"type": "content_block_delta", "index": 0, "delta": {"type": "text_delta", "text": chunk}})
+            yield sse("content_block_stop", {"type": "content_block_stop", "index": 0})
+            yield sse("message_delta", {"type": "message_delta", "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                                        "usage": {"output_tokens": usage["output_tokens"]}})
+            yield sse("message_stop", {"type": "message_stop"})
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app, calls
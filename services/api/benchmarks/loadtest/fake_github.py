@@ -0,0 +1,184 @@
+"""
+Local stand-in for the GitHub REST endpoints the API uses.
+
+Serves a deterministic synthetic repository, adds a configurable delay to every
+response, returns X-RateLimit-* headers, and counts calls per endpoint family.
+Writes (contents PUT, blobs, trees, commits, refs, pulls) succeed but do not change the repository, so
+the same patch can be committed repeatedly.
+"""
+import asyncio
+import base64
+import hashlib
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any
+
+from fastapi import FastAPI, Request, Response
+from fastapi.responses import JSONResponse
+
+from app.metrics import github_family
+
+
+def _sha(*parts: str) -> str:
+    return hashlib.sha1("/".join(parts).encode()).hexdigest()
+
+
+def module_source(i: int, lines: int) -> str:
+    body = [f'"""Synthetic module {i}."""', "", ""]
+    for j in range(lines // 4):
+        body += [f"def func_{i}_{j}(x):", f"    return x + {j}", "", ""]
+    return "\n".join(body[:lines]) + "\n"
+
+
+@dataclass
+class FakeRepo:
+    owner: str = "acme"
+    name: str = "app"
+    files: int = 200
+    lines_per_file: int = 120
+    head: str = field(default="")
+    tree_sha: str = field(default="")
+    contents: dict[str, str] = field(default_factory=dict)
+
+    def __post_init__(self) -> None:
+        for i in range(self.files):
+            self.contents[f"src/pkg{i % 10}/module_{i}.py"] = module_source(i, self.lines_per_file)
+        self.head = _sha("commit", self.owner, self.name)
+        self.tree_sha = _sha("tree", self.owner, self.name)
+
+    def tree(self) -> list[dict[str, Any]]:
+        dirs = sorted({p.rsplit("/", 1)[0] for p in self.contents} | {"src"})
+        entries = [{"path": d, "type": "tree", "sha": _sha("dir", d), "mode": "040000"} for d in dirs]
+        entries += [
+            {"path": p, "type": "blob", "sha": _sha("blob", p), "mode": "100644", "size": len(c)}
+            for p, c in sorted(self.contents.items())
+        ]
+        return entries
+
+
+def create_fake_github(repo: FakeRepo, latency_ms: float = 30.0, rate_limit: int = 5000) -> tuple[FastAPI, Counter]:
+    app = FastAPI()
+    calls: Counter = Counter()
+    state = {"remaining": rate_limit, "pr": 0}
+    blobs = {_sha("blob", p): p for p in repo.contents}
+
+    @app.middleware("http")
+    async def latency_and_headers(request: Request, call_next):
+        calls[f"{request.method} {github_family(request.url.path)}"] += 1
+        state["remaining"] = max(state["remaining"] - 1, 0)
+        if latency_ms:
+            await asyncio.sleep(latency_ms / 1000)
+        response = await call_next(request)
+        response.headers["X-RateLimit-Limit"] = str(rate_limit)
+        response.headers["X-RateLimit-Remaining"] = str(state["remaining"])
+        response.headers["X-RateLimit-Resource"] = "core"
+        return response
+
+    def _file_response(request: Request, path: str) -> Response:
+        content = repo.contents[path]
+        if "raw" in request.headers.get("accept", ""):
+            return Response(content.encode(), media_type="application/vnd.github.raw")
+        return JSONResponse({
+            "type": "file",
+            "path": path,
+            "name": path.rsplit("/", 1)[-1],
+            "sha": _sha("blob", path),
+            "size": len(content),
+            "encoding": "base64",
+            "content": base64.b64encode(content.encode()).decode(),
+        })
+
+    @app.get("/user")
+    async def user():
+        return {"id": 1, "login": "loadtest", "avatar_url": None}
+
+    @app.get("/user/repos")
+    async def user_repos():
+        return [{
+            "id": 1, "name": repo.name, "full_name": f"{repo.owner}/{repo.name}", "private": False,
+            "default_branch": "main", "owner": {"login": repo.owner},
+            "permissions": {"admin": False, "push": True, "pull": True}, "size": 1024,
+        }]
+
+    @app.get("/repos/{owner}/{name}")
+    async def get_repo(owner: str, name: str):
+        return {
+            "id": 1, "name": name, "full_name": f"{owner}/{name}", "private": False,
+            "default_branch": "main", "owner": {"login": owner},
+            "permissions": {"admin": False, "push": True, "pull": True}, "size": 1024,
+        }
+
+    @app.get("/repos/{owner}/{name}/branches")
+    async def branches(owner: str, name: str):
+        return [{"name": "main", "commit": {"sha": repo.head}}]
+
+    @app.get("/repos/{owner}/{name}/git/ref/heads/{branch:path}")
+    async def get_ref(owner: str, name: str, branch: str):
+        return {"ref": f"refs/heads/{branch}", "object": {"sha": repo.head, "type": "commit"}}
+
+    @app.post("/repos/{owner}/{name}/git/refs")
+    async def create_ref(owner: str, name: str, request: Request):
+        body = await request.json()
+        return JSONResponse({"ref": body["ref"], "object": {"sha": body["sha"]}}, status_code=201)
+
+    @app.patch("/repos/{owner}/{name}/git/refs/heads/{branch:path}")
+    async def update_ref(owner: str, name: str, branch: str, request: Request):
+        body = await request.json()
+        return {"ref": f"refs/heads/{branch}", "object": {"sha": body["sha"], "type": "commit"}}
+
+    @app.post("/repos/{owner}/{name}/git/blobs")
+    async def create_blob(owner: str, name: str, request: Request):
+        body = await request.json()
+        return JSONResponse({"sha": _sha("new-blob", body["content"])}, status_code=201)
+
+    @app.post("/repos/{owner}/{name}/git/trees")
+    async def create_tree(owner: str, name: str, request: Request):
+        body = await request.json()
+        return JSONResponse({"sha": _sha("new-tree", body["base_tree"], repr(body["tree"]))}, status_code=201)
+
+    @app.post("/repos/{owner}/{name}/git/commits")
+    async def create_commit(owner: str, name: str, request: Request):
+        body = await request.json()
+        return JSONResponse({"sha": _sha("new-commit", body["tree"], body["message"])}, status_code=201)
+
+    @app.get("/repos/{owner}/{name}/git/trees/{sha}")
+    async def tree(owner: str, name: str, sha: str):
+        return {"sha": repo.tree_sha, "tree": repo.tree(), "truncated": False}
+
+    @app.get("/repos/{owner}/{name}/git/blobs/{sha}")
+    async def blob(owner: str, name: str, sha: str, request: Request):
+        if sha not in blobs:
+            return JSONResponse({"message": "Not Found"}, status_code=404)
+        return _file_response(request, blobs[sha])
+
+    @app.get("/repos/{owner}/{name}/contents/{path:path}")
+    async def get_contents(owner: str, name: str, path: str, request: Request):
+        if path in repo.contents:
+            return _file_response(request, path)
+        prefix = path.rstrip("/") + "/" if path else ""
+        children = [p for p in repo.contents if p.startswith(prefix) and "/" not in p[len(prefix):]]
+        if not children:
+            return JSONResponse({"message": "Not Found"}, status_code=404)
+        return [{"name": p.rsplit("/", 1)[-1], "path": p, "type": "file", "sha": _sha("blob", p)} for p in children]
+
+    @app.put("/repos/{owner}/{name}/contents/{path:path}")
+    async def put_contents(owner: str, name: str, path: str, request: Request):
+        body = await request.json()
+        return {"content": {"path": path}, "commit": {"sha": _sha("commit", path, body.get("message", ""))}}
+
+    @app.get("/repos/{owner}/{name}/commits/{sha}")
+    async def commit(owner: str, name: str, sha: str):
+        files = sorted(repo.contents)[:3]
+        return {"sha": sha, "files": [{"filename": p, "status": "modified"} for p in files]}
+
+    @app.get("/repos/{owner}/{name}/compare/{spec:path}")
+    async def compare(owner: str, name: str, spec: str):
+        return {"status": "identical", "files": []}
+
+    @app.post("/repos/{owner}/{name}/pulls")
+    async def pulls(owner: str, name: str):
+        state["pr"] += 1
+        n = state["pr"]
+        return JSONResponse({"number": n, "html_url": f"https://github.com/{owner}/{name}/pull/{n}"}, status_code=201)
+
+    return app, calls
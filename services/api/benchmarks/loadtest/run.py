@@ -0,0 +1,225 @@
+"""
+End-to-end load test of the API against local GitHub and Anthropic stand-ins.
+
+    cd services/api
+    python -m benchmarks.loadtest.run [--scenarios tree,patch,chat,commit]
+        [--requests 200] [--concurrency 20] [--github-latency-ms 30]
+        [--llm-latency-ms 1500] [--files 200] [--json out.json]
+
+The fake servers run under uvicorn on local ports; the API itself runs
+in-process behind httpx's ASGI transport, with authentication replaced by a
+per-request synthetic user (X-Load-User header) so the per-user agent rate
+limit does not dominate the numbers. Per scenario it reports throughput,
+p50/p95/p99 latency, error counts and outbound calls per request.
+"""
+import argparse
+import asyncio
+import json
+import os
+import socket
+import statistics
+import threading
+import time
+from collections import Counter
+from dataclasses import dataclass, field
+from typing import Any, Callable
+
+import httpx
+import uvicorn
+
+from benchmarks.loadtest.fake_anthropic import PATCH_TARGET, create_fake_anthropic
+from benchmarks.loadtest.fake_github import FakeRepo, create_fake_github
+
+COMMIT_PATCH = "\n".join([
+    f"--- a/{PATCH_TARGET}",
+    f"+++ b/{PATCH_TARGET}",
+    "@@ -1,2 +1,3 @@",
+    ' """Synthetic module 0."""',
+    "+import sys",
+    " ",
+    "",
+])
+
+
+def _free_port() -> int:
+    with socket.socket() as s:
+        s.bind(("127.0.0.1", 0))
+        return s.getsockname()[1]
+
+
+class _Server(threading.Thread):
+    def __init__(self, app: Any, port: int) -> None:
+        super().__init__(daemon=True)
+        self.server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning", lifespan="off"))
+
+    def run(self) -> None:
+        self.server.run()
+
+    def wait_started(self) -> None:
+        while not self.server.started:
+            time.sleep(0.01)
+
+
+@dataclass
+class Result:
+    name: str
+    latencies_ms: list[float] = field(default_factory=list)
+    statuses: Counter = field(default_factory=Counter)
+    elapsed_s: float = 0.0
+    github_calls: Counter = field(default_factory=Counter)
+    llm_calls: int = 0
+
+    def percentile(self, p: float) -> float:
+        if not self.latencies_ms:
+            return 0.0
+        data = sorted(self.latencies_ms)
+        return data[min(len(data) - 1, int(round(p / 100 * (len(data) - 1))))]
+
+    def summary(self) -> dict[str, Any]:
+        n = len(self.latencies_ms)
+        return {
+            "scenario": self.name,
+            "requests": n,
+            "throughput_rps": round(n / self.elapsed_s, 2) if self.elapsed_s else 0.0,
+            "p50_ms": round(self.percentile(50), 1),
+            "p95_ms": round(self.percentile(95), 1),
+            "p99_ms": round(self.percentile(99), 1),
+            "mean_ms": round(statistics.fmean(self.latencies_ms), 1) if n else 0.0,
+            "statuses": dict(self.statuses),
+            "github_calls_per_request": round(sum(self.github_calls.values()) / n, 2) if n else 0.0,
+            "github_calls": dict(self.github_calls),
+            "llm_calls": self.llm_calls,
+        }
+
+
+def _scenarios(owner: str, repo: str) -> dict[str, Callable[[httpx.AsyncClient, int], Any]]:
+    def tree(client: httpx.AsyncClient, i: int):
+        return client.get(f"/repos/{owner}/{repo}/tree", params={"ref": "main"}, headers={"X-Load-User": str(i)})
+
+    def patch(client: httpx.AsyncClient, i: int):
+        return client.post("/agent/patch", headers={"X-Load-User": str(i)}, json={
+            "owner": owner, "repo": repo, "branch": "main",
+            "user_goal": "Import os in module_0",
+            "selected_files": [PATCH_TARGET, "src/pkg1/module_1.py"],
+            "claude_api_key": "sk-loadtest",
+        })
+
+    def chat(client: httpx.AsyncClient, i: int):
+        return client.post("/agent/chat", headers={"X-Load-User": str(i)}, json={
+            "repo": f"{owner}/{repo}", "branch": "main",
+            "message": "What does module_0 do?",
+            "history": [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "hello"}],
+            "claude_api_key": "sk-loadtest",
+        })
+
+    def commit(client: httpx.AsyncClient, i: int):
+        return client.post("/git/apply-and-commit", headers={"X-Load-User": str(i)}, json={
+            "owner": owner, "repo": repo, "branch": "main",
+            "patch": COMMIT_PATCH, "commit_message": f"loadtest {i}",
+        })
+
+    return {"tree": tree, "patch": patch, "chat": chat, "commit": commit}
+
+
+async def _run_scenario(name, make_request, app, requests: int, concurrency: int, gh_calls: Counter, llm_calls: Counter) -> Result:
+    from app.services.github import branch_sha_cache, tree_cache
+
+    # Every scenario starts cold so cache effects show up in the call counts.
+    tree_cache.clear()
+    branch_sha_cache.clear()
+    gh_before, llm_before = Counter(gh_calls), sum(llm_calls.values())
+
+    result = Result(name)
+    queue: asyncio.Queue[int] = asyncio.Queue()
+    for i in range(requests):
+        queue.put_nowait(i)
+
+    transport = httpx.ASGITransport(app=app)
+    async with httpx.AsyncClient(transport=transport, base_url="http://api", timeout=300) as client:
+        async def worker() -> None:
+            while True:
+                try:
+                    i = queue.get_nowait()
+                except asyncio.QueueEmpty:
+                    return
+                t0 = time.perf_counter()
+                try:
+                    r = await make_request(client, i)
+                    status = str(r.status_code)
+                except Exception as e:  # noqa: BLE001 - report, don't abort the run
+                    status = type(e).__name__
+                result.latencies_ms.append((time.perf_counter() - t0) * 1000)
+                result.statuses[status] += 1
+
+        started = time.perf_counter()
+        await asyncio.gather(*(worker() for _ in range(concurrency)))
+        result.elapsed_s = time.perf_counter() - started
+
+    result.github_calls = gh_calls - gh_before
+    result.llm_calls = sum(llm_calls.values()) - llm_before
+    return result
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    ap.add_argument("--scenarios", default="tree,patch,chat,commit")
+    ap.add_argument("--requests", type=int, default=200)
+    ap.add_argument("--concurrency", type=int, default=20)
+    ap.add_argument("--github-latency-ms", type=float, default=30.0)
+    ap.add_argument("--llm-latency-ms", type=float, default=1500.0)
+    ap.add_argument("--rate-limit", type=int, default=5000)
+    ap.add_argument("--files", type=int, default=200)
+    ap.add_argument("--json", dest="json_out")
+    args = ap.parse_args()
+
+    fake_repo = FakeRepo(files=args.files)
+    gh_app, gh_calls = create_fake_github(fake_repo, args.github_latency_ms, args.rate_limit)
+    llm_app, llm_calls = create_fake_anthropic(args.llm_latency_ms)
+    gh_port, llm_port = _free_port(), _free_port()
+    servers = [_Server(gh_app, gh_port), _Server(llm_app, llm_port)]
+    for s in servers:
+        s.start()
+    for s in servers:
+        s.wait_started()
+
+    # Settings are read at import time, so point the API at the fakes first.
+    os.environ["GITHUB_API_URL"] = f"http://127.0.0.1:{gh_port}"
+    os.environ["ANTHROPIC_BASE_URL"] = f"http://127.0.0.1:{llm_port}"
+    os.environ.setdefault("TOKEN_ENCRYPTION_KEY", "")
+
+    from fastapi import Request
+
+    from app.deps import get_current_user
+    from app.main import app
+    from app.models import User
+
+    async def load_user(request: Request) -> User:
+        uid = int(request.headers.get("X-Load-User", "0"))
+        return User(id=uid, github_id=uid, login=f"load{uid}", encrypted_token="gh-loadtest-token")
+
+    app.dependency_overrides[get_current_user] = load_user
+
+    scenarios = _scenarios(fake_repo.owner, fake_repo.name)
+    results = []
+    for name in [n.strip() for n in args.scenarios.split(",") if n.strip()]:
+        res = asyncio.run(_run_scenario(name, scenarios[name], app, args.requests, args.concurrency, gh_calls, llm_calls))
+        results.append(res.summary())
+
+    print(f"{'scenario':<8} {'reqs':>5} {'rps':>8} {'p50':>8} {'p95':>8} {'p99':>8} {'gh/req':>7} {'llm':>5}  statuses")
+    for r in results:
+        print(
+            f"{r['scenario']:<8} {r['requests']:>5} {r['throughput_rps']:>8.2f} {r['p50_ms']:>8.1f} {r['p95_ms']:>8.1f} "
+            f"{r['p99_ms']:>8.1f} {r['github_calls_per_request']:>7.2f} {r['llm_calls']:>5}  {r['statuses']}"
+        )
+    for r in results:
+        print(f"  {r['scenario']} outbound: {r['github_calls']}")
+    if args.json_out:
+        with open(args.json_out, "w") as f:
+            json.dump(results, f, indent=2)
+
+    for s in servers:
+        s.server.should_exit = True
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,145 @@
+"""
+Deterministic generator of realistic unified diffs for benchmarking and testing
+app.patch_utils / app.services.patch_validator.
+
+generate_case() returns the original files, the patch text and the expected
+post-apply contents, so callers can check correctness as well as time it.
+"""
+import random
+from dataclasses import dataclass, field
+
+CONTEXT = 3
+
+
+@dataclass
+class DiffCase:
+    name: str
+    originals: dict[str, str] = field(default_factory=dict)
+    expected: dict[str, str] = field(default_factory=dict)
+    patch: str = ""
+
+    @property
+    def changed_lines(self) -> int:
+        return sum(1 for line in self.patch.split("\n") if line[:1] in ("+", "-") and line[:3] not in ("+++", "---"))
+
+
+def _source_lines(rng: random.Random, n: int, file_id: int) -> list[str]:
+    lines = []
+    for i in range(n):
+        kind = rng.random()
+        if kind < 0.1:
+            lines.append("")
+        elif kind < 0.2:
+            lines.append(f"def handler_{file_id}_{i}(request, *args, **kwargs):")
+        elif kind < 0.3:
+            lines.append(f"    # step {i}: normalize inputs for file {file_id}")
+        else:
+            lines.append(f"    value_{i} = compute(value_{i - 1 if i else 0}, {rng.randint(0, 9999)})")
+    return lines
+
+
+def _make_file(
+    rng: random.Random,
+    path: str,
+    file_id: int,
+    n_lines: int,
+    n_hunks: int,
+    eol: str,
+    trailing_newline: bool,
+    edit_at_eof: bool,
+) -> tuple[str, str, str]:
+    """Return (original, expected, diff text) for one file."""
+    lines = _source_lines(rng, n_lines, file_id)
+    if eol != "\n":
+        lines = [line + eol[:-1] for line in lines]  # split("\n") keeps the "\r"
+    elems = lines + ([""] if trailing_newline else [])
+    original = "\n".join(elems)
+
+    # Pick hunk anchors far enough apart that hunk contexts never overlap.
+    span = 2 * CONTEXT + 4
+    slots = max((n_lines - 2 * CONTEXT) // span, 1)
+    picks = sorted(rng.sample(range(slots), min(n_hunks, slots)))
+    anchors = [CONTEXT + p * span for p in picks]
+    if edit_at_eof:
+        eof = n_lines - 2
+        anchors = [a for a in anchors if a + span <= eof] + [eof]
+
+    new_elems: list[str] = []
+    diff = [f"--- a/{path}", f"+++ b/{path}"]
+    pos = 0
+    offset = 0
+    for n, a in enumerate(anchors):
+        kind = rng.choice(("replace", "insert", "delete"))
+        remove = 0 if kind == "insert" else rng.randint(1, 2)
+        remove = min(remove, n_lines - a)
+        adds = [] if kind == "delete" else [
+            f"    patched_{file_id}_{n}_{k} = True{eol[:-1]}" for k in range(rng.randint(1, 3))
+        ]
+        ctx_start = max(a - CONTEXT, 0)
+        ctx_end = min(a + remove + CONTEXT, n_lines)
+        new_elems.extend(elems[pos:ctx_start])
+
+        body: list[str] = []
+        for i in range(ctx_start, a):
+            body.append(" " + elems[i])
+        for i in range(a, a + remove):
+            body.append("-" + elems[i])
+        body.extend("+" + s for s in adds)
+        for i in range(a + remove, ctx_end):
+            body.append(" " + elems[i])
+
+        old_count = ctx_end - ctx_start
+        new_count = old_count - remove + len(adds)
+        diff.append(f"@@ -{ctx_start + 1},{old_count} +{ctx_start + 1 + offset},{new_count} @@")
+        diff.extend(body)
+        if ctx_end == n_lines and not trailing_newline:
+            diff.append("\\ No newline at end of file")
+
+        new_elems.extend(elems[ctx_start:a])
+        new_elems.extend(adds)
+        new_elems.extend(elems[a + remove:ctx_end])
+        pos = ctx_end
+        offset += len(adds) - remove
+
+    new_elems.extend(elems[pos:])
+    return original, "\n".join(new_elems), "\n".join(diff)
+
+
+def generate_case(
+    name: str,
+    files: int = 1,
+    hunks: int = 3,
+    lines: int = 200,
+    crlf: bool = False,
+    trailing_newline: bool = True,
+    edit_at_eof: bool = False,
+    seed: int = 0,
+) -> DiffCase:
+    rng = random.Random(f"{name}:{seed}")
+    case = DiffCase(name)
+    diffs = []
+    for f in range(files):
+        path = f"src/pkg{f % 7}/module_{f}.py"
+        original, expected, diff = _make_file(
+            rng, path, f, lines, hunks, "\r\n" if crlf else "\n", trailing_newline, edit_at_eof
+        )
+        case.originals[path] = original
+        case.expected[path] = expected
+        diffs.append(diff)
+    case.patch = "\n".join(diffs) + "\n"
+    return case
+
+
+SCENARIOS: dict[str, dict] = {
+    "small": dict(files=1, hunks=3, lines=200),
+    "many_files": dict(files=50, hunks=5, lines=300),
+    "many_hunks": dict(files=1, hunks=200, lines=5000),
+    "large_file": dict(files=1, hunks=5, lines=200_000),
+    "huge_file": dict(files=1, hunks=1, lines=1_250_000),  # ~50 MB, one-hunk edit
+    "crlf": dict(files=10, hunks=5, lines=400, crlf=True),
+    "no_newline_eof": dict(files=10, hunks=3, lines=300, trailing_newline=False, edit_at_eof=True),
+}
+
+
+def scenario(name: str, seed: int = 0) -> DiffCase:
+    return generate_case(name, seed=seed, **SCENARIOS[name])
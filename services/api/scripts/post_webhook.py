@@ -0,0 +1,40 @@
+"""
+Post a recorded GitHub webhook payload to a local API with a valid signature.
+
+    python scripts/post_webhook.py push tests/fixtures/webhooks/push.json \
+        --url http://localhost:8000/webhooks/github --secret "$GITHUB_WEBHOOK_SECRET"
+"""
+import argparse
+import hashlib
+import hmac
+import uuid
+from pathlib import Path
+
+import httpx
+
+
+def main() -> None:
+    ap = argparse.ArgumentParser()
+    ap.add_argument("event", help="X-GitHub-Event value: push, create, delete, ping")
+    ap.add_argument("payload", type=Path)
+    ap.add_argument("--url", default="http://localhost:8000/webhooks/github")
+    ap.add_argument("--secret", required=True)
+    args = ap.parse_args()
+
+    body = args.payload.read_bytes()
+    signature = hmac.new(args.secret.encode(), body, hashlib.sha256).hexdigest()
+    r = httpx.post(
+        args.url,
+        content=body,
+        headers={
+            "Content-Type": "application/json",
+            "X-GitHub-Event": args.event,
+            "X-GitHub-Delivery": str(uuid.uuid4()),
+            "X-Hub-Signature-256": f"sha256={signature}",
+        },
+    )
+    print(r.status_code, r.text)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,87 @@
+"""In-process stand-in for AsyncAnthropic (messages.create and messages.stream) for agent tests."""
+import asyncio
+from types import SimpleNamespace
+from typing import Callable
+
+
+class FakeAsyncAnthropic:
+    """
+    respond(kwargs) -> (delay seconds, text) decides each call's answer. Streams
+    yield the text in CHUNK-sized deltas, one output token each; `chunks_sent` and `cancelled` record
+    how much was generated and which calls were cut short.
+    """
+
+    CHUNK = 16
+    respond: Callable[[dict], tuple[float, str]] = staticmethod(lambda kwargs: (0.0, ""))
+    calls: list[dict] = []
+    cancelled: list[dict] = []
+    chunks_sent = 0
+
+    def __init__(self, **kwargs):
+        self.messages = SimpleNamespace(create=self._create, stream=self._stream)
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        pass
+
+    @classmethod
+    def reset(cls, respond: Callable[[dict], tuple[float, str]]) -> None:
+        cls.respond = staticmethod(respond)
+        cls.calls = []
+        cls.cancelled = []
+        cls.chunks_sent = 0
+
+    @staticmethod
+    def _message(text: str) -> SimpleNamespace:
+        return SimpleNamespace(content=[SimpleNamespace(text=text)], usage=None)
+
+    async def _create(self, **kwargs):
+        FakeAsyncAnthropic.calls.append(kwargs)
+        delay, text = FakeAsyncAnthropic.respond(kwargs)
+        try:
+            await asyncio.sleep(delay)
+        except asyncio.CancelledError:
+            FakeAsyncAnthropic.cancelled.append(kwargs)
+            raise
+        return self._message(text)
+
+    def _stream(self, **kwargs):
+        FakeAsyncAnthropic.calls.append(kwargs)
+        return _FakeStream(kwargs, *FakeAsyncAnthropic.respond(kwargs))
+
+
+class _FakeStream:
+    """Yields message_start, one text delta per CHUNK, then message_delta with the output usage."""
+
+    def __init__(self, kwargs: dict, delay: float, text: str) -> None:
+        self.kwargs, self.delay, self.text = kwargs, delay, text
+        self.events = self._events()
+
+    async def _events(self):
+        try:
+            await asyncio.sleep(self.delay)
+        except asyncio.CancelledError:
+            FakeAsyncAnthropic.cancelled.append(self.kwargs)
+            raise
+        prompt = self.kwargs["messages"][-1]["content"]
+        yield SimpleNamespace(type="message_start", message=SimpleNamespace(
+            usage=SimpleNamespace(input_tokens=len(prompt), output_tokens=1)))
+        chunks = 0
+        for i in range(0, len(self.text), FakeAsyncAnthropic.CHUNK):
+            FakeAsyncAnthropic.chunks_sent += 1
+            chunks += 1
+            delta = SimpleNamespace(type="text_delta", text=self.text[i:i + FakeAsyncAnthropic.CHUNK])
+            yield SimpleNamespace(type="content_block_delta", index=0, delta=delta)
+        yield SimpleNamespace(type="message_delta", usage=SimpleNamespace(output_tokens=chunks))
+        yield SimpleNamespace(type="message_stop")
+
+    def __aiter__(self):
+        return self.events
+
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        await self.events.aclose()
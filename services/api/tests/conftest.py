@@ -0,0 +1,56 @@
+"""Shared fixtures: a mocked GitHub transport and routers served to a signed-in user."""
+from typing import Callable
+from unittest.mock import patch
+
+import httpx
+import pytest
+from fastapi import APIRouter, FastAPI
+from fastapi.testclient import TestClient
+
+from app.deps import get_current_user
+from app.models import User
+
+# The real class, for clients created while httpx.AsyncClient is patched.
+_AsyncClient = httpx.AsyncClient
+
+
+@pytest.fixture
+def github() -> Callable:
+    """
+    github(handler) sends every GitHub API call to handler (sync or async, as
+    for httpx.MockTransport) for the rest of the test; call it again to swap
+    handlers.
+    """
+    current: list[Callable] = []
+
+    def use(handler: Callable) -> None:
+        current[:] = [handler]
+
+    def handle(request: httpx.Request):
+        return current[0](request)
+
+    def client(*args, **kwargs) -> httpx.AsyncClient:
+        return _AsyncClient(transport=httpx.MockTransport(handle))
+
+    with patch("httpx.AsyncClient", client):
+        yield use
+
+
+def _make_app(*routers: APIRouter) -> FastAPI:
+    app = FastAPI()
+    for router in routers:
+        app.include_router(router)
+    app.dependency_overrides[get_current_user] = lambda: User(id=7, github_id=7, login="u", encrypted_token="tok")
+    return app
+
+
+@pytest.fixture
+def api() -> Callable[..., TestClient]:
+    """api(*routers) is a TestClient for an app serving routers as user 7."""
+    return lambda *routers: TestClient(_make_app(*routers))
+
+
+@pytest.fixture
+def async_api() -> Callable[..., httpx.AsyncClient]:
+    """async_api(*routers) is an httpx.AsyncClient (use with async with) for an app serving routers as user 7."""
+    return lambda *routers: _AsyncClient(transport=httpx.ASGITransport(app=_make_app(*routers)), base_url="http://t")
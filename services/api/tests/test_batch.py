@@ -0,0 +1,122 @@
+"""Batch commit: per-patch validation, conflict detection and merged apply (mocked GitHub)."""
+import base64
+import json
+
+import httpx
+import pytest
+
+from app.patch_utils import apply_patch, parse_unified_diff
+from app.services.batch import PatchOutcome, apply_edits, commit_batch, find_conflicts, hunk_edits
+from app.services.github import blob_text_cache, branch_sha_cache, tree_cache
+
+ORIGINAL = "\n".join(f"line {i}" for i in range(1, 41)) + "\n"
+
+
+def _edit(line: int, new: str, context: int = 3) -> str:
+    """Patch replacing `line N` with new, with context lines around it."""
+    lo, hi = max(1, line - context), min(40, line + context)
+    body = [f" line {i}" for i in range(lo, line)] + [f"-line {line}", f"+{new}"]
+    body += [f" line {i}" for i in range(line + 1, hi + 1)]
+    n = hi - lo + 1
+    return f"--- a/f.txt\n+++ b/f.txt\n@@ -{lo},{n} +{lo},{n} @@\n" + "\n".join(body) + "\n"
+
+
+def _outcomes(*patches: str) -> list[PatchOutcome]:
+    return [PatchOutcome(i, file_patches=parse_unified_diff(p)) for i, p in enumerate(patches)]
+
+
+def test_overlapping_context_merges_but_adjacent_changes_conflict():
+    outcomes = _outcomes(_edit(10, "TEN"), _edit(14, "FOURTEEN"), _edit(11, "ELEVEN"), _edit(14, "again"))
+    find_conflicts(outcomes)
+    assert [o.status for o in outcomes] == ["ok", "ok", "conflict", "conflict"]
+    assert outcomes[2].message == "Conflicts with patch 0 in f.txt"
+
+    merged = apply_edits(ORIGINAL, [hunk_edits(o.file_patches[0]) for o in outcomes[:2]])
+    sequential = apply_patch(apply_patch(ORIGINAL, outcomes[0].file_patches[0]), outcomes[1].file_patches[0])
+    assert merged == sequential
+    assert "TEN" in merged and "FOURTEEN" in merged
+
+
+def test_new_or_deleted_files_are_exclusive():
+    new = "--- /dev/null\n+++ b/f.txt\n@@ -0,0 +1 @@\n+x\n"
+    delete = "--- a/g.txt\n+++ /dev/null\n@@ -1 +0,0 @@\n-y\n"
+    edit_g = "--- a/g.txt\n+++ b/g.txt\n@@ -5 +5 @@\n-a\n+b\n"
+    outcomes = _outcomes(new, _edit(30, "x"), delete, edit_g)
+    find_conflicts(outcomes)
+    assert [o.status for o in outcomes] == ["ok", "conflict", "ok", "conflict"]
+
+
+class FakeGitHub:
+    def __init__(self, ref_status: int = 200, original: bytes = ORIGINAL.encode()):
+        self.ref_status = ref_status
+        self.original = original
+        self.bodies: dict[str, dict] = {}
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path, method = request.url.path, request.method
+        if request.content:
+            self.bodies[f"{method} {path}"] = json.loads(request.content)
+        if path == "/repos/o/r/git/ref/heads/main":
+            return httpx.Response(200, json={"object": {"sha": "c1"}})
+        if path == "/repos/o/r/git/trees/c1":
+            return httpx.Response(200, json={"sha": "t1", "tree": [{"path": "f.txt", "type": "blob", "sha": "s1", "mode": "100644"}]})
+        if path == "/repos/o/r/git/blobs/s1":
+            return httpx.Response(200, content=self.original)
+        if path == "/repos/o/r/git/blobs":
+            return httpx.Response(201, json={"sha": "blob-merged"})
+        if path == "/repos/o/r/git/trees":
+            return httpx.Response(201, json={"sha": "t2"})
+        if path == "/repos/o/r/git/commits":
+            return httpx.Response(201, json={"sha": "c2"})
+        if method == "PATCH" and path == "/repos/o/r/git/refs/heads/main":
+            return httpx.Response(self.ref_status, json={})
+        raise AssertionError(f"unexpected {method} {path}")
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    blob_text_cache.clear()
+    branch_sha_cache.clear()
+    tree_cache.clear()
+
+
+async def test_commit_batch_reports_each_patch_and_commits_once(github):
+    gh = FakeGitHub()
+    patches = [
+        _edit(10, "TEN"),
+        _edit(20, "TWENTY"),
+        _edit(11, "ELEVEN"),  # conflicts with patch 0
+        "--- a/.env\n+++ b/.env\n@@ -1 +1 @@\n-a\n+b\n",  # blocked path
+        _edit(30, "THIRTY").replace(" line 28", " line twenty-eight"),  # stale context
+    ]
+    github(gh.handler)
+    result = await commit_batch("t", "o", "r", "main", "batch", patches)
+    assert [(r["index"], r["status"]) for r in result["results"]] == [
+        (0, "applied"), (1, "applied"), (2, "conflict"), (3, "invalid"), (4, "does_not_apply"),
+    ]
+    assert result["commit_sha"] == "c2" and result["base_sha"] == "c1"
+    content = base64.b64decode(gh.bodies["POST /repos/o/r/git/blobs"]["content"]).decode()
+    assert "TEN" in content and "TWENTY" in content and "ELEVEN" not in content
+    assert gh.bodies["POST /repos/o/r/git/commits"]["parents"] == ["c1"]
+    assert gh.bodies["PATCH /repos/o/r/git/refs/heads/main"] == {"sha": "c2", "force": False}
+
+
+async def test_dry_run_and_moved_branch(github):
+    gh = FakeGitHub(ref_status=422)
+    github(gh.handler)
+    dry = await commit_batch("t", "o", "r", "main", "m", [_edit(10, "TEN")], dry_run=True)
+    assert dry["commit_sha"] is None and dry["results"][0]["status"] == "ok"
+    assert "POST /repos/o/r/git/blobs" not in gh.bodies
+    with pytest.raises(httpx.HTTPStatusError):
+        await commit_batch("t", "o", "r", "main", "m", [_edit(10, "TEN")])
+    assert len(branch_sha_cache) == 0
+
+
+async def test_non_utf8_original_does_not_apply(github):
+    gh = FakeGitHub(original=ORIGINAL.encode().replace(b"line 40", b"l\xefne 40"))
+    github(gh.handler)
+    result = await commit_batch("t", "o", "r", "main", "m", [_edit(10, "TEN")])
+    assert result["commit_sha"] is None
+    assert result["results"][0]["status"] == "does_not_apply"
+    assert result["results"][0]["message"] == "f.txt is not UTF-8 text and cannot be patched"
+    assert "POST /repos/o/r/git/blobs" not in gh.bodies
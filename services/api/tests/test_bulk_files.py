@@ -0,0 +1,59 @@
+"""Bulk file reads: NDJSON records in completion order, per-file errors, bounded concurrency."""
+import asyncio
+import json
+
+import httpx
+import pytest
+
+from app.config import get_settings
+from app.routers import repos
+
+DELAYS = {"slow.py": 0.08, "a.py": 0.02, "b.py": 0.02, "c.py": 0.02}
+
+
+class FakeGitHub:
+    def __init__(self):
+        self.active = 0
+        self.max_active = 0
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        name = request.url.path.rsplit("/", 1)[-1]
+        self.active += 1
+        self.max_active = max(self.max_active, self.active)
+        try:
+            await asyncio.sleep(DELAYS.get(name, 0.01))
+        finally:
+            self.active -= 1
+        if name == "missing.py":
+            return httpx.Response(404, json={"message": "Not Found"})
+        if name == "timeout.py":
+            raise httpx.ReadTimeout("timed out", request=request)
+        return httpx.Response(200, content=f"# {name}\n".encode())
+
+
+@pytest.fixture
+def post(monkeypatch, github, api):
+    def post(paths, concurrency=8):
+        monkeypatch.setattr(get_settings(), "bulk_file_concurrency", concurrency)
+        gh = FakeGitHub()
+        github(gh.handler)
+        r = api(repos.router).post("/repos/o/r/files", json={"paths": paths, "ref": "main"})
+        assert r.status_code == 200
+        return [json.loads(line) for line in r.text.splitlines()], gh
+    return post
+
+
+def test_records_stream_in_completion_order_with_per_file_errors(post):
+    records, _ = post(["slow.py", "missing.py", "timeout.py", "a.py", "slow.py"])
+    assert records[-1] == {"path": "slow.py", "content": "# slow.py\n"}  # duplicates dropped, slowest last
+    by_path = {r["path"]: r for r in records}
+    assert len(records) == 4
+    assert by_path["missing.py"]["status"] == 404
+    assert by_path["timeout.py"]["status"] == 502
+    assert by_path["a.py"]["content"] == "# a.py\n"
+
+
+def test_concurrency_is_bounded(post):
+    records, gh = post([f"f{i}.py" for i in range(10)], concurrency=3)
+    assert len(records) == 10 and all("content" in r for r in records)
+    assert gh.max_active == 3
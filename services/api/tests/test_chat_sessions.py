@@ -0,0 +1,91 @@
+"""Chat sessions: context snapshot, delta turns, refetch only when the branch moves."""
+import asyncio
+
+import httpx
+
+from app.routers import agent
+from app.services.github import branch_sha_cache, tree_cache
+from app.services.sessions import MemorySessionStore
+
+class FakeGitHub:
+    def __init__(self):
+        self.head = "c1"
+        self.blob = {"c1": "b1", "c2": "b2"}
+        self.content_fetches = 0
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if "/git/ref/heads/" in path:
+            return httpx.Response(200, json={"object": {"sha": self.head}})
+        if "/git/trees/" in path:
+            commit = path.rsplit("/", 1)[-1]
+            return httpx.Response(200, json={"sha": f"t-{commit}", "tree": [
+                {"path": "a.py", "type": "blob", "sha": self.blob[commit]},
+                {"path": "b.py", "type": "blob", "sha": "same"},
+            ]})
+        self.content_fetches += 1
+        return httpx.Response(200, content=f"{path}@{request.url.params.get('ref')}".encode())
+
+
+def test_session_turns_reuse_context(monkeypatch, github, api):
+    gh = FakeGitHub()
+    store = MemorySessionStore(ttl=60)
+    monkeypatch.setattr(agent, "get_session_store", lambda: store)
+    seen = []
+
+    async def fake_chat(**kwargs):
+        seen.append(kwargs)
+        return {"content": "ok", "patch": None, "files_changed": [], "history_state": None}
+
+    monkeypatch.setattr(agent, "chat", fake_chat)
+    tree_cache.clear()
+    branch_sha_cache.clear()
+
+    client = api(agent.router)
+    github(gh.handler)
+    r = client.post("/agent/chat/sessions", json={"repo": "o/r", "branch": "main", "selected_files": ["a.py", "b.py"]})
+    sid = r.json()["session_id"]
+    assert r.json()["files"] == ["a.py", "b.py"]
+    assert gh.content_fetches == 2
+
+    r = client.post(f"/agent/chat/sessions/{sid}/messages", json={"message": "hi", "claude_api_key": "k"})
+    assert r.json()["context_refreshed"] is False
+    assert gh.content_fetches == 2
+
+    gh.head = "c2"
+    branch_sha_cache.clear()
+    r = client.post(f"/agent/chat/sessions/{sid}/messages", json={"message": "again", "claude_api_key": "k"})
+    assert r.json()["context_refreshed"] is True
+    assert gh.content_fetches == 3  # only a.py changed
+
+    assert seen[1]["history"] == [{"role": "user", "content": "hi"}, {"role": "assistant", "content": "ok"}]
+    assert seen[1]["selected_files"]["a.py"].endswith("@c2")
+    assert client.get(f"/agent/chat/sessions/{sid}").json()["turns"] == 2
+
+
+async def test_concurrent_turns_keep_every_message(monkeypatch, github, async_api):
+    gh = FakeGitHub()
+    store = MemorySessionStore(ttl=60)
+    monkeypatch.setattr(agent, "get_session_store", lambda: store)
+    monkeypatch.setattr(agent, "_agent_requests", {7: []})
+
+    async def slow_chat(**kwargs):
+        await asyncio.sleep(0.01)
+        return {"content": f"re: {kwargs['message']}", "patch": None, "files_changed": [], "history_state": None}
+
+    monkeypatch.setattr(agent, "chat", slow_chat)
+    tree_cache.clear()
+    branch_sha_cache.clear()
+
+    github(gh.handler)
+    async with async_api(agent.router) as client:
+        r = await client.post("/agent/chat/sessions", json={"repo": "o/r", "branch": "main", "selected_files": ["a.py"]})
+        sid = r.json()["session_id"]
+        replies = await asyncio.gather(*(
+            client.post(f"/agent/chat/sessions/{sid}/messages", json={"message": m, "claude_api_key": "k"})
+            for m in ("one", "two", "three")
+        ))
+    assert [r.status_code for r in replies] == [200, 200, 200]
+    history = (await store.get(sid))["history"]
+    assert sorted(m["content"] for m in history) == ["one", "re: one", "re: three", "re: two", "three", "two"]
+    assert store._locks == {}
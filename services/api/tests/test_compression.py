@@ -0,0 +1,52 @@
+"""Compression middleware negotiation."""
+from fastapi import FastAPI
+from fastapi.responses import ORJSONResponse, Response
+from fastapi.testclient import TestClient
+
+from app.compression import CompressionMiddleware
+
+app = FastAPI(default_response_class=ORJSONResponse)
+app.add_middleware(CompressionMiddleware, minimum_size=100)
+
+
+@app.get("/big")
+async def big():
+    return {"tree": [{"path": f"src/file_{i}.py", "type": "blob"} for i in range(200)]}
+
+
+@app.get("/small")
+async def small():
+    return {"status": "ok"}
+
+
+@app.get("/partial")
+async def partial():
+    return Response(b"x" * 500, status_code=206, headers={"Content-Range": "bytes 0-499/1000"})
+
+
+client = TestClient(app)
+
+
+def test_prefers_brotli():
+    r = client.get("/big", headers={"Accept-Encoding": "gzip, br"})
+    assert r.headers["content-encoding"] == "br"
+    assert len(r.json()["tree"]) == 200
+
+
+def test_gzip_when_brotli_refused():
+    r = client.get("/big", headers={"Accept-Encoding": "gzip, br;q=0"})
+    assert r.headers["content-encoding"] == "gzip"
+    assert r.json()["tree"][0]["path"] == "src/file_0.py"
+
+
+def test_small_and_unaccepted_bodies_pass_through():
+    assert "content-encoding" not in client.get("/small", headers={"Accept-Encoding": "gzip"}).headers
+    assert "content-encoding" not in client.get("/big", headers={"Accept-Encoding": "identity"}).headers
+
+
+def test_partial_responses_are_not_compressed():
+    r = client.get("/partial", headers={"Accept-Encoding": "gzip"})
+    assert r.status_code == 206
+    assert "content-encoding" not in r.headers
+    assert r.headers["content-range"] == "bytes 0-499/1000"
+    assert r.content == b"x" * 500
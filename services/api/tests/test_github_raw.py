@@ -0,0 +1,98 @@
+"""Raw-media file reads (mocked GitHub transport)."""
+import gzip
+
+import httpx
+import pytest
+
+from app.routers import repos
+from app.services.github import read_file_lines
+
+BODY = "".join(f"line {i}\n" for i in range(1, 1001)).encode()
+
+
+class _Chunks(httpx.AsyncByteStream):
+    def __init__(self, data: bytes, size: int):
+        self.data, self.size, self.sent = data, size, 0
+
+    async def __aiter__(self):
+        for i in range(0, len(self.data), self.size):
+            self.sent = i + self.size
+            yield self.data[i:i + self.size]
+
+
+async def test_line_range_stops_early(github):
+    stream = _Chunks(BODY, 64)
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        assert request.headers["Accept"] == "application/vnd.github.raw"
+        return httpx.Response(200, stream=stream)
+
+    github(handler)
+    text, has_more = await read_file_lines("t", "o", "r", "big.txt", "main", start_line=10, end_line=12)
+    assert text == "line 10\nline 11\nline 12"
+    assert has_more
+    assert stream.sent < len(BODY)
+
+
+async def test_too_large_falls_back_to_blob_api(github):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/repos/o/r/contents/docs/big.txt":
+            return httpx.Response(403, json={"message": "too_large"})
+        if request.url.path == "/repos/o/r/contents/docs":
+            return httpx.Response(200, json=[{"name": "big.txt", "type": "file", "sha": "abc"}])
+        assert request.url.path == "/repos/o/r/git/blobs/abc"
+        return httpx.Response(200, content=b"a\nb\n")
+
+    github(handler)
+    text, has_more = await read_file_lines("t", "o", "r", "docs/big.txt", "main")
+    assert text == "a\nb\n"
+    assert not has_more
+
+
+async def test_other_403s_do_not_fall_back(github):
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        calls.append(request.url.path)
+        return httpx.Response(403, json={"message": "API rate limit exceeded"}, headers={"X-RateLimit-Remaining": "0"})
+
+    github(handler)
+    with pytest.raises(httpx.HTTPStatusError) as exc:
+        await read_file_lines("t", "o", "r", "docs/big.txt", "main")
+    assert exc.value.response.status_code == 403
+    assert calls == ["/repos/o/r/contents/docs/big.txt"]
+
+
+def test_raw_endpoint_only_forwards_lengths_of_the_bytes_sent(github, api):
+    seen = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        seen.append(request.headers.get("Accept-Encoding"))
+        if request.headers.get("Accept-Encoding") == "identity":
+            return httpx.Response(200, content=BODY, headers={"Content-Length": str(len(BODY))})
+        # Compressed: Content-Length counts gzip bytes, not the decoded body.
+        return httpx.Response(200, content=gzip.compress(BODY), headers={"Content-Encoding": "gzip"})
+
+    client = api(repos.router)
+    github(handler)
+    r = client.get("/repos/o/r/raw", params={"path": "a.txt"})
+    assert (r.status_code, r.content) == (200, BODY)
+    assert "content-length" not in r.headers or int(r.headers["content-length"]) == len(BODY)
+
+    # Upstream ignores the Range; the identity body has a usable length, so we slice it.
+    r = client.get("/repos/o/r/raw", params={"path": "a.txt"}, headers={"Range": "bytes=8-15"})
+    assert r.status_code == 206
+    assert r.content == BODY[8:16]
+    assert r.headers["content-range"] == f"bytes 8-15/{len(BODY)}"
+    assert r.headers["content-length"] == "8"
+    assert seen[1] == "identity"
+
+
+def test_range_without_known_length_is_a_plain_200(github, api):
+    def handler(request: httpx.Request) -> httpx.Response:
+        return httpx.Response(200, content=gzip.compress(BODY), headers={"Content-Encoding": "gzip"})
+
+    github(handler)
+    r = api(repos.router).get("/repos/o/r/raw", params={"path": "a.txt"}, headers={"Range": "bytes=-10"})
+    assert (r.status_code, r.content) == (200, BODY)
+    assert "content-range" not in r.headers
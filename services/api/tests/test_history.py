@@ -0,0 +1,78 @@
+from app.services.history import OMITTED, TRUNCATED, _digest, compact_history, estimate_tokens
+
+PATCH_REPLY = "## PLAN\n- edit\n\n## PATCH\n--- a/app.py\n+++ b/app.py\n@@ -1 +1 @@\n-x = 1\n+x = 2\n" + "+pad\n" * 200 + "\n## SUMMARY\n- app.py"
+
+
+def _conversation(turns: int) -> list[dict[str, str]]:
+    history = []
+    for i in range(turns):
+        history.append({"role": "user", "content": f"question {i} " + "detail " * 50})
+        history.append({"role": "assistant", "content": PATCH_REPLY})
+    return history
+
+
+def test_short_history_is_untouched_except_superseded_patches():
+    history = _conversation(2)
+    recent, summary, state = compact_history(history, token_ceiling=100_000)
+    assert summary == ""
+    assert len(recent) == 4
+    assert "superseded patch omitted; files: app.py" in recent[1]["content"]
+    assert recent[3]["content"] == PATCH_REPLY
+    assert state["covered"] == 0
+
+
+def _tokens(recent: list[dict[str, str]], summary: str) -> int:
+    return sum(estimate_tokens(m["content"]) for m in recent) + (estimate_tokens(summary) if summary else 0)
+
+
+def test_long_history_folds_into_summary_under_ceiling():
+    history = _conversation(30)
+    recent, summary, state = compact_history(history, token_ceiling=2000, keep_recent=4)
+    assert state["covered"] == 38
+    assert len(recent) == 22
+    assert recent[0]["content"].startswith("question 19 ")
+    assert recent[-1]["content"] == PATCH_REPLY
+    lines = summary.split("\n")
+    # The summary outgrew its budget (a quarter of the ceiling): the oldest lines were dropped.
+    assert lines[0] == OMITTED
+    assert "question 0 " not in summary
+    assert lines[-2].startswith("- user: question 18 ")
+    assert lines[-1] == "- assistant: ## PLAN - edit ## SUMMARY - app.py [proposed patch: app.py]"
+    assert _tokens(recent, summary) <= 2000
+
+
+def test_state_is_reused_incrementally():
+    history = _conversation(30)
+    _, summary, state = compact_history(history, token_ceiling=2000)
+    history += [{"role": "user", "content": "next"}, {"role": "assistant", "content": "ok"}]
+    recent, summary2, state2 = compact_history(history, token_ceiling=2000, state=state)
+    assert (state2["covered"], summary2) == (38, summary)
+    assert len(recent) == 24
+    assert recent[-2:] == [{"role": "user", "content": "next"}, {"role": "assistant", "content": "ok"}]
+
+    # A different conversation with the same length does not reuse the summary.
+    other = _conversation(31)
+    _, _, state3 = compact_history(other, token_ceiling=2000, state={**state, "digest": "nope"})
+    assert state3 == compact_history(other, token_ceiling=2000)[2]
+    assert state3["digest"] == _digest(other[:state3["covered"]])
+
+
+def test_recent_turns_over_the_ceiling_are_truncated_oldest_first():
+    history = [
+        {"role": "user", "content": "first " * 2000},
+        {"role": "assistant", "content": "answer " * 2000},
+        {"role": "user", "content": "latest question"},
+    ]
+    recent, summary, state = compact_history(history, token_ceiling=5000, keep_recent=4)
+    assert (summary, state["covered"]) == ("", 0)
+    assert _tokens(recent, "") == 5000
+    assert recent[0]["content"].startswith("first first")
+    assert recent[0]["content"].endswith(TRUNCATED)
+    assert recent[1:] == history[1:]  # newer turns are cut only once older ones are exhausted
+    assert history[0]["content"] == "first " * 2000
+
+    recent, _, _ = compact_history(history, token_ceiling=500, keep_recent=4)
+    assert recent[0]["content"] == ""
+    assert recent[1]["content"].endswith(TRUNCATED)
+    assert recent[2]["content"] == "latest question"
+    assert _tokens(recent, "") <= 500
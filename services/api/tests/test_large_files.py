@@ -0,0 +1,136 @@
+"""Large-file patching: slice-copying apply engine and blob-API reads/uploads."""
+import base64
+import json
+import random
+
+import httpx
+import pytest
+
+from app import patch_utils
+from app.config import get_settings
+from app.patch_utils import FilePatch, Hunk, LineIndex, PatchApplyError, _apply_lines, apply_patch, parse_unified_diff
+from app.services.github import apply_patch_and_commit, blob_text_cache, branch_sha_cache, get_file_text, tree_cache
+
+def test_line_index_offsets():
+    text = "a\n\nbcd\ne"
+    index = LineIndex(text)
+    assert [index.offset(i) for i in range(5)] == [0, 2, 3, 7, None]
+    assert index.line(2) == "bcd" and index.line(3) == "e" and index.line(0) == "a"
+    assert LineIndex("").offset(0) == 0 and LineIndex("").offset(1) is None
+
+
+@pytest.mark.parametrize("chunk,step", [(1 << 16, 64), (4, 1), (1, 1)])
+def test_sliced_engine_matches_line_engine(monkeypatch, chunk, step):
+    monkeypatch.setattr(patch_utils, "LARGE_FILE_CHARS", 0)
+    monkeypatch.setattr(LineIndex, "CHUNK", chunk)
+    monkeypatch.setattr(LineIndex, "STEP", step)
+    rng = random.Random(chunk)
+
+    def run(fn, original, fp):
+        try:
+            return fn(original, fp)
+        except PatchApplyError as e:
+            return str(e), e.hunk, e.line
+
+    for _ in range(3000):
+        lines = [rng.choice(["a", "b", "", "cc"]) for _ in range(rng.randint(0, 20))]
+        original = "\n".join(lines) + rng.choice(["", "\n"])
+        split = original.split("\n")
+        hunks, start = [], 1
+        for _ in range(rng.randint(0, 3)):
+            start = max(1, start + rng.randint(-1, 6))
+            body, pos = [], start - 1
+            for _ in range(rng.randint(0, 4)):
+                kind = rng.choice(" -+")
+                if kind == "+":
+                    body.append(("+", rng.choice(["x", ""])))
+                else:
+                    body.append((kind, split[pos] if pos < len(split) and rng.random() < 0.9 else "zz"))
+                    pos += 1
+            hunks.append(Hunk(start, 0, start, 0, body))
+            start = pos + 1
+        fp = FilePatch("f", hunks)
+        assert run(apply_patch, original, fp) == run(_apply_lines, original, fp), (original, hunks)
+
+
+def test_one_hunk_edit_to_large_file():
+    original = "".join(f"line {i}\n" for i in range(1, 400_001))  # ~5 MB
+    fp = parse_unified_diff("--- a/f\n+++ b/f\n@@ -200000,2 +200000,2 @@\n line 200000\n-line 200001\n+LINE\n")[0]
+    result = apply_patch(original, fp)
+    assert len(original) >= patch_utils.LARGE_FILE_CHARS
+    assert result == original.replace("\nline 200001\n", "\nLINE\n")
+
+    broken = FilePatch("f", [Hunk(400_000, 2, 400_000, 1, [(" ", "line 400000"), ("-", "line 400001")])])
+    with pytest.raises(PatchApplyError) as exc:
+        apply_patch(original, broken)
+    assert exc.value.line == 400_001
+
+
+@pytest.fixture
+def _inline(monkeypatch):
+    monkeypatch.setattr(get_settings(), "offload_workers", 0)
+    branch_sha_cache.clear()
+    tree_cache.clear()
+
+
+async def test_apply_and_commit_reads_big_files_by_blob(_inline, github):
+    big = "x" * 100 + "\n" + "".join(f"row {i}\n" for i in range(200_000))  # past the contents API's 1 MB limit
+    bodies: dict[str, dict] = {}
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path, method = request.url.path, request.method
+        if request.content:
+            bodies[f"{method} {path}"] = json.loads(request.content)
+        if path == "/repos/o/r/git/ref/heads/main":
+            return httpx.Response(200, json={"object": {"sha": "c1"}})
+        if path == "/repos/o/r/git/trees/c1":
+            return httpx.Response(200, json={"sha": "t1", "tree": [{"path": "big.csv", "type": "blob", "sha": "b1", "mode": "100644"}]})
+        if method == "GET" and path == "/repos/o/r/git/blobs/b1":
+            assert request.headers["Accept"] == "application/vnd.github.raw"
+            return httpx.Response(200, content=big.encode())
+        if method == "POST" and path == "/repos/o/r/git/blobs":
+            return httpx.Response(201, json={"sha": "b2"})
+        if path == "/repos/o/r/git/trees":
+            return httpx.Response(201, json={"sha": "t2"})
+        if path == "/repos/o/r/git/commits":
+            return httpx.Response(201, json={"sha": "c2"})
+        if method == "PATCH" and path == "/repos/o/r/git/refs/heads/main":
+            return httpx.Response(200, json={})
+        raise AssertionError(f"unexpected {method} {path}")
+
+    diff = "--- a/big.csv\n+++ b/big.csv\n@@ -1,2 +1,2 @@\n-" + "x" * 100 + "\n+header\n row 0\n"
+    github(handler)
+    assert await apply_patch_and_commit("t", "o", "r", "main", diff, "edit") == "c2"
+    uploaded = base64.b64decode(bodies["POST /repos/o/r/git/blobs"]["content"]).decode()
+    assert uploaded == big.replace("x" * 100, "header", 1)
+    assert bodies["POST /repos/o/r/git/trees"] == {
+        "base_tree": "t1", "tree": [{"path": "big.csv", "mode": "100644", "type": "blob", "sha": "b2"}],
+    }
+    assert bodies["POST /repos/o/r/git/commits"]["parents"] == ["c1"]
+    assert bodies["PATCH /repos/o/r/git/refs/heads/main"] == {"sha": "c2", "force": False}
+
+
+async def test_non_utf8_original_is_not_committed(_inline, github):
+    latin1 = "caf\xe9 = 1\nx = 2\n".encode("latin-1")
+    posted = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path, method = request.url.path, request.method
+        if path == "/repos/o/r/git/ref/heads/main":
+            return httpx.Response(200, json={"object": {"sha": "c1"}})
+        if path == "/repos/o/r/git/trees/c1":
+            return httpx.Response(200, json={"sha": "t1", "tree": [{"path": "a.py", "type": "blob", "sha": "b1", "mode": "100644"}]})
+        if method == "GET" and path == "/repos/o/r/git/blobs/b1":
+            return httpx.Response(200, content=latin1)
+        posted.append(f"{method} {path}")
+        return httpx.Response(201, json={"sha": "x"})
+
+    diff = "--- a/a.py\n+++ b/a.py\n@@ -2 +2 @@\n-x = 2\n+x = 3\n"
+    blob_text_cache.clear()
+    github(handler)
+    with pytest.raises(ValueError, match="a.py is not UTF-8"):
+        await apply_patch_and_commit("t", "o", "r", "main", diff, "edit")
+    # Display reads still get replacement characters, but nothing lossy is cached.
+    assert await get_file_text("t", "o", "r", "a.py", "c1", "b1") == "caf\ufffd = 1\nx = 2\n"
+    assert posted == []
+    assert len(blob_text_cache) == 0
@@ -0,0 +1,62 @@
+"""Request metrics: labelled by route template and status; /metrics itself is not recorded."""
+from fastapi import APIRouter, FastAPI, HTTPException, Response
+from fastapi.testclient import TestClient
+from prometheus_client import REGISTRY
+
+from app.metrics import MetricsMiddleware, github_family, render_metrics
+
+router = APIRouter(tags=["items"])
+
+
+@router.get("/items/{item_id}")
+async def get_item(item_id: int):
+    if item_id == 0:
+        raise HTTPException(status_code=404, detail="nope")
+    return {"id": item_id}
+
+
+app = FastAPI()
+app.add_middleware(MetricsMiddleware)
+app.include_router(router)
+
+
+@app.get("/metrics")
+async def metrics():
+    body, content_type = render_metrics()
+    return Response(content=body, media_type=content_type)
+
+
+client = TestClient(app)
+
+
+def _count(route: str, status: str, router: str = "items") -> float:
+    labels = {"router": router, "route": route, "method": "GET", "status": status}
+    return REGISTRY.get_sample_value("zappr_http_request_duration_seconds_count", labels) or 0.0
+
+
+def test_requests_are_labelled_by_route_template_and_status():
+    before = (_count("/items/{item_id}", "200"), _count("/items/{item_id}", "404"), _count("/metrics", "200", "app"))
+    client.get("/items/1")
+    client.get("/items/2")
+    client.get("/items/0")
+    client.get("/metrics")
+
+    assert _count("/items/{item_id}", "200") - before[0] == 2
+    assert _count("/items/{item_id}", "404") - before[1] == 1
+    assert _count("/metrics", "200", "app") == before[2] == 0
+    assert 'route="/items/1"' not in client.get("/metrics").text
+
+
+def test_unmatched_paths_share_one_label():
+    before = _count("unmatched", "404", "app")
+    client.get("/nowhere/1")
+    client.get("/nowhere/2")
+    assert _count("unmatched", "404", "app") - before == 2
+
+
+def test_github_family():
+    assert github_family("/repos/o/r") == "repos.get"
+    assert github_family("/repos/o/r/git/ref/heads/main") == "git.refs"
+    assert github_family("/repos/o/r/git/blobs/abc") == "git.blobs"
+    assert github_family("/repos/o/r/contents/a/b.py") == "contents"
+    assert github_family("/user/repos") == "user.repos"
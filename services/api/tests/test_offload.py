@@ -0,0 +1,63 @@
+"""Process-pool offload of large patch jobs."""
+import asyncio
+import time
+
+import pytest
+
+from app import offload
+from app.config import get_settings
+from app.patch_utils import PatchApplyError, parse_unified_diff
+
+ORIGINAL = "\n".join(f"line {i}" for i in range(1, 2001)) + "\n"
+PATCH = "--- a/f.txt\n+++ b/f.txt\n@@ -10,3 +10,3 @@\n line 10\n-line 11\n+LINE 11\n line 12\n"
+
+
+@pytest.fixture
+def pool(monkeypatch):
+    monkeypatch.setattr(get_settings(), "offload_workers", 1)
+    monkeypatch.setattr(get_settings(), "offload_min_bytes", 1000)
+    yield
+    offload.shutdown_pool()
+
+
+async def test_small_jobs_stay_inline(pool):
+    valid, _, changes = await offload.validate_patch_async(PATCH)
+    assert valid and changes[0]["additions"] == 1
+    assert offload._pool is None
+
+
+async def test_large_jobs_run_in_pool_with_same_results(pool):
+    fp = parse_unified_diff(PATCH)[0]
+    result = await offload.apply_patch_async(ORIGINAL, fp)
+    assert offload._pool is not None
+    assert "LINE 11" in result and "line 11\n" not in result
+    assert await offload.check_patch_applies_async(PATCH, {"f.txt": ORIGINAL}) is None
+
+    broken = ORIGINAL.replace("line 11\n", "changed\n")
+    with pytest.raises(PatchApplyError) as exc:
+        await offload.apply_patch_async(broken, fp)
+    assert (exc.value.path, exc.value.hunk, exc.value.line) == ("f.txt", 0, 11)
+
+
+async def test_full_queue_is_rejected(pool, monkeypatch):
+    monkeypatch.setattr(get_settings(), "offload_max_pending", 1)
+    fp = parse_unified_diff(PATCH)[0]
+    first = asyncio.create_task(offload.apply_patch_async(ORIGINAL, fp))
+    await asyncio.sleep(0)
+    with pytest.raises(offload.OffloadBusy):
+        await offload.apply_patch_async(ORIGINAL, fp)
+    assert "LINE 11" in await first
+
+
+async def test_cancelled_caller_keeps_its_slot_until_the_job_ends(pool):
+    job = asyncio.create_task(offload.run_cpu(time.sleep, 0.5, size=1000, op="test"))
+    await asyncio.sleep(0.2)
+    job.cancel()
+    with pytest.raises(asyncio.CancelledError):
+        await job
+    assert offload._pending == 1  # still running in the worker
+    for _ in range(100):
+        if not offload._pending:
+            break
+        await asyncio.sleep(0.05)
+    assert offload._pending == 0
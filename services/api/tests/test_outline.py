@@ -0,0 +1,147 @@
+"""Symbol outlines per language, blob-SHA caching, and the full-text/outline split for patch prompts."""
+import pytest
+
+from app.services import outline as outline_mod
+from app.services.agent import build_context_prompt, split_context
+from app.services.outline import git_blob_sha, outline
+
+PY = '''"""Module."""
+import os
+
+MAX_ITEMS = 10
+helper = 3
+
+
+@dataclass
+class Cart(Base, metaclass=Meta):
+    def add(self, item: str, qty: int = 1) -> None:
+        self.items.append((item, qty))
+
+    @property
+    def total(self):
+        return sum(q for _, q in self.items)
+
+
+async def checkout(cart: Cart, *, dry_run=False) -> dict[str, int]:
+    return {}
+'''
+
+TS = """import x from "y";
+
+export default class Store extends Base<T> {
+  private items: Item[] = [];
+  async load(id: string): Promise<Item> {
+    if (id) {
+      return fetch(id);
+    }
+  }
+}
+
+export function total(items: Item[]): number {
+  return 0;
+}
+export const add = async (a: number, b: number) => a + b;
+export interface Item { id: string }
+type Id = string;
+"""
+
+GO = """package main
+
+type Server struct {
+	addr string
+}
+
+func (s *Server) Start(ctx context.Context) error {
+	return nil
+}
+
+func main() {
+}
+"""
+
+JAVA = """package a;
+
+public class Greeter implements Runnable {
+    private final String name;
+
+    public Greeter(String name) {
+        this.name = name;
+    }
+
+    @Override
+    public void run() {
+        if (name != null) { System.out.println(name); }
+    }
+
+    static <T> List<T> copy(List<T> in) { return in; }
+}
+"""
+
+
+def test_python_outline():
+    text = outline("app/cart.py", PY)
+    assert text.split("\n") == [
+        "4: MAX_ITEMS = ...",
+        "8: @dataclass",
+        "9: class Cart(Base, metaclass=Meta):",
+        "10:     def add(self, item: str, qty: int=1) -> None: ...",
+        "13:     @property",
+        "14:     def total(self): ...",
+        "18: async def checkout(cart: Cart, *, dry_run=False) -> dict[str, int]: ...",
+        "(20 lines)",
+    ]
+
+
+def test_regex_outlines():
+    ts = outline("web/store.ts", TS)
+    assert "3: export default class Store extends Base<T>" in ts
+    assert "5:   async load(id: string): Promise<Item>" in ts
+    assert "12: export function total(items: Item[]): number" in ts
+    assert "15: export const add = async (a: number, b: number) =>" in ts
+    assert "16: export interface Item" in ts and "17: type Id =" in ts
+    assert "if (" not in ts
+
+    go = outline("main.go", GO)
+    assert "3: type Server struct" in go and "7: func (s *Server) Start(ctx context.Context) error" in go
+
+    java = outline("src/Greeter.java", JAVA)
+    assert "3: public class Greeter implements Runnable" in java
+    assert "6:     public Greeter(String name)" not in java  # constructors have no return type
+    assert "11:     public void run()" in java
+    assert "15:     static <T> List<T> copy(List<T> in)" in java
+
+
+def test_unsupported_or_unparsable_files_have_no_outline():
+    assert outline("README.md", "# hi") is None
+    assert outline("broken.py", "def (:\n") is None
+
+
+def test_cached_by_blob_sha(monkeypatch):
+    assert git_blob_sha("hello\n") == "ce013625030ba8dba906f756967f9e9ca394464a"
+    calls = []
+    real = outline_mod._python_outline
+    monkeypatch.setattr(outline_mod, "_python_outline", lambda text: calls.append(1) or real(text))
+    src = PY + "\n# cache test\n"
+    first = outline("a.py", src)
+    assert outline("moved/b.py", src) == first
+    assert len(calls) == 1
+    # A tree SHA skips hashing; the extension is part of the key.
+    monkeypatch.setattr(outline_mod, "git_blob_sha", lambda text: pytest.fail("rehashed"))
+    assert outline("c.py", src, "sha-c") == first and len(calls) == 2
+    assert outline("c.py", src, "sha-c") == first and len(calls) == 2
+    assert outline("c.ts", src, "sha-c") != first
+
+
+def test_split_context_keeps_edit_targets_in_full():
+    files = {"app/cart.py": PY, "app/big.py": PY * 50, "README.md": "# docs " * 5000}
+    full, outlines = split_context(files, "Add a discount to cart totals", full_text_chars=1000)
+    assert list(full) == ["app/cart.py", "README.md"]  # named in goal; README has no outline
+    assert list(outlines) == ["app/big.py"]
+
+    full, outlines = split_context(files, "anything", edit_files=["app/big.py"])
+    assert list(full) == ["app/big.py", "README.md"] and list(outlines) == ["app/cart.py"]
+    assert split_context(files, "anything", edit_files=["app/big.py"], blob_shas={"app/cart.py": "sha"})[1] == outlines
+
+    prompt = build_context_prompt("", full, "goal", outlines=outlines)
+    outlined_section = prompt.split("### app/cart.py (outline)")[1]
+    assert "class Cart" in outlined_section and "self.items.append" not in outlined_section
@@ -0,0 +1,76 @@
+"""/agent/patch result cache: same tree, blobs, goal and model reuse the earlier response."""
+import httpx
+
+from app.config import get_settings
+from app.routers import agent
+from app.services.github import branch_sha_cache, tree_cache
+
+class FakeGitHub:
+    def __init__(self):
+        self.head = "c1"
+        self.blob = {"c1": "b1", "c2": "b2", "c3": "b1"}  # c3 changes only an unselected file
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        if "/git/ref/heads/" in path:
+            return httpx.Response(200, json={"object": {"sha": self.head}})
+        if "/git/trees/" in path:
+            commit = path.rsplit("/", 1)[-1]
+            return httpx.Response(200, json={"sha": f"t-{commit}", "tree": [
+                {"path": "a.py", "type": "blob", "sha": self.blob[commit]},
+                {"path": "other.py", "type": "blob", "sha": commit},
+            ]})
+        return httpx.Response(200, content=b"x = 1\n")
+
+
+def test_repeated_request_is_served_from_cache(monkeypatch, github, api):
+    gh = FakeGitHub()
+    calls = []
+
+    async def fake_generate_patch(**kwargs):
+        calls.append(kwargs)
+        valid = kwargs["user_goal"] != "break it"
+        return {"plan": ["p"], "patch": f"patch {len(calls)}", "summary": "s", "files_changed": ["a.py"], "valid": valid}
+
+    monkeypatch.setattr(agent, "generate_patch", fake_generate_patch)
+    monkeypatch.setattr(agent, "_agent_requests", {7: []})
+    monkeypatch.setattr(agent, "RATE_LIMIT", 20)
+    agent._patch_results.clear()
+    tree_cache.clear()
+    branch_sha_cache.clear()
+
+    client = api(agent.router)
+    body = {"owner": "o", "repo": "r", "branch": "main", "user_goal": "add  logging", "selected_files": ["a.py"],
+            "claude_api_key": "k"}
+
+    def post(**changes):
+        r = client.post("/agent/patch", json={**body, **changes})
+        assert r.status_code == 200
+        return r.json()
+
+    github(gh.handler)
+    first = post()
+    assert (first["patch"], first["cached"]) == ("patch 1", False)
+
+    again = post(user_goal=" add logging\n")
+    assert again == {**first, "cached": True}
+    assert len(calls) == 1
+
+    assert post(no_cache=True)["patch"] == "patch 2"
+    assert post()["patch"] == "patch 2"  # the fresh result replaced the old one
+    # Keyed by the model routing picked: this small request goes to the fast model anyway.
+    assert post(model="fast")["cached"] is True
+    assert post(model="default")["cached"] is False
+    monkeypatch.setattr(get_settings(), "llm_fast_model", "another-fast-model")
+    assert post()["cached"] is False  # routing config changed
+
+    gh.head = "c3"
+    branch_sha_cache.clear()
+    assert post()["cached"] is False  # new tree
+    gh.head = "c2"
+    branch_sha_cache.clear()
+    assert post()["patch"] == "patch 6"  # selected file changed
+
+    post(user_goal="break it")
+    assert post(user_goal="break it")["cached"] is False  # invalid results are not kept
+    assert len(calls) == 8
@@ -0,0 +1,40 @@
+"""Multi-candidate patch generation: first candidate that dry-run applies wins, the rest are cancelled."""
+from app.services import agent
+from tests.anthropic_fakes import FakeAsyncAnthropic
+
+ORIGINAL = "a = 1\nb = 2\n"
+GOOD = "## PLAN\n- fix\n\n## PATCH\n--- a/m.py\n+++ b/m.py\n@@ -1,2 +1,2 @@\n a = 1\n-b = 2\n+b = 3\n\n## SUMMARY\n- m.py"
+BAD = GOOD.replace(" a = 1", " a = 100")  # context that is not in the file
+
+
+async def test_returns_first_candidate_that_applies(monkeypatch):
+    monkeypatch.setattr(agent, "AsyncAnthropic", FakeAsyncAnthropic)
+    temps = agent.CANDIDATE_TEMPERATURES
+    script = {temps[0]: (0.0, BAD), temps[1]: (0.02, GOOD), temps[2]: (5, GOOD)}
+    FakeAsyncAnthropic.reset(lambda kwargs: script[kwargs.get("temperature")])
+
+    result = await agent.generate_patch("k", "", {"m.py": ORIGINAL}, "goal", candidates=3)
+
+    assert result["valid"] is True
+    assert result["candidates_tried"] == 2
+    assert "+b = 3" in result["patch"]
+    assert [c["temperature"] for c in FakeAsyncAnthropic.cancelled] == [temps[2]]
+
+
+async def test_falls_back_to_first_candidate_and_fetches_untouched_files(monkeypatch):
+    monkeypatch.setattr(agent, "AsyncAnthropic", FakeAsyncAnthropic)
+    temps = agent.CANDIDATE_TEMPERATURES
+    script = {temps[0]: (0.0, BAD), temps[1]: (0.01, BAD), None: (0.0, "no hunks")}  # None: repair call
+    FakeAsyncAnthropic.reset(lambda kwargs: script[kwargs.get("temperature")])
+    fetched = []
+
+    async def load_file(path):
+        fetched.append(path)
+        return ORIGINAL
+
+    result = await agent.generate_patch("k", "", {}, "goal", candidates=2, load_file=load_file)
+
+    assert result["valid"] is False
+    assert result["candidates_tried"] == 2
+    assert "context mismatch" in result["validation_error"]
+    assert fetched == ["m.py"]  # fetched once, reused for the second candidate
@@ -0,0 +1,23 @@
+"""parse/apply/validate on generated multi-file, multi-hunk, CRLF and no-EOL diffs."""
+import pytest
+
+from app.patch_utils import apply_patch, parse_unified_diff
+from app.services.patch_validator import validate_patch
+from benchmarks.patchgen import generate_case
+
+
+@pytest.mark.parametrize("kwargs", [
+    dict(files=5, hunks=4, lines=120),
+    dict(files=1, hunks=40, lines=1000),
+    dict(files=3, hunks=3, lines=80, crlf=True),
+    dict(files=3, hunks=2, lines=60, trailing_newline=False, edit_at_eof=True),
+])
+def test_generated_patches_apply(kwargs):
+    case = generate_case("test", **kwargs)
+    patches = parse_unified_diff(case.patch)
+    assert sorted(fp.path for fp in patches) == sorted(case.originals)
+    for fp in patches:
+        assert apply_patch(case.originals[fp.path], fp) == case.expected[fp.path]
+    valid, msg, changes = validate_patch(case.patch, max_files=100, max_lines=10_000)
+    assert valid, msg
+    assert sum(c["additions"] + c["deletions"] for c in changes) == case.changed_lines
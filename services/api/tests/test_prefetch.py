@@ -0,0 +1,134 @@
+"""Speculative prefetch on branch listing: ranking, cache warming and the per-user budget."""
+import asyncio
+from unittest.mock import patch
+
+import httpx
+import pytest
+
+from app.config import get_settings
+from app.routers import repos
+from app.services import prefetch
+from app.services.github import (
+    blob_text_cache,
+    branch_sha_cache,
+    repo_meta_cache,
+    token_scope,
+    tree_cache,
+)
+
+TREE = [
+    {"path": "src", "type": "tree", "sha": "d1"},
+    {"path": "src/deep/util.py", "type": "blob", "sha": "b-util", "size": 10},
+    {"path": "src/app.py", "type": "blob", "sha": "b-app", "size": 10},
+    {"path": "README.md", "type": "blob", "sha": "b-readme", "size": 10},
+    {"path": "logo.png", "type": "blob", "sha": "b-logo", "size": 10},
+    {"path": "node_modules/x/index.js", "type": "blob", "sha": "b-nm", "size": 10},
+    {"path": "data/huge.py", "type": "blob", "sha": "b-huge", "size": 10**7},
+    {"path": "src/views.py", "type": "blob", "sha": "b-views", "size": 10},
+    {"path": "yarn.lock", "type": "blob", "sha": "b-lock", "size": 10},
+]
+
+
+def test_rank_files_prefers_recent_then_changed_then_type():
+    ranked = prefetch.rank_files(TREE, ["src/views.py", "gone.py"], ["yarn.lock", "src/deep/util.py"], 10, 1000)
+    assert [e["path"] for e in ranked] == ["src/views.py", "src/deep/util.py", "README.md", "src/app.py"]
+    assert [e["path"] for e in prefetch.rank_files(TREE, [], [], 1, 1000)] == ["README.md"]
+
+
+class FakeGitHub:
+    def __init__(self):
+        self.calls: list[str] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.calls.append(path)
+        if path == "/repos/o/r":
+            return httpx.Response(200, json={"default_branch": "main", "permissions": {"push": True}})
+        if path == "/repos/o/r/branches":
+            return httpx.Response(200, json=[{"name": "main", "commit": {"sha": "c1"}}, {"name": "dev", "commit": {"sha": "c0"}}])
+        if path == "/repos/o/r/git/trees/c1":
+            return httpx.Response(200, json={"sha": "t1", "tree": TREE})
+        if path == "/repos/o/r/commits/c1":
+            return httpx.Response(200, json={"files": [{"filename": "src/deep/util.py", "status": "modified"}]})
+        if path.startswith("/repos/o/r/git/blobs/"):
+            return httpx.Response(200, content=path.rsplit("/", 1)[-1].encode())
+        raise AssertionError(f"unexpected {request.method} {path}")
+
+
+@pytest.fixture
+async def client(async_api):
+    for cache in (
+        blob_text_cache, branch_sha_cache, repo_meta_cache, tree_cache,
+        prefetch._buckets, prefetch._commit_files, prefetch._recent_files,
+    ):
+        cache.clear()
+    async with async_api(repos.router) as c:
+        yield c
+
+
+async def _get(client, url, **params):
+    """Request, then wait for the prefetch it started (responses do not wait for it)."""
+    r = await client.get(url, params=params)
+    await asyncio.gather(*prefetch._prefetch_tasks)
+    return r
+
+
+async def test_branch_listing_warms_default_branch(client, github):
+    gh = FakeGitHub()
+    github(gh.handler)
+    r = await _get(client, "/repos/o/r/branches")
+    assert r.status_code == 200
+    assert gh.calls == [
+        "/repos/o/r/branches",
+        "/repos/o/r",
+        "/repos/o/r/git/trees/c1",  # head came from the branch listing
+        "/repos/o/r/commits/c1",
+        "/repos/o/r/git/blobs/b-util",
+        "/repos/o/r/git/blobs/b-readme",
+        "/repos/o/r/git/blobs/b-app",
+        "/repos/o/r/git/blobs/b-views",
+    ]
+    # What /agent/patch reads next is already warm: branch head, tree and files.
+    assert blob_text_cache.get(("o", "r", "b-app", token_scope("tok"))) == "b-app"
+    del gh.calls[:]
+    await _get(client, "/repos/o/r/tree", branch="main")
+    assert gh.calls == []
+
+
+async def test_response_does_not_wait_for_prefetch(client, github):
+    gh, release = FakeGitHub(), asyncio.Event()
+    handler = gh.handler
+
+    async def slow_handler(request):
+        if "/git/trees/" in request.url.path:
+            await release.wait()
+        return handler(request)
+
+    github(slow_handler)
+    r = await client.get("/repos/o/r/branches")
+    assert r.status_code == 200
+    assert len(prefetch._prefetch_tasks) == 1
+    release.set()
+    await asyncio.gather(*prefetch._prefetch_tasks)
+    assert "/repos/o/r/git/blobs/b-app" in gh.calls
+
+
+async def test_budget_caps_upstream_calls(client, monkeypatch, github):
+    monkeypatch.setattr(get_settings(), "prefetch_budget_per_minute", 3)
+    gh = FakeGitHub()
+    github(gh.handler)
+    await _get(client, "/repos/o/r/branches")
+    assert gh.calls[2:] == ["/repos/o/r/git/trees/c1", "/repos/o/r/commits/c1", "/repos/o/r/git/blobs/b-util"]
+
+    del gh.calls[:]
+    prefetch.remember_files(7, "o", "r", ["src/views.py"])
+    await _get(client, "/repos/o/r/branches")
+    assert gh.calls == ["/repos/o/r/branches"]  # bucket empty: nothing speculative
+
+
+async def test_unexpected_errors_are_contained(client, github):
+    gh = FakeGitHub()
+    github(gh.handler)
+    with patch.object(prefetch, "rank_files", side_effect=KeyError("size")):
+        assert await prefetch.prefetch(7, "tok", "o", "r") == 0
+    assert prefetch._running == set()
@@ -0,0 +1,87 @@
+"""Hunk-level repair: relocate drifted hunks, send only failing hunks to the model, splice fixes back."""
+import pytest
+
+from app.patch_utils import PatchApplyError, apply_patch, parse_unified_diff
+from app.services import agent
+from app.services.patch_validator import check_patch_applies
+from app.services.repair import REPAIR_SYSTEM, parse_repaired_hunks, repair_patch
+from tests.anthropic_fakes import FakeAsyncAnthropic
+
+ORIGINALS = {
+    "a.py": "\n".join(f"a{i}" for i in range(1, 31)) + "\n",
+    "b.py": "x = 1\ny = 2\nz = 3\n",
+}
+PATCH = """--- a/a.py
++++ b/a.py
+@@ -2,3 +2,3 @@
+ a2
+-a3
++A3
+ a4
+@@ -16,3 +16,3 @@
+ a20
+-a21
++A21
+ a22
+--- a/b.py
++++ b/b.py
+@@ -1,2 +1,2 @@
+ x = 1
+-y = 20
++y = 3
+"""
+FIXED_B = "### HUNK 1\n@@ -1,2 +1,2 @@\n x = 1\n-y = 2\n+y = 3\n"
+
+
+def test_apply_error_reports_hunk():
+    fp = parse_unified_diff(PATCH)[0]
+    with pytest.raises(PatchApplyError) as exc:
+        apply_patch(ORIGINALS["a.py"], fp)
+    assert (exc.value.path, exc.value.hunk, exc.value.line) == ("a.py", 1, 16)
+    assert isinstance(exc.value, ValueError)
+
+
+async def test_repair_relocates_and_fixes_only_failing_hunks():
+    prompts = []
+
+    async def ask_model(system, prompt):
+        prompts.append(prompt)
+        return FIXED_B
+
+    patch, calls, remaining = await repair_patch(PATCH, ORIGINALS, ask_model, max_attempts=2)
+
+    assert calls == 1 and remaining == []
+    # The drifted a.py hunk was relocated locally; only the b.py hunk went to the model.
+    assert "HUNK 1 (b.py)" in prompts[0] and "a.py" not in prompts[0]
+    assert check_patch_applies(patch, ORIGINALS) is None
+    assert "@@ -20,3 +20,3 @@" in patch
+
+
+async def test_repair_gives_up_after_max_attempts():
+    async def ask_model(system, prompt):
+        return "### HUNK 1\n@@ -1,2 +1,2 @@\n x = 1\n-y = 99\n+y = 3\n"
+
+    _, calls, remaining = await repair_patch(PATCH, ORIGINALS, ask_model, max_attempts=2)
+    assert calls == 2
+    assert remaining == ["b.py hunk @@ -1,2 @@"]
+
+
+def test_parse_repaired_hunks_ignores_fences():
+    hunks = parse_repaired_hunks("Here you go:\n```diff\n" + FIXED_B + "```\n")
+    assert list(hunks) == [1]
+    assert hunks[1].lines[1] == ("-", "y = 2")
+
+
+async def test_generate_patch_repairs_before_returning(monkeypatch):
+    reply = "## PLAN\n- x\n\n## PATCH\n" + PATCH.split("--- a/b.py")[0] + "\n## SUMMARY\n- a.py"
+    FakeAsyncAnthropic.reset(lambda kwargs: (0.0, reply))
+    monkeypatch.setattr(agent, "AsyncAnthropic", FakeAsyncAnthropic)
+
+    async def load_file(path):
+        return ORIGINALS[path]
+
+    result = await agent.generate_patch("k", "", {}, "goal", load_file=load_file)
+
+    assert result["valid"] is True
+    assert result["repair_calls"] == 0  # relocation alone fixed the drifted hunk
+    assert [c["system"] == REPAIR_SYSTEM for c in FakeAsyncAnthropic.calls] == [False]
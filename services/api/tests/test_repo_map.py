@@ -0,0 +1,52 @@
+"""Hierarchical repo map: collapsed summaries, focus/goal expansion, token budget, per-SHA caching."""
+from app.services import repo_map
+from app.services.history import estimate_tokens
+from app.services.repo_map import build_repo_map
+
+
+def _tree(sha="t1"):
+    paths = ["README.md", "setup.py"]
+    for pkg in ("billing", "auth", "search", "reports"):
+        for sub in range(6):
+            paths += [f"src/{pkg}/mod{sub}/file_{i}.py" for i in range(15)]
+            paths += [f"src/{pkg}/mod{sub}/data_{i}.json" for i in range(5)]
+    paths += [f"tests/fixtures/case_{i}.json" for i in range(300)]
+    paths += [f"vendor/lib{i}/index.js" for i in range(200)]
+    return {"sha": sha, "tree": [{"path": p, "type": "blob", "sha": "x"} for p in paths] + [
+        {"path": "src", "type": "tree", "sha": "y"},
+    ]}
+
+
+def test_map_respects_budget_and_expands_toward_focus_and_goal():
+    tree = _tree()
+    text = build_repo_map(tree, focus=["src/auth/mod3/file_7.py"], goal="Fix invoice rounding in billing", token_budget=600)
+    lines = text.split("\n")
+
+    assert sum(estimate_tokens(line) for line in lines) <= 600
+    assert lines[0].startswith(f"{len(tree['tree']) - 1} files")
+    # Path to the selected file is expanded down to the file itself.
+    assert "src/" in lines and "  auth/" in lines and "    mod3/" in lines
+    assert "      file_7.py" in lines
+    # The goal mentions billing, so it is expanded ahead of unrelated packages.
+    assert "  billing/" in lines
+    # Whatever does not fit stays collapsed into count/extension summaries.
+    assert "  search/ (120 files: 90 .py, 30 .json)" in lines
+    assert "vendor/ (200 files: 200 .js)" in lines
+
+
+def test_large_directories_are_truncated_keeping_focus_files():
+    text = build_repo_map(_tree("t2"), focus=["tests/fixtures/case_299.json"], token_budget=5000)
+    assert "    case_299.json" in text
+    assert f"    ... {300 - repo_map.DIR_FILE_LIMIT} more files" in text
+
+
+def test_index_and_map_are_cached_per_tree_sha(monkeypatch):
+    calls = []
+    real = repo_map.build_index
+    monkeypatch.setattr(repo_map, "build_index", lambda entries: calls.append(1) or real(entries))
+
+    tree = _tree("t3")
+    first = build_repo_map(tree, goal="search ranking")
+    assert build_repo_map(tree, goal="search ranking") is first
+    build_repo_map(tree, goal="reports export")
+    assert len(calls) == 1
@@ -0,0 +1,78 @@
+"""Repo metadata cache: seeding from list_repos, ETag revalidation, push checks (mocked GitHub)."""
+import httpx
+import pytest
+from fastapi import HTTPException
+
+from app.config import get_settings
+from app.deps import require_push
+from app.routers import repos
+from app.services.github import get_default_branch, list_repos, repo_meta_cache
+
+class FakeGitHub:
+    def __init__(self):
+        self.calls: list[tuple[str, str | None]] = []
+
+    def handler(self, request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        self.calls.append((path, request.headers.get("If-None-Match")))
+        if path == "/user/repos":
+            return httpx.Response(200, json=[
+                {"id": 1, "name": "r", "full_name": "o/r", "private": True, "default_branch": "trunk",
+                 "owner": {"login": "o"}, "permissions": {"push": False, "pull": True}, "size": 12},
+            ])
+        if path == "/repos/o/other":
+            if request.headers.get("If-None-Match") == '"v1"':
+                return httpx.Response(304)
+            return httpx.Response(200, json={"default_branch": "dev", "permissions": {"push": True}}, headers={"ETag": '"v1"'})
+        if path == "/repos/o/missing":
+            return httpx.Response(404, json={"message": "Not Found"})
+        if path == "/repos/o/down":
+            return httpx.Response(503)
+        raise AssertionError(f"unexpected {path}")
+
+
+@pytest.fixture(autouse=True)
+def _clear():
+    repo_meta_cache.clear()
+
+
+async def test_list_repos_seeds_metadata(github):
+    gh = FakeGitHub()
+    github(gh.handler)
+    await list_repos("t")
+    assert await get_default_branch("t", "o", "r") == "trunk"
+    with pytest.raises(HTTPException) as exc:
+        await require_push("t", "o", "r")
+    assert exc.value.status_code == 403
+    assert gh.calls == [("/user/repos", None)]
+
+
+async def test_stale_entry_is_revalidated_with_etag(monkeypatch, github):
+    gh = FakeGitHub()
+    github(gh.handler)
+    assert await get_default_branch("t", "o", "other") == "dev"
+    assert await get_default_branch("t", "o", "other") == "dev"
+    assert len(gh.calls) == 1
+    monkeypatch.setattr(get_settings(), "repo_meta_fresh_seconds", 0)
+    assert await get_default_branch("t", "o", "other") == "dev"
+    await require_push("t", "o", "other")
+    assert gh.calls[1:] == [("/repos/o/other", '"v1"')] * 2
+
+
+def test_write_to_read_only_repo_is_rejected_without_github_call(github, api):
+    gh = FakeGitHub()
+    client = api(repos.router)
+    github(gh.handler)
+    client.get("/repos")
+    r = client.post("/repos/o/r/branches", json={"name": "feat", "from_ref": "HEAD"})
+    assert r.status_code == 403
+    assert [p for p, _ in gh.calls] == ["/user/repos"]
+
+
+async def test_push_check_keeps_github_error_status(github):
+    gh = FakeGitHub()
+    github(gh.handler)
+    for repo, code in (("missing", 404), ("down", 502)):
+        with pytest.raises(HTTPException) as exc:
+            await require_push("t", "o", repo)
+        assert exc.value.status_code == code
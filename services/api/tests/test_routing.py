@@ -0,0 +1,48 @@
+"""Model routing: fast model for small requests, default otherwise, per-request override."""
+import pytest
+
+from app.config import get_settings
+from app.services import agent
+from app.services.routing import choose_route
+from tests.anthropic_fakes import FakeAsyncAnthropic
+
+
+def test_small_requests_use_fast_model():
+    s = get_settings()
+    route = choose_route("patch", prompt_tokens=500, goal_chars=40, files=1)
+    assert (route.name, route.model, route.max_tokens) == ("fast", s.llm_fast_model, s.llm_fast_max_tokens)
+
+    route = choose_route("patch", prompt_tokens=500, goal_chars=40, files=s.route_fast_max_files + 1)
+    assert (route.name, route.model, route.max_tokens) == ("default", s.llm_default_model, s.patch_max_tokens)
+
+    route = choose_route("chat", prompt_tokens=s.route_fast_max_prompt_tokens + 1, goal_chars=40)
+    assert (route.name, route.max_tokens) == ("default", s.chat_max_tokens)
+    assert "prompt" in route.reason
+
+
+def test_overrides(monkeypatch):
+    s = get_settings()
+    assert choose_route("chat", 10**6, 10**6, override="fast").model == s.llm_fast_model
+    assert choose_route("chat", 1, 1, override="default").model == s.llm_default_model
+    with pytest.raises(ValueError, match="Model not allowed"):
+        choose_route("patch", 1, 1, override="some-other-model")
+    monkeypatch.setattr(s, "llm_overrides_allowed", "some-other-model")
+    route = choose_route("patch", 1, 1, override="some-other-model")
+    assert (route.name, route.model, route.max_tokens) == ("override", "some-other-model", s.patch_max_tokens)
+
+
+def test_fast_route_can_be_disabled(monkeypatch):
+    monkeypatch.setattr(get_settings(), "llm_fast_model", "")
+    assert choose_route("patch", 1, 1, files=0).name == "default"
+
+
+async def test_generate_patch_records_route(monkeypatch):
+    FakeAsyncAnthropic.reset(lambda kwargs: (0.0, "## PLAN\n- nothing\n"))
+    monkeypatch.setattr(agent, "AsyncAnthropic", FakeAsyncAnthropic)
+
+    result = await agent.generate_patch("k", "", {"a.py": "x\n"}, "fix typo")
+
+    s = get_settings()
+    assert result["route"]["name"] == "fast"
+    assert FakeAsyncAnthropic.calls[0]["model"] == s.llm_fast_model
+    assert FakeAsyncAnthropic.calls[0]["max_tokens"] == s.llm_fast_max_tokens
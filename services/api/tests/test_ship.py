@@ -0,0 +1,168 @@
+"""One-shot branch + commit + PR pipeline (mocked GitHub transport)."""
+import asyncio
+import base64
+import json
+
+import httpx
+import pytest
+
+from app.routers import git
+from app.services.github import blob_text_cache, branch_sha_cache, repo_meta_cache, tree_cache
+from app.services.ship import ShipError, ship_patch
+
+PATCH = """--- a/run.sh
++++ b/run.sh
+@@ -1,2 +1,2 @@
+ #!/bin/sh
+-echo old
++echo new
+--- /dev/null
++++ b/docs/new.md
+@@ -0,0 +1 @@
++hello
+--- a/gone.txt
++++ /dev/null
+@@ -1 +0,0 @@
+-bye
+"""
+RUN_SH = "#!/bin/sh\necho old\n"
+
+
+class FakeGitHub:
+    def __init__(self, pr_status: int = 201, run_text: str | bytes = RUN_SH, run_status: int = 200):
+        self.pr_status = pr_status
+        self.run_text = run_text  # what reading run.sh's blob returns
+        self.run_status = run_status
+        self.log: list[str] = []
+        self.bodies: dict[str, dict] = {}
+
+    async def handler(self, request: httpx.Request) -> httpx.Response:
+        path, method = request.url.path, request.method
+        self.log.append(f"{method} {path}")
+        if request.content:
+            self.bodies[f"{method} {path}"] = json.loads(request.content)
+        if method == "GET" and path == "/repos/o/r":
+            return httpx.Response(200, json={"default_branch": "main"})
+        if path == "/repos/o/r/git/ref/heads/main":
+            await asyncio.sleep(0.02)  # slow enough that blob uploads overlap it
+            return httpx.Response(200, json={"object": {"sha": "c-base"}})
+        if path == "/repos/o/r/git/trees/c-base":
+            return httpx.Response(200, json={"sha": "t-base", "tree": [
+                {"path": "run.sh", "type": "blob", "sha": "b-run", "mode": "100755"},
+                {"path": "gone.txt", "type": "blob", "sha": "b-gone", "mode": "100644"},
+            ]})
+        if method == "GET" and path == "/repos/o/r/git/blobs/b-run":
+            assert request.headers["Accept"] == "application/vnd.github.raw"
+            text = self.run_text
+            return httpx.Response(self.run_status, content=text if isinstance(text, bytes) else text.encode())
+        if path == "/repos/o/r/git/blobs":
+            content = base64.b64decode(json.loads(request.content)["content"]).decode()
+            return httpx.Response(201, json={"sha": f"blob:{content}"})
+        if path == "/repos/o/r/git/trees":
+            return httpx.Response(201, json={"sha": "t-new"})
+        if path == "/repos/o/r/git/commits":
+            return httpx.Response(201, json={"sha": "c-new"})
+        if path == "/repos/o/r/git/refs":
+            return httpx.Response(201, json={"ref": "refs/heads/feat", "object": {"sha": "c-new"}})
+        if path == "/repos/o/r/pulls":
+            if self.pr_status != 201:
+                return httpx.Response(self.pr_status, json={"message": "Validation Failed"})
+            return httpx.Response(201, json={"html_url": "https://github.com/o/r/pull/9"})
+        if method == "DELETE" and path == "/repos/o/r/git/refs/heads/feat":
+            return httpx.Response(204)
+        raise AssertionError(f"unexpected {method} {path}")
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    blob_text_cache.clear()
+    branch_sha_cache.clear()
+    repo_meta_cache.clear()
+    tree_cache.clear()
+
+
+@pytest.fixture
+def ship(github):
+    async def ship(gh: FakeGitHub, events: list) -> dict:
+        github(gh.handler)
+        return await ship_patch("t", "o", "r", PATCH, "feat", None, "msg", "Title", None, events.append)
+    return ship
+
+
+async def test_ship_builds_one_commit_and_pr(ship):
+    gh, events = FakeGitHub(), []
+    result = await ship(gh, events)
+    assert result == {"branch": "feat", "base": "main", "commit_sha": "c-new",
+                      "pr_url": "https://github.com/o/r/pull/9", "pr_number": 9}
+    tree = gh.bodies["POST /repos/o/r/git/trees"]
+    assert tree["base_tree"] == "t-base"
+    assert sorted(tree["tree"], key=lambda e: e["path"]) == [
+        {"path": "docs/new.md", "mode": "100644", "type": "blob", "sha": "blob:hello\n"},
+        {"path": "gone.txt", "mode": "100644", "type": "blob", "sha": None},
+        {"path": "run.sh", "mode": "100755", "type": "blob", "sha": "blob:#!/bin/sh\necho new\n"},
+    ]
+    assert gh.bodies["POST /repos/o/r/git/commits"]["parents"] == ["c-base"]
+    assert gh.bodies["POST /repos/o/r/git/refs"] == {"ref": "refs/heads/feat", "sha": "c-new"}
+    # blobs were uploaded while the base ref was still resolving
+    assert gh.log.index("POST /repos/o/r/git/blobs") < gh.log.index("GET /repos/o/r/git/trees/c-base")
+    done = [e["step"] for e in events if e["status"] == "done"]
+    assert done[0] == "default_branch"
+    assert set(done[1:3]) == {"resolve_base", "upload_blobs"}
+    assert done[3:] == ["create_tree", "create_commit", "create_branch", "open_pr"]
+
+
+async def test_pr_failure_deletes_branch(ship):
+    gh, events = FakeGitHub(pr_status=422), []
+    with pytest.raises(ShipError) as exc:
+        await ship(gh, events)
+    assert (exc.value.step, exc.value.status) == ("open_pr", 422)
+    assert gh.log[-1] == "DELETE /repos/o/r/git/refs/heads/feat"
+    assert events[-1] == {"step": "rollback", "status": "done", "ms": events[-1]["ms"]}
+
+
+async def test_source_gone_upstream_is_a_clean_apply_error(ship):
+    gh, events = FakeGitHub(run_status=404), []
+    with pytest.raises(ShipError) as exc:
+        await ship(gh, events)
+    # Read as an empty file, like apply_patch_and_commit; the context then does not match.
+    assert (exc.value.step, exc.value.status) == ("upload_blobs", 400)
+    assert "GET /repos/o/r/git/blobs/b-run" in gh.log
+    assert not any("/contents/" in line for line in gh.log)
+    assert "POST /repos/o/r/git/refs" not in gh.log
+
+
+async def test_non_utf8_original_is_rejected_not_rewritten(ship):
+    gh, events = FakeGitHub(run_text=RUN_SH.encode() + b"# caf\xe9\n"), []
+    with pytest.raises(ShipError) as exc:
+        await ship(gh, events)
+    assert (exc.value.step, exc.value.status) == ("upload_blobs", 400)
+    assert "run.sh is not UTF-8" in str(exc.value)
+    assert "POST /repos/o/r/git/refs" not in gh.log
+
+
+def test_ship_endpoint_streams_progress(github, api):
+    gh = FakeGitHub()
+    client = api(git.router)
+    body = {"owner": "o", "repo": "r", "branch": "feat", "patch": PATCH, "commit_message": "m", "title": "T"}
+    github(gh.handler)
+    r = client.post("/git/ship", json=body)
+    assert r.status_code == 200
+    records = [json.loads(line) for line in r.text.splitlines()]
+    assert records[-1]["result"]["pr_number"] == 9
+    assert {"step": "open_pr", "status": "started"} in records
+
+    r = client.post("/git/ship", json={**body, "patch": "--- a/.env\n+++ b/.env\n@@ -1 +1 @@\n-a\n+b\n"})
+    assert r.status_code == 400
+
+
+def test_ship_endpoint_reports_unexpected_errors(monkeypatch, github, api):
+    async def broken_ship(*args, **kwargs):
+        raise KeyError("sha")
+
+    monkeypatch.setattr(git, "ship_patch", broken_ship)
+    gh = FakeGitHub()
+    client = api(git.router)
+    body = {"owner": "o", "repo": "r", "branch": "feat", "patch": PATCH, "commit_message": "m", "title": "T"}
+    github(gh.handler)
+    r = client.post("/git/ship", json=body)
+    assert [json.loads(line) for line in r.text.splitlines()] == [{"error": "'sha'", "step": "internal", "status": 500}]
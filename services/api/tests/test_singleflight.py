@@ -0,0 +1,99 @@
+"""Coalescing of identical in-flight GitHub reads (mocked GitHub transport)."""
+import asyncio
+
+import httpx
+import pytest
+
+from app.cache import SingleFlight
+from app.services.github import branch_sha_cache, get_branch_sha, get_file_text, get_full_tree, github_flight, tree_cache
+
+
+class _SlowGitHub:
+    """Answers after a short delay so concurrent callers overlap; counts requests per path."""
+
+    def __init__(self, status: int = 200):
+        self.status = status
+        self.calls: dict[str, int] = {}
+        self.tokens: list[str] = []
+
+    async def __call__(self, request: httpx.Request) -> httpx.Response:
+        self.calls[request.url.path] = self.calls.get(request.url.path, 0) + 1
+        self.tokens.append(request.headers["Authorization"])
+        await asyncio.sleep(0.05)
+        if self.status != 200:
+            return httpx.Response(self.status, json={"message": "nope"})
+        if "/git/ref/heads/" in request.url.path:
+            return httpx.Response(200, json={"object": {"sha": "c1"}})
+        if "/git/trees/" in request.url.path:
+            return httpx.Response(200, json={"sha": "t1", "tree": [{"path": "a.py", "type": "blob", "sha": "b1"}]})
+        return httpx.Response(200, content=b"print('hi')\n")
+
+
+@pytest.fixture(autouse=True)
+def _clear_caches():
+    branch_sha_cache.clear()
+    tree_cache.clear()
+    yield
+    branch_sha_cache.clear()
+    tree_cache.clear()
+
+
+async def test_concurrent_identical_reads_share_one_call(github):
+    gh = _SlowGitHub()
+    github(gh)
+    shas = await asyncio.gather(*(get_branch_sha("t", "o", "r", "main") for _ in range(10)))
+    trees = await asyncio.gather(*(get_full_tree("t", "o", "r", "c1") for _ in range(10)))
+    texts = await asyncio.gather(*(get_file_text("t", "o", "r", "a.py", "c1") for _ in range(5)))
+    assert shas == ["c1"] * 10
+    assert all(t == trees[0] for t in trees)
+    assert texts == ["print('hi')\n"] * 5
+    assert gh.calls == {
+        "/repos/o/r/git/ref/heads/main": 1,
+        "/repos/o/r/git/trees/c1": 1,
+        "/repos/o/r/contents/a.py": 1,
+    }
+    assert len(github_flight) == 0
+
+
+async def test_different_tokens_are_not_shared(github):
+    gh = _SlowGitHub()
+    github(gh)
+    await asyncio.gather(get_branch_sha("t1", "o", "r", "main"), get_branch_sha("t2", "o", "r", "main"))
+    assert gh.calls == {"/repos/o/r/git/ref/heads/main": 2}
+    assert sorted(gh.tokens) == ["Bearer t1", "Bearer t2"]
+
+
+async def test_errors_reach_every_waiter(github):
+    gh = _SlowGitHub(status=404)
+    github(gh)
+    results = await asyncio.gather(
+        *(get_branch_sha("t", "o", "r", "gone") for _ in range(3)), return_exceptions=True
+    )
+    assert all(isinstance(r, httpx.HTTPStatusError) for r in results)
+    assert gh.calls == {"/repos/o/r/git/ref/heads/gone": 1}
+
+
+async def test_cancelled_caller_does_not_cancel_the_shared_call():
+    flight = SingleFlight("test")
+    started = asyncio.Event()
+    runs = 0
+
+    async def work():
+        nonlocal runs
+        runs += 1
+        started.set()
+        await asyncio.sleep(0.05)
+        return "done"
+
+    first = asyncio.create_task(flight.do("k", work))
+    await started.wait()
+    second = asyncio.create_task(flight.do("k", work))
+    await asyncio.sleep(0)
+    first.cancel()
+    assert await second == "done"
+    assert runs == 1
+    with pytest.raises(asyncio.CancelledError):
+        await first
+    # finished calls are not remembered
+    assert await flight.do("k", work) == "done"
+    assert runs == 2
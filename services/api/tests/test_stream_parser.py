@@ -0,0 +1,79 @@
+"""Streaming agent output parser: same result as the batch parser, per-file events, early abort."""
+import random
+
+from prometheus_client import REGISTRY
+
+from app.services import agent
+from app.services.agent import parse_agent_response
+from app.services.patch_validator import validate_patch
+from app.services.stream_parser import AgentStreamParser
+from benchmarks.patchgen import scenario
+from tests.anthropic_fakes import FakeAsyncAnthropic
+
+
+def _response(patch: str) -> str:
+    return f"Sure.\n\n## PLAN\n- first step\n* second step\n\n## PATCH\n{patch}\n## SUMMARY\n- done\n"
+
+
+def _feed_randomly(parser: AgentStreamParser, text: str, seed: int = 0) -> list:
+    rng = random.Random(seed)
+    events, i = [], 0
+    while i < len(text):
+        n = rng.randint(1, 40)
+        events += parser.feed(text[i:i + n])
+        i += n
+    return events + parser.close()
+
+
+def test_matches_batch_parser_and_validator():
+    for name in ("many_files", "crlf", "no_newline_eof"):
+        text = _response(scenario(name).patch)
+        parser = AgentStreamParser(max_files=10**6, max_lines=10**9)
+        events = _feed_randomly(parser, text)
+
+        plan, patch, summary = parse_agent_response(text)
+        assert parser.result()["plan"] == plan
+        assert parser.result()["patch"] == patch
+        assert parser.result()["summary"] == summary
+        _, _, changes = validate_patch(patch, max_files=10**6, max_lines=10**9)
+        assert [(f.path, f.additions, f.deletions) for f in parser.files] == [
+            (c["path"], c["additions"], c["deletions"]) for c in changes
+        ]
+        kinds = [k for k, _ in events]
+        assert kinds[:2] == ["plan", "plan"] and kinds[-1] == "summary"
+        assert kinds.count("file") == len(changes)
+        assert parser.rejection is None
+
+
+def test_rejects_as_soon_as_a_limit_is_certain():
+    parser = AgentStreamParser(max_files=2, max_lines=10**9)
+    parser.feed(_response(scenario("many_files").patch))
+    assert parser.rejection == ("too_many_files", "Too many files changed (max 2)")
+    assert len(parser.files) == 2
+
+    parser = AgentStreamParser(max_files=20, max_lines=10**9)
+    parser.feed("## PATCH\n--- a/.env\n+++ b/.env\n")
+    assert parser.rejection == ("blocked_path", "Blocked path: .env")
+
+
+async def test_generation_is_aborted_on_blocked_path(monkeypatch):
+    text = _response("--- a/config/secrets.yml\n+++ b/config/secrets.yml\n@@ -1 +1 @@\n-a\n+b\n" + "+x\n" * 500)
+    FakeAsyncAnthropic.reset(lambda kwargs: (0.0, text))
+    monkeypatch.setattr(agent, "AsyncAnthropic", FakeAsyncAnthropic)
+
+    async def load_file(path):
+        return "a\n"
+
+    prompt, route = agent.prepare_patch("", {}, "goal")
+    labels = {"operation": "patch", "model": route.model}
+    before = {d: REGISTRY.get_sample_value("zappr_llm_tokens_total", {**labels, "direction": d}) or 0.0
+              for d in ("input", "output")}
+
+    result = await agent.generate_patch("k", "", {}, "goal", load_file=load_file)
+
+    assert result["valid"] is False
+    assert result["validation_error"] == "Generation stopped early: Blocked path: config/secrets.yml"
+    assert FakeAsyncAnthropic.chunks_sent < len(text) // FakeAsyncAnthropic.CHUNK // 10
+    # message_delta never came, but the usage from message_start is still recorded.
+    after = {d: REGISTRY.get_sample_value("zappr_llm_tokens_total", {**labels, "direction": d}) for d in before}
+    assert (after["input"] - before["input"], after["output"] - before["output"]) == (len(prompt), 1)
@@ -0,0 +1,44 @@
+"""Span nesting, Server-Timing header and exporters."""
+import json
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.tracing import OTLPFileExporter, TracingMiddleware, set_exporter, span, traced
+
+
+@traced("svc.fetch")
+async def _fetch() -> int:
+    return 1
+
+
+app = FastAPI()
+app.add_middleware(TracingMiddleware)
+
+
+@app.get("/work")
+async def work():
+    with span("stage.one"):
+        await _fetch()
+        await _fetch()
+    with span("stage.two"):
+        pass
+    return {"ok": True}
+
+
+def test_server_timing_and_otlp_export(tmp_path):
+    out = tmp_path / "traces.jsonl"
+    set_exporter(OTLPFileExporter(str(out)))
+    try:
+        r = TestClient(app).get("/work")
+    finally:
+        set_exporter(None)
+
+    names = [part.split(";")[0] for part in r.headers["server-timing"].split(", ")]
+    assert names == ["svc.fetch", "stage.one", "stage.two"]
+    assert 'desc="x2"' in r.headers["server-timing"]
+
+    spans = json.loads(out.read_text())["resourceSpans"][0]["scopeSpans"][0]["spans"]
+    by_name = {s["name"]: s for s in spans}
+    assert by_name["svc.fetch"]["parentSpanId"] == by_name["stage.one"]["spanId"]
+    assert "parentSpanId" not in by_name["GET /work"]
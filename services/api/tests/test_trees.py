@@ -0,0 +1,119 @@
+import httpx
+
+from app.routers import repos
+from app.services.github import branch_sha_cache, get_full_tree, tree_cache
+from app.services.trees import compare_to_delta, diff_trees
+
+
+def test_tree_entries_carry_only_tree_entry_fields(monkeypatch, github, api):
+    def handler(request: httpx.Request) -> httpx.Response:
+        if request.url.path == "/repos/o/r/git/ref/heads/main":
+            return httpx.Response(200, json={"object": {"sha": "c1"}})
+        return httpx.Response(200, json={"sha": "t1", "tree": [
+            {"path": "run.sh", "type": "blob", "sha": "a1", "mode": "100755", "size": 12, "url": "https://x"},
+            {"path": "src", "type": "tree", "sha": "s1", "mode": "040000", "url": "https://y"},
+        ]})
+
+    tree_cache.clear()
+    branch_sha_cache.clear()
+    monkeypatch.setattr(repos, "start_prefetch", lambda *a, **k: None)
+    github(handler)
+    r = api(repos.router).get("/repos/o/r/tree", params={"branch": "main"})
+    assert r.status_code == 200
+    assert r.json()["tree"] == [
+        {"path": "run.sh", "type": "blob", "sha": "a1", "mode": "100755", "size": 12},
+        {"path": "src", "type": "tree", "sha": "s1", "mode": "040000", "size": None},
+    ]
+
+
+def test_diff_trees():
+    old = [
+        {"path": "src", "type": "tree", "sha": "t1"},
+        {"path": "src/a.py", "type": "blob", "sha": "a1"},
+        {"path": "src/b.py", "type": "blob", "sha": "b1"},
+        {"path": "old", "type": "tree", "sha": "o1"},
+    ]
+    new = [
+        {"path": "src", "type": "tree", "sha": "t2"},
+        {"path": "src/a.py", "type": "blob", "sha": "a2"},
+        {"path": "src/c.py", "type": "blob", "sha": "c1"},
+        {"path": "old", "type": "blob", "sha": "o2"},
+    ]
+    delta = diff_trees(old, new)
+    assert [e["path"] for e in delta["added"]] == ["src/c.py", "old"]
+    assert [e["path"] for e in delta["removed"]] == ["src/b.py", "old"]
+    assert [e["path"] for e in delta["modified"]] == ["src/a.py"]
+
+
+def test_compare_to_delta_renames():
+    delta = compare_to_delta([
+        {"filename": "new.py", "status": "renamed", "previous_filename": "old.py", "sha": "x"},
+        {"filename": "gone.py", "status": "removed", "sha": "y"},
+        {"filename": "edit.py", "status": "modified", "sha": "z"},
+    ], [{"path": "new.py", "type": "blob", "sha": "x"}, {"path": "edit.py", "type": "blob", "sha": "z"}])
+    assert [e["path"] for e in delta["added"]] == ["new.py"]
+    assert [e["path"] for e in delta["removed"]] == ["old.py", "gone.py"]
+    assert delta["modified"] == [{"path": "edit.py", "type": "blob", "sha": "z"}]
+
+
+def test_compare_to_delta_reports_directories_like_diff_trees():
+    old = [
+        {"path": "src", "type": "tree", "sha": "s1"},
+        {"path": "src/a.py", "type": "blob", "sha": "a1"},
+        {"path": "src/old", "type": "tree", "sha": "o1"},
+        {"path": "src/old/x.py", "type": "blob", "sha": "x1"},
+        {"path": "lib", "type": "tree", "sha": "l1"},
+        {"path": "lib/y.py", "type": "blob", "sha": "y1"},
+    ]
+    new = [
+        {"path": "src", "type": "tree", "sha": "s2"},
+        {"path": "src/a.py", "type": "blob", "sha": "a1"},
+        {"path": "src/pkg", "type": "tree", "sha": "p1"},
+        {"path": "src/pkg/sub", "type": "tree", "sha": "q1"},
+        {"path": "src/pkg/sub/z.py", "type": "blob", "sha": "z1"},
+        {"path": "lib", "type": "tree", "sha": "l2"},
+        {"path": "lib/w.py", "type": "blob", "sha": "w1"},
+    ]
+    files = [
+        {"filename": "src/old/x.py", "status": "removed", "sha": "x1"},
+        {"filename": "src/pkg/sub/z.py", "status": "added", "sha": "z1"},
+        {"filename": "lib/w.py", "status": "renamed", "previous_filename": "lib/y.py", "sha": "w1"},
+    ]
+
+    def paths(delta):
+        return {k: sorted((e["path"], e["type"]) for e in v) for k, v in delta.items()}
+
+    assert paths(compare_to_delta(files, new)) == paths(diff_trees(old, new))
+    assert ("src/pkg", "tree") in paths(compare_to_delta(files, new))["added"]
+
+
+async def test_tree_delta_ignores_other_tokens_trees_and_rebased_bases(github, api):
+    base = [{"path": "a.py", "type": "blob", "sha": "a1"}]
+    head = [{"path": "a.py", "type": "blob", "sha": "a2"}]
+    calls = []
+
+    def handler(request: httpx.Request) -> httpx.Response:
+        path = request.url.path
+        calls.append(path)
+        if path == "/repos/o/r/git/ref/heads/main":
+            return httpx.Response(200, json={"object": {"sha": "c2"}})
+        if path == "/repos/o/r/git/trees/c2":
+            return httpx.Response(200, json={"sha": "t2", "tree": head})
+        if path == "/repos/o/r/git/trees/t1":
+            return httpx.Response(200, json={"sha": "t1", "tree": base})
+        if path == "/repos/o/r/compare/c1...c2":
+            # After a force-push the merge base is not the client's commit.
+            return httpx.Response(200, json={"merge_base_commit": {"sha": "c0"}, "files": []})
+        raise AssertionError(f"unexpected {path}")
+
+    tree_cache.clear()
+    branch_sha_cache.clear()
+    client = api(repos.router)
+    github(handler)
+    await get_full_tree("someone-else", "o", "r", "t1")
+    del calls[:]
+    r = client.get("/repos/o/r/tree/delta", params={"base_tree": "t1", "base_commit": "c1", "branch": "main"})
+    assert r.status_code == 200
+    assert r.json()["source"] == "fetch"
+    assert [(e["path"], e["sha"]) for e in r.json()["modified"]] == [("a.py", "a2")]
+    assert "/repos/o/r/git/trees/t1" in calls
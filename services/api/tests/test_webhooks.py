@@ -0,0 +1,140 @@
+"""Webhook receiver: signature check and cache invalidation with recorded payloads."""
+import asyncio
+import hashlib
+import hmac
+from pathlib import Path
+
+import orjson
+import pytest
+
+from fastapi import FastAPI
+from fastapi.testclient import TestClient
+
+from app.config import get_settings
+from app.routers import webhooks
+from app.services import invalidation
+from app.services.github import apply_invalidation, branch_sha_cache, invalidate_branch, repo_meta_cache
+
+FIXTURES = Path(__file__).parent / "fixtures" / "webhooks"
+SECRET = "test-secret"
+
+app = FastAPI()
+app.include_router(webhooks.router)
+client = TestClient(app)
+
+
+def _post(event: str, body: bytes, secret: str = SECRET):
+    sig = hmac.new(secret.encode(), body, hashlib.sha256).hexdigest()
+    return client.post(
+        "/webhooks/github",
+        content=body,
+        headers={"X-GitHub-Event": event, "X-Hub-Signature-256": f"sha256={sig}", "Content-Type": "application/json"},
+    )
+
+
+def test_push_invalidates_branch(monkeypatch):
+    monkeypatch.setattr(get_settings(), "github_webhook_secret", SECRET)
+    branch_sha_cache.set(("Codertocat", "Hello-World", "main", "u1"), "old")
+    branch_sha_cache.set(("Codertocat", "Hello-World", "main", "u2"), "old")
+    branch_sha_cache.set(("Codertocat", "Hello-World", "dev", "u1"), "keep")
+
+    r = _post("push", (FIXTURES / "push.json").read_bytes())
+    assert r.status_code == 200
+    assert r.json()["invalidated"] == 2
+    assert branch_sha_cache.get(("Codertocat", "Hello-World", "main", "u1")) is None
+    assert branch_sha_cache.get(("Codertocat", "Hello-World", "dev", "u1")) == "keep"
+
+
+def test_delete_branch_event(monkeypatch):
+    monkeypatch.setattr(get_settings(), "github_webhook_secret", SECRET)
+    branch_sha_cache.set(("Codertocat", "Hello-World", "simple-tag", "u1"), "old")
+    r = _post("delete", (FIXTURES / "delete.json").read_bytes())
+    assert r.json()["invalidated"] == 1
+
+
+def test_bad_signature_rejected(monkeypatch):
+    monkeypatch.setattr(get_settings(), "github_webhook_secret", SECRET)
+    r = _post("push", (FIXTURES / "push.json").read_bytes(), secret="wrong")
+    assert r.status_code == 401
+
+
+def test_malformed_payload_is_a_bad_request(monkeypatch):
+    monkeypatch.setattr(get_settings(), "github_webhook_secret", SECRET)
+    assert _post("push", b"{not json").status_code == 400
+    assert _post("push", b"[1, 2]").status_code == 400
+    assert _post("push", b"\xff\xfe").status_code == 400
+
+
+def test_repository_event_drops_repo_metadata(monkeypatch):
+    monkeypatch.setattr(get_settings(), "github_webhook_secret", SECRET)
+    repo_meta_cache.set(("Codertocat", "Hello-World", "u1"), {"default_branch": "main"})
+    body = b'{"action": "edited", "repository": {"name": "Hello-World", "owner": {"login": "Codertocat"}}}'
+    r = _post("repository", body)
+    assert r.json()["invalidated"] == 1
+    assert repo_meta_cache.get(("Codertocat", "Hello-World", "u1")) is None
+
+
+class FakePubSub:
+    def __init__(self, messages):
+        self.messages = messages
+
+    async def subscribe(self, channel):
+        assert channel == invalidation.CHANNEL
+
+    async def listen(self):
+        yield {"type": "subscribe", "data": 1}
+        for m in self.messages:
+            yield {"type": "message", "data": m}
+        await asyncio.Event().wait()
+
+    async def aclose(self):
+        pass
+
+
+class FakeRedis:
+    def __init__(self):
+        self.published = []
+
+    async def publish(self, channel, data):
+        self.published.append(data)
+
+    def pubsub(self):
+        return FakePubSub(list(self.published))
+
+
+async def test_invalidations_reach_other_workers(monkeypatch):
+    redis = FakeRedis()
+    monkeypatch.setattr(get_settings(), "redis_url", "redis://fake")
+    monkeypatch.setattr(invalidation, "_redis", lambda: redis)
+    branch_sha_cache.clear()
+    branch_sha_cache.set(("o", "r", "main", "u1"), "old")
+    assert invalidate_branch("o", "r", "main") == 1
+    await asyncio.gather(*invalidation._publish_tasks)
+    assert [orjson.loads(m) for m in redis.published] == [
+        {"kind": "branch", "owner": "o", "repo": "r", "branch": "main", "origin": invalidation.ORIGIN},
+    ]
+
+    # Another worker's message is applied; our own was already applied locally and is skipped.
+    redis.published.append(orjson.dumps({"kind": "branch", "owner": "o", "repo": "r", "branch": "dev", "origin": "w2"}))
+    applied = []
+    listener = asyncio.create_task(invalidation.listen(applied.append))
+    await asyncio.sleep(0)
+    listener.cancel()
+    assert applied == [{"kind": "branch", "owner": "o", "repo": "r", "branch": "dev", "origin": "w2"}]
+
+    branch_sha_cache.set(("o", "r", "dev", "u2"), "old")
+    repo_meta_cache.set(("o", "r", "u2"), {"default_branch": "main"})
+    apply_invalidation(applied[0])
+    apply_invalidation({"kind": "repo_meta", "owner": "o", "repo": "r", "origin": "w2"})
+    assert branch_sha_cache.get(("o", "r", "dev", "u2")) is None
+    assert repo_meta_cache.get(("o", "r", "u2")) is None
+
+
+async def test_invalidation_stays_local_without_redis(monkeypatch):
+    monkeypatch.setattr(get_settings(), "redis_url", "")
+    monkeypatch.setattr(invalidation, "_redis", lambda: pytest.fail("no Redis configured"))
+    branch_sha_cache.clear()
+    branch_sha_cache.set(("o", "r", "main", "u1"), "old")
+    pending = set(invalidation._publish_tasks)
+    assert invalidate_branch("o", "r", "main") == 1
+    assert invalidation._publish_tasks == pending